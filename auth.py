@@ -19,6 +19,7 @@ CACHE_DIR = _OLD_CACHE if _OLD_CACHE.exists() else APP_DIR / ".cache"
 SERVER_SETTINGS_FILE = CACHE_DIR / "server_settings.json"
 USERS_DIR = CACHE_DIR / "users"
 TOKEN_EXPIRY = 86400 * 7  # 7 days
+PBKDF2_ITERATIONS = 100000
 
 
 def _get_settings_file() -> pathlib.Path:
@@ -42,7 +43,7 @@ def _hash_password(password: str, salt: str | None = None) -> str:
     """Hash password with salt using PBKDF2."""
     if salt is None:
         salt = secrets.token_hex(16)
-    key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), 100000)
+    key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), PBKDF2_ITERATIONS)
     return f"{salt}:{key.hex()}"
 
 
@@ -125,6 +125,10 @@ LIVE_CACHE_TTL = 2 * 3600  # 2 hours
 EPG_CACHE_TTL = 6 * 3600  # 6 hours
 VOD_CACHE_TTL = 12 * 3600  # 12 hours
 SERIES_CACHE_TTL = 12 * 3600  # 12 hours
+# Stale-while-revalidate windows past the TTLs above; older data blocks on a fresh fetch
+LIVE_SWR_TTL = 22 * 3600  # Serve live data up to a day old
+VOD_SWR_TTL = 36 * 3600  # Serve VOD data up to two days old
+SERIES_SWR_TTL = 36 * 3600  # Serve series data up to two days old
 INFO_CACHE_TTL = 7 * 24 * 3600  # 7 days max for series/movie info
 INFO_CACHE_STALE = 24 * 3600  # Refresh in background after 24 hours
 LOGO_CACHE_TTL = 7 * 24 * 3600  # 7 days for logos (server-side)
@@ -135,11 +139,15 @@ LOGO_MAX_SIZE = 1024 * 1024  # 1MB max logo size
 _cache: dict[str, Any] = {}
 _cache_lock = threading.Lock()
 
+# Parsed file caches kept in memory, keyed by path -> ((mtime_ns, size), (data, timestamp))
+_SNAPSHOT_CACHES = frozenset({"live_data", "vod_data", "series_data"})
+_file_snapshots: dict[pathlib.Path, tuple[tuple[int, int], tuple[Any, float]]] = {}
+
 
 def _parse_json_file(path: str) -> tuple[Any, float] | None:
     """Parse JSON file - runs in separate process to avoid GIL blocking."""
     try:
-        with open(path) as f:
+        with open(path, "rb") as f:
             data = json.load(f)
         return data.get("data"), data.get("timestamp", 0)
     except Exception:
@@ -154,25 +162,48 @@ def load_file_cache(name: str, use_process: bool = False) -> tuple[Any, float] |
         use_process: If True, parse in separate process to avoid GIL blocking
     """
     path = CACHE_DIR / f"{name}.json"
-    if not path.exists():
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        with _cache_lock:
+            _file_snapshots.pop(path, None)
         return None
+    # Big catalog caches are reread on every load; reuse the parse until the file changes
+    stamp = (st.st_mtime_ns, st.st_size) if name in _SNAPSHOT_CACHES else None
+    if stamp:
+        with _cache_lock:
+            snap = _file_snapshots.get(path)
+        if snap and snap[0] == stamp:
+            return snap[1]
     if use_process:
         import concurrent.futures
 
         with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
             future = executor.submit(_parse_json_file, str(path))
-            return future.result(timeout=60)
-    try:
-        data = json.loads(path.read_text())
-        return data.get("data"), data.get("timestamp", 0)
-    except Exception:
-        return None
+            result = future.result(timeout=60)
+    else:
+        try:
+            data = json.loads(path.read_bytes())
+            result = data.get("data"), data.get("timestamp", 0)
+        except Exception:
+            result = None
+    if stamp and result is not None:
+        with _cache_lock:
+            _file_snapshots[path] = (stamp, result)
+    return result
 
 
 def save_file_cache(name: str, data: Any) -> None:
     """Save data to cache file with current timestamp."""
     path = CACHE_DIR / f"{name}.json"
-    path.write_text(json.dumps({"data": data, "timestamp": time.time()}))
+    # Compact: these files hold every stream, so fewer bytes to write and parse. Keep the
+    # default ASCII escaping so lone surrogates from upstream JSON still serialize.
+    payload = {"data": data, "timestamp": time.time()}
+    path.write_text(json.dumps(payload, separators=(",", ":")))
+    if name in _SNAPSHOT_CACHES:
+        st = path.stat()
+        with _cache_lock:
+            _file_snapshots[path] = ((st.st_mtime_ns, st.st_size), (data, payload["timestamp"]))
 
 
 def clear_all_caches() -> None:
@@ -464,6 +495,11 @@ class Source:
     max_streams: int = 0  # Max concurrent streams from this source (0 = unlimited)
 
 
+# Parsed sources keyed by (settings path, mtime_ns, size, save count)
+_sources_snapshot: tuple[tuple[pathlib.Path, int, int, int], list[Source]] | None = None
+_settings_version = 0
+
+
 def load_server_settings() -> dict[str, Any]:
     """Load server-wide settings."""
     if SERVER_SETTINGS_FILE.exists():
@@ -487,6 +523,7 @@ def load_server_settings() -> dict[str, Any]:
     # 0 = no caching (dead sessions cleaned immediately)
     data.setdefault("live_transcode_cache_secs", 0)
     data.setdefault("live_dvr_mins", 0)  # 0 = disabled (default 30 sec buffer)
+    data.setdefault("ffmpeg_threads", 0)  # 0 = let ffmpeg pick (all cores)
     data.setdefault("transcode_dir", "")  # Empty = system temp dir
     data.setdefault("probe_live", True)
     data.setdefault("probe_movies", True)
@@ -500,7 +537,10 @@ def load_server_settings() -> dict[str, Any]:
 
 def save_server_settings(settings: dict[str, Any]) -> None:
     """Save server-wide settings."""
+    global _settings_version
     SERVER_SETTINGS_FILE.write_text(json.dumps(settings, indent=2))
+    # mtime can be coarser than back-to-back saves; make sure get_sources() sees this one
+    _settings_version += 1
 
 
 def _validate_username(username: str) -> None:
@@ -573,9 +613,25 @@ def save_watch_position(username: str, stream_url: str, position: float, duratio
 
 
 def get_sources() -> list[Source]:
-    """Get list of configured sources."""
-    settings = load_server_settings()
-    return [Source(**s) for s in settings.get("sources", [])]
+    """Get list of configured sources (reparsed only when the settings file changes)."""
+    global _sources_snapshot
+    try:
+        st = SERVER_SETTINGS_FILE.stat()
+        stamp = (SERVER_SETTINGS_FILE, st.st_mtime_ns, st.st_size, _settings_version)
+    except FileNotFoundError:
+        stamp = None
+    snap = _sources_snapshot
+    if stamp and snap and snap[0] == stamp:
+        return list(snap[1])
+    sources = [Source(**s) for s in load_server_settings().get("sources", [])]
+    if stamp:
+        _sources_snapshot = (stamp, sources)
+    return list(sources)
+
+
+def get_xtream_sources() -> list[Source]:
+    """Get configured Xtream sources."""
+    return [s for s in get_sources() if s.type == "xtream"]
 
 
 def update_source_epg_url(source_id: str, epg_url: str) -> None:
@@ -46,6 +46,31 @@ class TestFileCache:
         assert data == {"key": "value"}
         assert ts > 0
 
+    def test_round_trips_non_ascii(self, cache_module):
+        cache_module.save_file_cache("test", {"name": "Télé 1 – 日本"})
+        data, _ = cache_module.load_file_cache("test")
+        assert data == {"name": "Télé 1 – 日本"}
+        assert cache_module.load_file_cache("test", use_process=True)[0] == data
+
+    def test_round_trips_lone_surrogate(self, cache_module):
+        # Upstream JSON can carry a broken emoji escape that json.loads accepts
+        cache_module.save_file_cache("vod_data", {"name": "Movie \ud83d"})
+        cache_module._file_snapshots.clear()
+        data, _ = cache_module.load_file_cache("vod_data")
+        assert data == {"name": "Movie \ud83d"}
+
+    def test_snapshot_reused_until_file_changes(self, cache_module):
+        cache_module.save_file_cache("vod_data", {"cats": [1]})
+        first = cache_module.load_file_cache("vod_data")
+        with mock.patch.object(cache_module.json, "loads") as loads:
+            assert cache_module.load_file_cache("vod_data") is first
+        loads.assert_not_called()
+        path = cache_module.CACHE_DIR / "vod_data.json"
+        path.write_text('{"data": {"cats": [1, 2]}, "timestamp": 1}')
+        assert cache_module.load_file_cache("vod_data") == ({"cats": [1, 2]}, 1)
+        path.unlink()
+        assert cache_module.load_file_cache("vod_data") is None
+
     def test_load_nonexistent_cache(self, cache_module):
         assert cache_module.load_file_cache("nonexistent") is None
 
@@ -177,6 +202,28 @@ class TestSource:
         assert sources[0].id == "s1"
         assert sources[0].type == "m3u"
 
+    def test_get_sources_reparses_only_after_save(self, cache_module):
+        src = {"id": "s1", "name": "A", "type": "xtream", "url": "http://a"}
+        cache_module.save_server_settings({"sources": [src]})
+        assert cache_module.get_sources()[0].name == "A"
+        with mock.patch.object(cache_module, "load_server_settings") as load:
+            assert cache_module.get_sources()[0].name == "A"
+        load.assert_not_called()
+        # Same size, likely same mtime tick: the save itself must invalidate
+        cache_module.save_server_settings({"sources": [{**src, "name": "B"}]})
+        assert cache_module.get_sources()[0].name == "B"
+
+    def test_get_xtream_sources(self, cache_module):
+        cache_module.save_server_settings(
+            {
+                "sources": [
+                    {"id": "m", "name": "M", "type": "m3u", "url": "http://m"},
+                    {"id": "x", "name": "X", "type": "xtream", "url": "http://x"},
+                ]
+            }
+        )
+        assert [s.id for s in cache_module.get_xtream_sources()] == ["x"]
+
 
 class TestUpdateSourceEpgUrl:
     def test_update_source_epg_url(self, cache_module):
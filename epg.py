@@ -270,12 +270,13 @@ def get_programs_batch(
             if ch_id in preferred_sources and result[ch_id]:
                 result[ch_id] = _dedupe_programs(result[ch_id], preferred_sources[ch_id])
 
-    channels_with_programs = sum(1 for progs in result.values() if progs)
-    log.debug(
-        "EPG batch query: requested %d channel IDs, found programs for %d",
-        len(channel_ids),
-        channels_with_programs,
-    )
+    if log.isEnabledFor(logging.DEBUG):
+        channels_with_programs = sum(1 for progs in result.values() if progs)
+        log.debug(
+            "EPG batch query: requested %d channel IDs, found programs for %d",
+            len(channel_ids),
+            channels_with_programs,
+        )
     return result
 
 
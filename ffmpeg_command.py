@@ -2,13 +2,16 @@
 
 from __future__ import annotations
 
+from collections import Counter
 from collections.abc import Callable
 from contextlib import suppress
 from dataclasses import dataclass
 from typing import Any, Literal
 
+import functools
 import json
 import logging
+import os
 import pathlib
 import subprocess
 import tempfile
@@ -39,10 +42,12 @@ _HLS_SEGMENT_DURATION_SEC = 3.0  # Short segments for faster startup/seeking
 _PROBE_CACHE_TTL_SEC = 3_600
 _SERIES_PROBE_CACHE_TTL_SEC = 7 * 24 * 3_600  # 7 days
 _PROBE_TIMEOUT_SEC = 30
+_SERIES_PROBE_SAVE_DELAY_SEC = 0.5  # Debounce window for series probe cache writes
 
 # Segment file naming
 SEG_PREFIX = "seg"  # Segment files are named seg000.ts, seg001.ts, etc.
 DEFAULT_LIVE_BUFFER_SECS = 30.0  # Default live buffer when DVR disabled
+MAX_FFMPEG_THREADS = 64  # Upper bound for the per-ffmpeg thread cap setting
 
 TEXT_SUBTITLE_CODECS = {
     "subrip",
@@ -90,6 +95,10 @@ _QUALITY_CRF: dict[str, int] = {"high": 20, "medium": 26, "low": 32}
 _probe_lock = threading.Lock()
 _probe_cache: dict[str, tuple[float, MediaInfo | None, list[SubtitleStream]]] = {}
 _series_probe_cache: dict[int, dict[str, Any]] = {}
+_series_save_pending = threading.Event()
+_series_write_lock = threading.Lock()  # Serializes snapshot + write of the series cache file
+_probe_stats: Counter[str] = Counter()  # probe_hit/miss, series_probe_hit/miss
+_series_save_thread: threading.Thread | None = None
 _gpu_nvdec_codecs: set[str] | None = None  # None = not probed yet
 _has_libplacebo: bool | None = None  # None = not probed yet
 _load_settings: Callable[[], dict[str, Any]] = dict
@@ -314,7 +323,40 @@ def _load_series_probe_cache() -> None:
 
 
 def _save_series_probe_cache() -> None:
-    """Save series probe cache to disk."""
+    """Schedule a debounced save of the series probe cache.
+
+    Bursts of mutations (e.g. session recovery) coalesce into a single write.
+    """
+    global _series_save_thread
+    _series_save_pending.set()
+    with _probe_lock:
+        if _series_save_thread is None or not _series_save_thread.is_alive():
+            _series_save_thread = threading.Thread(target=_series_save_loop, daemon=True)
+            _series_save_thread.start()
+
+
+def _series_save_loop() -> None:
+    while True:
+        _series_save_pending.wait()
+        time.sleep(_SERIES_PROBE_SAVE_DELAY_SEC)
+        with _series_write_lock:
+            _series_save_pending.clear()
+            _write_series_probe_cache()
+
+
+def flush_series_probe_cache() -> None:
+    """Write any pending series probe cache changes now (call on shutdown).
+
+    Waits for a write already in progress, so the file is complete on return.
+    """
+    with _series_write_lock:
+        if _series_save_pending.is_set():
+            _series_save_pending.clear()
+            _write_series_probe_cache()
+
+
+def _write_series_probe_cache() -> None:
+    """Write series probe cache to disk (caller holds _series_write_lock)."""
     with _probe_lock:
         data: dict[str, dict[str, Any]] = {}
         for sid, series_data in _series_probe_cache.items():
@@ -345,7 +387,9 @@ def _save_series_probe_cache() -> None:
                 }
     try:
         _SERIES_PROBE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-        _SERIES_PROBE_CACHE_FILE.write_text(json.dumps(data, indent=2))
+        tmp = _SERIES_PROBE_CACHE_FILE.with_name(f"{_SERIES_PROBE_CACHE_FILE.name}.tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, _SERIES_PROBE_CACHE_FILE)
     except Exception as e:
         log.warning("Failed to save series probe cache: %s", e)
 
@@ -399,6 +443,11 @@ def get_series_probe_cache_stats() -> list[dict[str, Any]]:
         return sorted(result, key=lambda x: x.get("name") or str(x["series_id"]))
 
 
+def get_probe_cache_counters() -> dict[str, int]:
+    """Get probe cache hit/miss counters since startup."""
+    return dict(_probe_stats)
+
+
 def clear_all_probe_cache() -> int:
     """Clear all probe caches. Returns count of entries cleared."""
     with _probe_lock:
@@ -455,6 +504,7 @@ def restore_probe_cache_entry(
 ) -> None:
     """Restore a probe cache entry (used during session recovery)."""
     now = time.time()
+    added_series_entry = False
     with _probe_lock:
         if url not in _probe_cache:
             _probe_cache[url] = (now, media_info, subs)
@@ -465,6 +515,9 @@ def restore_probe_cache_entry(
             eid = episode_id or 0
             if eid not in _series_probe_cache[series_id]["episodes"]:
                 _series_probe_cache[series_id]["episodes"][eid] = (now, media_info, subs)
+                added_series_entry = True
+    if added_series_entry:
+        _save_series_probe_cache()
 
 
 # ===========================================================================
@@ -520,7 +573,9 @@ def probe_media(
         if save_mru:
             _save_series_probe_cache()
         if cache_hit_result:
+            _probe_stats["series_probe_hit"] += 1
             return cache_hit_result
+        _probe_stats["series_probe_miss"] += 1
 
     # Check URL cache (for movies, or series cache miss)
     with _probe_lock:
@@ -528,8 +583,10 @@ def probe_media(
         if cached:
             cache_time, media_info, subtitles = cached
             if time.time() - cache_time < _PROBE_CACHE_TTL_SEC:
+                _probe_stats["probe_hit"] += 1
                 log.info("Probe cache hit for %s", url[:50])
                 return media_info, subtitles
+    _probe_stats["probe_miss"] += 1
     log.info(
         "Probe cache miss for %s (series=%s, episode=%s)",
         url[:50],
@@ -712,7 +769,64 @@ def _build_video_args(
     quality: str,
     is_hdr: bool = False,
 ) -> tuple[list[str], list[str]]:
-    """Build video args. Returns (pre_input_args, post_input_args)."""
+    """Build video args. Returns (pre_input_args, post_input_args).
+
+    Memoized per argument set. The VAAPI device and libplacebo availability
+    are resolved here and passed in, so they are part of the cache key too.
+    libplacebo is only probed (once, lazily) when an HDR encode needs it.
+    """
+    pre, post = _cached_video_args(
+        copy_video,
+        hw,
+        deinterlace,
+        use_hw_pipeline,
+        max_resolution,
+        quality,
+        is_hdr,
+        VAAPI_DEVICE,
+        is_hdr and _has_libplacebo_filter(),
+    )
+    return list(pre), list(post)
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_video_args(
+    copy_video: bool,
+    hw: HwAccel,
+    deinterlace: bool,
+    use_hw_pipeline: bool,
+    max_resolution: str,
+    quality: str,
+    is_hdr: bool,
+    vaapi_device: str | None,
+    libplacebo: bool,
+) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    pre, post = _compute_video_args(
+        copy_video=copy_video,
+        hw=hw,
+        deinterlace=deinterlace,
+        use_hw_pipeline=use_hw_pipeline,
+        max_resolution=max_resolution,
+        quality=quality,
+        is_hdr=is_hdr,
+        vaapi_device=vaapi_device,
+        libplacebo=libplacebo,
+    )
+    return tuple(pre), tuple(post)
+
+
+def _compute_video_args(
+    *,
+    copy_video: bool,
+    hw: HwAccel,
+    deinterlace: bool,
+    use_hw_pipeline: bool,
+    max_resolution: str,
+    quality: str,
+    is_hdr: bool,
+    vaapi_device: str | None,
+    libplacebo: bool,
+) -> tuple[list[str], list[str]]:
     if copy_video:
         return [], ["-c:v", "copy"]
 
@@ -721,7 +835,7 @@ def _build_video_args(
 
     # Fail loudly if VAAPI is needed but no device was detected
     needs_vaapi = enc_type == "vaapi" or fallback == "vaapi"
-    if needs_vaapi and not VAAPI_DEVICE:
+    if needs_vaapi and not vaapi_device:
         raise RuntimeError(
             f"Hardware acceleration '{hw}' requires VAAPI but no Intel/AMD GPU was detected. "
             "Select a different hardware option in settings."
@@ -747,7 +861,7 @@ def _build_video_args(
             deint = "yadif_cuda=0," if deinterlace else ""  # mode=0 keeps original framerate
             # HDR tone mapping: prefer libplacebo (Vulkan GPU), fall back to CPU zscale+tonemap
             if is_hdr:
-                if _has_libplacebo_filter():
+                if libplacebo:
                     tonemap = "hwdownload,format=p010le,libplacebo=tonemapping=hable:colorspace=bt709:color_primaries=bt709:color_trc=bt709,format=nv12,hwupload_cuda,"
                 else:
                     tonemap = "hwdownload,format=p010le,zscale=t=linear:npl=100,format=gbrpf32le,zscale=p=bt709,tonemap=hable:desat=0,zscale=t=bt709:m=bt709:r=tv,format=nv12,hwupload_cuda,"
@@ -762,7 +876,7 @@ def _build_video_args(
                 "-hwaccel_output_format",
                 "vaapi",
                 "-hwaccel_device",
-                VAAPI_DEVICE,
+                vaapi_device,
             ]
             scale = f"scale_vaapi=w=-2:h={h}:format=nv12" if h else "scale_vaapi=format=nv12"
             tonemap = "tonemap_vaapi=format=nv12:t=bt709:m=bt709:p=bt709," if is_hdr else ""
@@ -776,7 +890,7 @@ def _build_video_args(
             # Deinterlace before tonemap (CPU yadif) for consistency with hw decode path
             if is_hdr:
                 deint = "yadif=0," if deinterlace else ""  # CPU deinterlace before tonemap
-                if _has_libplacebo_filter():
+                if libplacebo:
                     tonemap = "libplacebo=tonemapping=hable:colorspace=bt709:color_primaries=bt709:color_trc=bt709,format=nv12,hwupload_cuda,"
                 else:
                     tonemap = "zscale=t=linear:npl=100,format=gbrpf32le,zscale=p=bt709,tonemap=hable:desat=0,zscale=t=bt709:m=bt709:r=tv,format=nv12,hwupload_cuda,"
@@ -815,7 +929,7 @@ def _build_video_args(
                 "-hwaccel_output_format",
                 "vaapi",
                 "-hwaccel_device",
-                VAAPI_DEVICE,
+                vaapi_device,
             ]
             scale = f"scale_vaapi=w=-2:h={h}:format=nv12" if h else "scale_vaapi=format=nv12"
             tonemap = "tonemap_vaapi=format=nv12:t=bt709:m=bt709:p=bt709," if is_hdr else ""
@@ -851,7 +965,7 @@ def _build_video_args(
                 "-hwaccel_output_format",
                 "vaapi",
                 "-hwaccel_device",
-                VAAPI_DEVICE,
+                vaapi_device,
                 "-extra_hw_frames",
                 "3",
             ]
@@ -861,7 +975,7 @@ def _build_video_args(
             vf = f"deinterlace_vaapi,{tonemap}{scale}" if deinterlace else f"{tonemap}{scale}"
         else:
             # Software decode, upload to GPU for scaling/encoding
-            pre = ["-vaapi_device", VAAPI_DEVICE]
+            pre = ["-vaapi_device", vaapi_device]
             scale = f"scale_vaapi=w=-2:h={h}:format=nv12" if h else "scale_vaapi=format=nv12"
             tonemap = "tonemap_vaapi=format=nv12:t=bt709:m=bt709:p=bt709," if is_hdr else ""
             deint = "deinterlace_vaapi," if deinterlace else ""
@@ -950,6 +1064,14 @@ def get_live_hls_list_size() -> int:
     return int(dvr_mins * 60 / _HLS_SEGMENT_DURATION_SEC)
 
 
+def get_ffmpeg_threads() -> int:
+    """Get per-ffmpeg thread cap from settings (0 = ffmpeg decides)."""
+    try:
+        return min(max(0, int(_load_settings().get("ffmpeg_threads", 0))), MAX_FFMPEG_THREADS)
+    except (TypeError, ValueError):
+        return 0
+
+
 def build_hls_ffmpeg_cmd(
     input_url: str,
     hw: HwAccel,
@@ -1025,6 +1147,10 @@ def build_hls_ffmpeg_cmd(
         "error",
         "-noautorotate",
     ]
+    # Thread cap, so one software encode can't take every core on the box
+    threads = get_ffmpeg_threads()
+    if threads:
+        cmd.extend(["-filter_threads", str(threads)])
 
     # Hwaccel args (before -i)
     cmd.extend(video_pre)
@@ -1079,6 +1205,8 @@ def build_hls_ffmpeg_cmd(
     cmd.extend(["-map", "0:v:0", "-map", "0:a:0"])
     cmd.extend(video_post)
     cmd.extend(audio_args)
+    if threads:
+        cmd.extend(["-threads", str(threads)])
 
     # HLS output args
     cmd.extend(
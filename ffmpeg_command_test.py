@@ -1,6 +1,7 @@
 """Tests for ffmpeg command generation and media probing."""
 
 from pathlib import Path
+from typing import Any
 from unittest.mock import MagicMock, patch
 
 import json
@@ -15,6 +16,7 @@ from ffmpeg_command import (
     SubtitleStream,
     _build_audio_args,
     _build_video_args,
+    _cached_video_args,
     _get_gpu_nvdec_codecs,
     build_hls_ffmpeg_cmd,
     clear_all_probe_cache,
@@ -225,6 +227,40 @@ class TestBuildVideoArgs:
                 quality="high",
             )
 
+    def test_args_memoized_per_key(self):
+        """Repeated calls reuse cached args; a different VAAPI device is a new key."""
+        _cached_video_args.cache_clear()
+        kwargs: dict[str, Any] = {
+            "copy_video": False,
+            "hw": "vaapi",
+            "deinterlace": False,
+            "use_hw_pipeline": True,
+            "max_resolution": "1080p",
+            "quality": "high",
+        }
+        first_pre, _ = _build_video_args(**kwargs)
+        first_pre.append("mutated")  # Callers get their own copy
+        second_pre, _ = _build_video_args(**kwargs)
+        assert "mutated" not in second_pre
+        assert _cached_video_args.cache_info().hits == 1
+
+        with patch("ffmpeg_command.VAAPI_DEVICE", "/dev/dri/renderD129"):
+            pre, _ = _build_video_args(**kwargs)
+        assert "/dev/dri/renderD129" in pre
+
+    @patch("ffmpeg_command._has_libplacebo_filter", return_value=True)
+    def test_sdr_does_not_probe_libplacebo(self, mock_placebo):
+        """Test libplacebo is only probed when an HDR encode needs it."""
+        _build_video_args(
+            copy_video=False,
+            hw="nvenc+software",
+            deinterlace=False,
+            use_hw_pipeline=True,
+            max_resolution="1080p",
+            quality="high",
+        )
+        mock_placebo.assert_not_called()
+
     @patch("ffmpeg_command._has_libplacebo_filter", return_value=True)
     def test_nvenc_hdr_with_libplacebo(self, mock_placebo):
         """Test NVENC HDR uses libplacebo when available."""
@@ -654,6 +690,31 @@ class TestHlsListSize:
             assert get_live_hls_list_size() == 100
 
 
+class TestFfmpegThreads:
+    """Tests for the ffmpeg thread cap setting."""
+
+    def test_no_thread_args_by_default(self):
+        """Without a cap, ffmpeg keeps its own thread defaults."""
+        with patch("ffmpeg_command._load_settings", return_value={}):
+            cmd = build_hls_ffmpeg_cmd("http://test", "software", "/tmp/out")
+        assert "-threads" not in cmd
+        assert "-filter_threads" not in cmd
+
+    def test_thread_cap_applied(self):
+        """A cap sets encoder and filter threads."""
+        with patch("ffmpeg_command._load_settings", return_value={"ffmpeg_threads": 4}):
+            cmd = build_hls_ffmpeg_cmd("http://test", "software", "/tmp/out")
+        assert cmd[cmd.index("-threads") + 1] == "4"
+        assert cmd[cmd.index("-filter_threads") + 1] == "4"
+        assert cmd.index("-threads") > cmd.index("-i")
+
+    def test_bad_thread_setting_ignored(self):
+        """A malformed setting falls back to ffmpeg's own defaults."""
+        with patch("ffmpeg_command._load_settings", return_value={"ffmpeg_threads": "lots"}):
+            cmd = build_hls_ffmpeg_cmd("http://test", "software", "/tmp/out")
+        assert "-threads" not in cmd
+
+
 # =============================================================================
 # Probe Media Tests
 # =============================================================================
@@ -855,6 +916,7 @@ class TestProbeMedia:
             pix_fmt="yuv420p",
         )
         ffmpeg_command._probe_cache["http://cached"] = (time.time(), cached_info, [])
+        hits_before = ffmpeg_command.get_probe_cache_counters().get("probe_hit", 0)
 
         with (
             patch("subprocess.run") as mock_run,
@@ -864,6 +926,7 @@ class TestProbeMedia:
 
         mock_run.assert_not_called()
         assert media_info == cached_info
+        assert ffmpeg_command.get_probe_cache_counters()["probe_hit"] == hits_before + 1
 
     def test_probe_extracts_subtitles(self):
         """Test subtitle stream extraction."""
@@ -993,11 +1056,92 @@ class TestProbeCacheManagement:
         media_info = MediaInfo(video_codec="h264", audio_codec="aac", pix_fmt="yuv420p")
         subs = [SubtitleStream(index=2, lang="eng", name="English")]
 
-        restore_probe_cache_entry("http://test", media_info, subs, series_id=123, episode_id=5)
+        with patch("ffmpeg_command._save_series_probe_cache") as mock_save:
+            restore_probe_cache_entry("http://test", media_info, subs, series_id=123, episode_id=5)
+            # Restoring an already-cached episode doesn't schedule another save
+            restore_probe_cache_entry("http://test", media_info, subs, series_id=123, episode_id=5)
 
         assert "http://test" in ffmpeg_command._probe_cache
         assert 123 in ffmpeg_command._series_probe_cache
         assert 5 in ffmpeg_command._series_probe_cache[123]["episodes"]
+        assert mock_save.call_count == 1
+
+    def test_series_probe_cache_saves_are_coalesced(self):
+        """Test that a burst of saves starts one writer and results in a single disk write."""
+        import threading
+
+        import ffmpeg_command
+
+        pending = threading.Event()
+        with (
+            patch("ffmpeg_command._write_series_probe_cache") as mock_write,
+            patch("ffmpeg_command._series_save_pending", pending),
+            patch("ffmpeg_command._series_save_thread", None),
+            patch("ffmpeg_command.threading") as mock_threading,
+        ):
+            for _ in range(5):
+                ffmpeg_command._save_series_probe_cache()
+            # Writer thread is never actually started; drive the write via flush
+            mock_threading.Thread.return_value.start.assert_called_once()
+            assert pending.is_set()
+            mock_write.assert_not_called()
+
+            ffmpeg_command.flush_series_probe_cache()
+            ffmpeg_command.flush_series_probe_cache()
+
+        assert mock_write.call_count == 1
+        assert not pending.is_set()
+
+    def test_flush_series_probe_cache_writes_pending(self):
+        """Test that flush writes pending changes immediately."""
+        import threading
+
+        import ffmpeg_command
+
+        pending = threading.Event()
+        with (
+            patch("ffmpeg_command._write_series_probe_cache") as mock_write,
+            patch("ffmpeg_command._series_save_pending", pending),
+        ):
+            ffmpeg_command.flush_series_probe_cache()
+            assert mock_write.call_count == 0
+
+            pending.set()
+            ffmpeg_command.flush_series_probe_cache()
+            assert mock_write.call_count == 1
+
+    def test_flush_series_probe_cache_waits_for_inflight_write(self):
+        """Test that flush blocks until a write already in progress finishes."""
+        import threading
+
+        import ffmpeg_command
+
+        flushed = threading.Event()
+
+        def flush():
+            ffmpeg_command.flush_series_probe_cache()
+            flushed.set()
+
+        with ffmpeg_command._series_write_lock:
+            t = threading.Thread(target=flush)
+            t.start()
+            assert not flushed.wait(0.1)
+        t.join(timeout=5)
+        assert flushed.is_set()
+
+    def test_write_series_probe_cache_is_atomic(self, tmp_path):
+        """Test that the cache file is replaced whole, leaving no temp file."""
+        import ffmpeg_command
+
+        cache_file = tmp_path / "series_probe_cache.json"
+        cache_file.write_text("{}")
+        with (
+            patch("ffmpeg_command._SERIES_PROBE_CACHE_FILE", cache_file),
+            patch.dict(ffmpeg_command._series_probe_cache, {7: {"name": "S", "episodes": {}}}),
+        ):
+            ffmpeg_command._write_series_probe_cache()
+        assert json.loads(cache_file.read_text())["7"]["name"] == "S"
+        assert list(tmp_path.iterdir()) == [cache_file]
 
     def test_get_series_probe_cache_stats(self):
         """Test getting cache stats for UI."""
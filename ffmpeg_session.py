@@ -2,15 +2,19 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable, Iterator, MutableMapping
+from dataclasses import dataclass, field
 from typing import Any
 
 import asyncio
+import concurrent.futures
 import contextlib
 import json
 import logging
+import mmap
+import os
 import pathlib
-import re
 import shutil
 import tempfile
 import threading
@@ -26,6 +30,7 @@ from ffmpeg_command import (
     SubtitleStream,
     build_hls_ffmpeg_cmd,
     get_hls_segment_duration,
+    get_probe_cache_counters,
     get_settings,
     get_transcode_dir,
     get_user_agent,
@@ -38,9 +43,17 @@ from ffmpeg_command import (
 log = logging.getLogger(__name__)
 
 # Timing constants
-_POLL_INTERVAL_SEC = 0.2
+# Polls start tight for fast first segments and back off to the max interval
+_POLL_INTERVAL_MIN_SEC = 0.025
+_POLL_INTERVAL_MAX_SEC = 0.2
+_POLL_BACKOFF = 1.5
 _QUICK_FAILURE_THRESHOLD_SEC = 10.0
 _HEARTBEAT_TIMEOUT_SEC = 30.0  # 30 sec without progress poll = dead
+_HEARTBEAT_TIMEOUT_NS = int(_HEARTBEAT_TIMEOUT_SEC * 1e9)
+_STOP_GRACE_NS = 5_000_000_000  # Ignore non-forced stops this soon after an access
+# Expiry sweeps run when the next session could expire, within these bounds
+_SWEEP_MIN_INTERVAL_SEC = 1.0
+_SWEEP_MAX_INTERVAL_SEC = 60.0
 
 # Wait timeouts (seconds)
 _PLAYLIST_WAIT_TIMEOUT_SEC = 30.0
@@ -48,15 +61,207 @@ _PLAYLIST_WAIT_SEEK_TIMEOUT_SEC = 40.0
 _REUSE_ACTIVE_WAIT_TIMEOUT_SEC = 15.0
 _RESUME_WAIT_TIMEOUT_SEC = 10.0
 _RESUME_SEGMENT_WAIT_TIMEOUT_SEC = 5.0
+_SHUTDOWN_GRACE_SEC = 2.0  # Shared SIGTERM grace for all ffmpegs before SIGKILL
+
+# Segments to wait for before answering a start/seek. VOD output uses a short
+# -hls_init_time first segment and an EVENT playlist the player keeps polling,
+# so one is enough; live players join a few segments back from the edge.
+_START_MIN_SEGMENTS_VOD = 1
+_START_MIN_SEGMENTS_LIVE = 2
 
 # Size thresholds
 _MIN_SEGMENT_SIZE_BYTES = 1_000
+_STDERR_READ_BYTES = 8_192
+_STDERR_TAIL_LINES = 200  # ffmpeg stderr lines kept for failure reports
+
+# Case variants ffmpeg uses for fatal errors; matched on raw bytes so lines
+# that won't be logged are never lowercased or decoded
+_FATAL_MARKERS = (b"fatal", b"Fatal", b"FATAL", b"aborting", b"Aborting", b"ABORTING")
+
+# Removed dirs are renamed to this prefix, then emptied in the background;
+# up to _DIR_POOL_MAX empty tombstones are kept for new sessions to reuse
+_TOMBSTONE_PREFIX = "netv_deleted_"
+_DELETE_WORKERS = 4
+_RECOVERY_WORKERS = 8  # Startup dir inspection is syscall-bound; threads overlap the waits
+_DIR_POOL_MAX = 8
+
+# Seeks record the latest offset in this sidecar instead of rewriting
+# session.json; recovery prefers it over session.json's seek_offset
+_SEEK_FILE = "session.seek"
+_SESSION_SHARDS = 32  # Power of two; session ids are spread by hash
+
+
+@dataclass(slots=True)
+class _SessionShard:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    sessions: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+
+class _SessionMap(MutableMapping[str, dict[str, Any]]):
+    """session_id -> session dict, split across independently locked shards.
+
+    Single-key operations lock only their shard, so heartbeats and lookups for
+    different sessions don't contend. Iteration and items() return snapshots.
+    Sessions are also indexed by username and source_id so stream limit
+    checks don't scan every session.
+    """
+
+    def __init__(self, shards: int = _SESSION_SHARDS) -> None:
+        self._shards = tuple(_SessionShard() for _ in range(shards))
+        self._mask = shards - 1
+        # Taken inside shard locks, never the other way round
+        self._index_lock = threading.Lock()
+        self._by_user: dict[str, set[str]] = {}
+        self._by_source: dict[str, set[str]] = {}
+
+    def _shard(self, session_id: str) -> _SessionShard:
+        return self._shards[hash(session_id) & self._mask]
+
+    def _index(self, session_id: str, session: dict[str, Any]) -> None:
+        with self._index_lock:
+            if (username := session.get("username")) is not None:
+                self._by_user.setdefault(username, set()).add(session_id)
+            if (source_id := session.get("source_id")) is not None:
+                self._by_source.setdefault(source_id, set()).add(session_id)
+
+    def _unindex(self, session_id: str, session: dict[str, Any]) -> None:
+        with self._index_lock:
+            for index, key in (
+                (self._by_user, session.get("username")),
+                (self._by_source, session.get("source_id")),
+            ):
+                if key is not None and (ids := index.get(key)) is not None:
+                    ids.discard(session_id)
+                    if not ids:
+                        del index[key]
+
+    def _indexed(self, index: dict[str, set[str]], key: str) -> list[tuple[str, dict[str, Any]]]:
+        with self._index_lock:
+            session_ids = list(index.get(key, ()))
+        result = []
+        for session_id in session_ids:
+            session = self.get(session_id)
+            if session is not None:
+                result.append((session_id, session))
+        return result
+
+    def by_user(self, username: str) -> list[tuple[str, dict[str, Any]]]:
+        """Sessions started by username, in no particular order."""
+        return self._indexed(self._by_user, username)
+
+    def by_source(self, source_id: str) -> list[tuple[str, dict[str, Any]]]:
+        """Sessions streaming from source_id, in no particular order."""
+        return self._indexed(self._by_source, source_id)
+
+    def count_user(self, username: str) -> int:
+        with self._index_lock:
+            return len(self._by_user.get(username, ()))
+
+    def count_source(self, source_id: str) -> int:
+        with self._index_lock:
+            return len(self._by_source.get(source_id, ()))
+
+    def __getitem__(self, session_id: str) -> dict[str, Any]:
+        shard = self._shard(session_id)
+        with shard.lock:
+            return shard.sessions[session_id]
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        shard = self._shard(session_id)
+        with shard.lock:
+            return shard.sessions.get(session_id, default)
+
+    def __setitem__(self, session_id: str, session: dict[str, Any]) -> None:
+        shard = self._shard(session_id)
+        with shard.lock:
+            old = shard.sessions.get(session_id)
+            shard.sessions[session_id] = session
+            if old is not None:
+                self._unindex(session_id, old)
+            self._index(session_id, session)
+
+    def __delitem__(self, session_id: str) -> None:
+        shard = self._shard(session_id)
+        with shard.lock:
+            self._unindex(session_id, shard.sessions.pop(session_id))
+
+    def pop(self, session_id: str, default: Any = None) -> Any:  # type: ignore[override]
+        shard = self._shard(session_id)
+        with shard.lock:
+            session = shard.sessions.pop(session_id, None)
+            if session is None:
+                return default
+            self._unindex(session_id, session)
+            return session
+
+    def pop_if(self, session_id: str, session: dict[str, Any]) -> bool:
+        """Remove session_id only if it still maps to this exact session."""
+        shard = self._shard(session_id)
+        with shard.lock:
+            if shard.sessions.get(session_id) is not session:
+                return False
+            del shard.sessions[session_id]
+            self._unindex(session_id, session)
+            return True
+
+    def items(self) -> list[tuple[str, dict[str, Any]]]:  # type: ignore[override]
+        result: list[tuple[str, dict[str, Any]]] = []
+        for shard in self._shards:
+            with shard.lock:
+                result.extend(shard.sessions.items())
+        return result
+
+    def drain(self) -> list[tuple[str, dict[str, Any]]]:
+        """Remove and return all sessions."""
+        result: list[tuple[str, dict[str, Any]]] = []
+        for shard in self._shards:
+            with shard.lock:
+                for session_id, session in shard.sessions.items():
+                    self._unindex(session_id, session)
+                result.extend(shard.sessions.items())
+                shard.sessions.clear()
+        return result
+
+    def clear(self) -> None:
+        self.drain()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([sid for sid, _ in self.items()])
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
 
 # Module state
-_transcode_sessions: dict[str, dict[str, Any]] = {}
-_url_to_session: dict[str, str] = {}  # URL -> session_id (all content types)
-_transcode_lock = threading.Lock()
+# Locks: _transcode_sessions locks per shard, _url_lock guards _url_to_session,
+# and each session's own "lock" guards its fields. A session lock may be held
+# while taking a shard lock or _url_lock, never the reverse; shard locks and
+# _url_lock are never held together.
+_transcode_sessions = _SessionMap()
+# URL -> (session_id, seek_offset, wall-clock stamp) for all content types, so
+# reuse checks need a single lookup instead of chasing into _transcode_sessions
+_url_to_session: dict[str, tuple[str, float, float]] = {}
+_url_lock = threading.Lock()
+# playlist path -> ((inode, mtime_ns, size), bytes parsed, tail of parsed bytes,
+#                   segment count, duration)
+_hls_progress: dict[str, tuple[tuple[int, int, int], int, bytes, int, float]] = {}
+# VOD output dir -> segment numbers already seen complete. Finished segments
+# never change; entries are dropped when seek deletes segments or the dir goes.
+_complete_segments: dict[str, set[int]] = {}
+# session_reuse_hit/miss, recovery_ok/fail, session_expired
+_session_stats: Counter[str] = Counter()
 _background_tasks: set[asyncio.Task[None]] = set()
+# Pending work shared by concurrent callers (see _singleflight): URL -> start,
+# so one URL gets a single ffmpeg; (url, series_id, episode_id) -> ffprobe
+_inflight_starts: dict[str, asyncio.Future[Any]] = {}
+_inflight_probes: dict[tuple[str, int | None, int | None], asyncio.Future[Any]] = {}
+_delete_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_delete_executor_lock = threading.Lock()
+# Single worker, so session.json/seek sidecar writes land in submit order
+_persist_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_persist_executor_lock = threading.Lock()
+_dir_pool: deque[pathlib.Path] = deque()  # Emptied tombstones, guarded by _dir_pool_lock
+_dir_pool_lock = threading.Lock()
 
 
 class _DeadProcess:
@@ -102,30 +307,95 @@ def _is_process_alive(proc: Any) -> bool:
     return False
 
 
-def is_session_valid(session: dict[str, Any]) -> bool:
+def is_session_valid(
+    session: dict[str, Any],
+    cache_timeouts: tuple[int, int] | None = None,
+) -> bool:
     """Check if session is still valid (not expired).
 
     A session is valid if:
     - Has received a heartbeat (progress poll) within timeout, AND
     - Process is still running, OR process is dead but within cache timeout
+
+    Heartbeats are monotonic_ns ticks ("last_access_ns"), so wall-clock
+    adjustments can't expire or extend sessions. cache_timeouts is the
+    (vod, live) cache timeout pair for callers checking many sessions;
+    settings are read only when it is omitted.
     """
-    last_access = session.get("last_access", session["started"])
-    time_since_heartbeat = time.time() - last_access
+    return time.monotonic_ns() < _session_deadline_ns(session, cache_timeouts)
+
+
+def _session_deadline_ns(
+    session: dict[str, Any],
+    cache_timeouts: tuple[int, int] | None = None,
+) -> int:
+    """monotonic_ns tick at which the session expires unless it gets another heartbeat."""
+    last_access_ns = session.get("last_access_ns", 0)
 
     # No heartbeat in 30 sec = dead regardless of process state
-    if time_since_heartbeat > _HEARTBEAT_TIMEOUT_SEC:
-        return False
+    deadline_ns = last_access_ns + _HEARTBEAT_TIMEOUT_NS
 
     # Active process with recent heartbeat = valid
     if _is_process_alive(session.get("process")):
-        return True
+        return deadline_ns
 
     # Dead process: check cache timeout
     is_vod = session.get("is_vod", False)
-    cache_timeout = get_vod_cache_timeout() if is_vod else get_live_cache_timeout()
+    if cache_timeouts is not None:
+        cache_timeout = cache_timeouts[0] if is_vod else cache_timeouts[1]
+    else:
+        cache_timeout = get_vod_cache_timeout() if is_vod else get_live_cache_timeout()
     if cache_timeout <= 0:
-        return False  # No caching of dead sessions
-    return time_since_heartbeat < cache_timeout
+        return 0  # No caching of dead sessions
+    return min(deadline_ns, last_access_ns + cache_timeout * 1_000_000_000)
+
+
+def _session_lock(session: dict[str, Any]) -> threading.Lock:
+    """Get the per-session lock, creating it for sessions built without one."""
+    lock = session.get("lock")
+    if lock is None:
+        lock = session.setdefault("lock", threading.Lock())
+    return lock
+
+
+def _dir_path(session: dict[str, Any]) -> pathlib.Path:
+    """Get the session's output dir as a Path, parsed once and kept on the session."""
+    path = session.get("dir_path")
+    if path is None:
+        path = session["dir_path"] = pathlib.Path(session["dir"])
+    return path
+
+
+def _lookup_session(session_id: str) -> dict[str, Any] | None:
+    return _transcode_sessions.get(session_id)
+
+
+def _unmap_url(url: str, session_id: str) -> None:
+    """Drop url's mapping only if it still points at session_id.
+
+    A newer session for the same URL may have replaced the mapping; removing
+    one session must never orphan another.
+    """
+    with _url_lock:
+        if (entry := _url_to_session.get(url)) and entry[0] == session_id:
+            del _url_to_session[url]
+
+
+def _has_exited(proc: Any) -> bool:
+    """Check if process has exited, without reaping it.
+
+    returncode is only set when the event loop runs the child watcher's
+    callback, so it stays None while sync code polls. waitid with WNOWAIT
+    sees the exit but leaves the reap (and exit status) to asyncio.
+    """
+    if proc.returncode is not None:
+        return True
+    if not hasattr(os, "waitid"):
+        return False
+    try:
+        return os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return True  # Already reaped
 
 
 def _kill_process(proc: Any) -> bool:
@@ -135,7 +405,7 @@ def _kill_process(proc: Any) -> bool:
         proc.terminate()
         # Give it a moment to exit cleanly
         for _ in range(10):  # 100ms total
-            if proc.returncode is not None:
+            if _has_exited(proc):
                 return True
             time.sleep(0.01)
         # Force kill if still running
@@ -145,6 +415,80 @@ def _kill_process(proc: Any) -> bool:
         return False
 
 
+# ===========================================================================
+# Directory Removal
+# ===========================================================================
+
+
+def _get_delete_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _delete_executor
+    with _delete_executor_lock:
+        if _delete_executor is None:
+            _delete_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_DELETE_WORKERS,
+                thread_name_prefix="netv-rmtree",
+            )
+        return _delete_executor
+
+
+def _recycle_dir(tombstone: pathlib.Path) -> None:
+    """Empty a tombstone and pool it for reuse, or delete it if the pool is full."""
+    try:
+        with os.scandir(tombstone) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.unlink(entry.path)
+    except OSError:
+        shutil.rmtree(tombstone, ignore_errors=True)
+        return
+    with _dir_pool_lock:
+        if len(_dir_pool) < _DIR_POOL_MAX:
+            _dir_pool.append(tombstone)
+            return
+    shutil.rmtree(tombstone, ignore_errors=True)
+
+
+def _remove_dir(path: str | pathlib.Path) -> None:
+    """Remove a transcode dir without blocking on the unlinks.
+
+    The dir is renamed to a tombstone (a single atomic syscall), so it is gone
+    from its original path immediately; a background worker then empties the
+    tombstone for reuse (see _recycle_dir). Falls back to a synchronous
+    delete if rename fails.
+    """
+    path = pathlib.Path(path)
+    _complete_segments.pop(str(path), None)
+    tombstone = path.with_name(f"{_TOMBSTONE_PREFIX}{uuid.uuid4().hex}")
+    try:
+        os.rename(path, tombstone)
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    _get_delete_executor().submit(_recycle_dir, tombstone)
+
+
+def _acquire_output_dir(session_id: str) -> str:
+    """Create a session's output dir, reusing an emptied pooled dir if available.
+
+    Reuse is a rename, so a session start skips the mkdir and the matching
+    rmdir at teardown. Pooled dirs that can't be moved into place (e.g. the
+    transcode dir setting changed) are deleted and mkdtemp is used instead.
+    """
+    transcode_dir = get_transcode_dir()
+    with _dir_pool_lock:
+        pooled = _dir_pool.popleft() if _dir_pool else None
+    if pooled is not None:
+        target = transcode_dir / f"netv_transcode_{session_id}_{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(pooled, target)
+            return str(target)
+        except OSError:
+            _get_delete_executor().submit(shutil.rmtree, pooled, True)
+    return tempfile.mkdtemp(prefix=f"netv_transcode_{session_id}_", dir=transcode_dir)
+
+
 # ===========================================================================
 # Session Start/Stop
 # ===========================================================================
@@ -152,25 +496,30 @@ def _kill_process(proc: Any) -> bool:
 
 def stop_session(session_id: str, force: bool = False) -> None:
     """Stop a transcode session."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        if not session:
-            return
+    session = _lookup_session(session_id)
+    if not session:
+        return
 
+    # Killing ffmpeg can take ~100ms; hold only this session's lock meanwhile
+    with _session_lock(session):
         # Skip stop if session was accessed recently (race with seeking/resume,
         # or multiple users watching same stream)
-        if not force and time.time() - session.get("last_access", 0) < 5.0:
+        seen_access_ns = session.get("last_access_ns", 0)
+        if not force and time.monotonic_ns() - seen_access_ns < _STOP_GRACE_NS:
             log.info("Ignoring stop for recently-accessed session %s", session_id)
             return
 
         if _kill_process(session["process"]):
             log.info("Killed ffmpeg for session %s", session_id)
 
-        # Cache session if timeout > 0
+        # Cache session if timeout > 0; forced stops never cache, so skip the settings read
         is_vod = session.get("is_vod", False)
-        cache_timeout = get_vod_cache_timeout() if is_vod else get_live_cache_timeout()
-        if not force and cache_timeout > 0:
-            session["last_access"] = time.time()
+        if force:
+            cache_timeout = 0
+        else:
+            cache_timeout = get_vod_cache_timeout() if is_vod else get_live_cache_timeout()
+        if cache_timeout > 0:
+            session["last_access_ns"] = time.monotonic_ns()
             log.info(
                 "Session %s cached (vod=%s, ffmpeg stopped, segments kept)",
                 session_id,
@@ -178,36 +527,79 @@ def stop_session(session_id: str, force: bool = False) -> None:
             )
             return
 
-        _transcode_sessions.pop(session_id, None)
-        url = session.get("url")
-        if url:
-            _url_to_session.pop(url, None)
+        # touch_session doesn't take this lock, so a viewer can heartbeat while
+        # ffmpeg is being killed; keep the segments they are about to fetch
+        if not force and session.get("last_access_ns", 0) != seen_access_ns:
+            log.info("Session %s accessed during stop, segments kept", session_id)
+            return
+
+        if not _transcode_sessions.pop_if(session_id, session):
+            return  # Already removed (or replaced) by another caller
+        if url := session.get("url"):
+            _unmap_url(url, session_id)
         dir_to_remove = session["dir"]
 
-    shutil.rmtree(dir_to_remove, ignore_errors=True)
+    _forget_hls_progress(dir_to_remove)
+    _remove_dir(dir_to_remove)
     log.info("Stopped transcode session %s", session_id)
 
 
-def cleanup_expired_sessions() -> None:
-    """Clean up all expired sessions (VOD and live)."""
-    with _transcode_lock:
-        expired = [
-            sid
-            for sid, session in list(_transcode_sessions.items())
-            if not is_session_valid(session)
-        ]
+def cleanup_expired_sessions() -> float:
+    """Clean up all expired sessions (VOD and live).
+
+    Returns seconds until the next sweep is due: the earliest deadline among
+    the sessions left, clamped to the sweep interval bounds. Heartbeats only
+    push deadlines later, so waking then never misses an expiry.
+    """
+    # Settings are loaded from disk; read them once per sweep, not per session
+    cache_timeouts = (get_vod_cache_timeout(), get_live_cache_timeout())
+    now_ns = time.monotonic_ns()
+    next_deadline_ns = now_ns + int(_SWEEP_MAX_INTERVAL_SEC * 1e9)
+    expired = []
+    for sid, session in _transcode_sessions.items():
+        deadline_ns = _session_deadline_ns(session, cache_timeouts)
+        if deadline_ns <= now_ns:
+            expired.append(sid)
+        else:
+            next_deadline_ns = min(next_deadline_ns, deadline_ns)
+    _session_stats["session_expired"] += len(expired)
     for session_id in expired:
         stop_session(session_id, force=True)
+    return max((next_deadline_ns - now_ns) / 1e9, _SWEEP_MIN_INTERVAL_SEC)
 
 
 def shutdown() -> None:
-    """Kill all running ffmpeg processes for clean shutdown."""
-    with _transcode_lock:
-        for session_id, session in list(_transcode_sessions.items()):
-            proc = session.get("process")
-            if proc and _kill_process(proc):
-                log.info("Shutdown: killed ffmpeg for session %s", session_id)
-        _transcode_sessions.clear()
+    """Kill all running ffmpeg processes for clean shutdown.
+
+    All processes get SIGTERM first and share one grace period, so shutdown
+    takes at most _SHUTDOWN_GRACE_SEC rather than a wait per session; only
+    survivors get SIGKILL.
+    """
+    terminated = []
+    for session_id, session in _transcode_sessions.drain():
+        proc = session.get("process")
+        if not proc:
+            continue
+        try:
+            proc.terminate()
+        except (ProcessLookupError, OSError):
+            continue
+        terminated.append((session_id, proc))
+    deadline = time.monotonic() + _SHUTDOWN_GRACE_SEC
+    while time.monotonic() < deadline and not all(_has_exited(p) for _, p in terminated):
+        time.sleep(0.01)
+    for session_id, proc in terminated:
+        if not _has_exited(proc):
+            with contextlib.suppress(ProcessLookupError, OSError):
+                proc.kill()
+        log.info("Shutdown: killed ffmpeg for session %s", session_id)
+    for task in list(_background_tasks):
+        task.cancel()
+    _hls_progress.clear()
+    _complete_segments.clear()
+    _flush_persist()
+    with _dir_pool_lock:
+        _dir_pool.clear()  # Left on disk as tombstones; purged at next startup
 
 
 # ===========================================================================
@@ -217,19 +609,13 @@ def shutdown() -> None:
 
 def get_user_sessions(username: str) -> list[tuple[str, dict[str, Any]]]:
     """Get all active sessions for a user, sorted by start time (oldest first)."""
-    with _transcode_lock:
-        sessions = [
-            (sid, s) for sid, s in _transcode_sessions.items() if s.get("username") == username
-        ]
+    sessions = _transcode_sessions.by_user(username)
     return sorted(sessions, key=lambda x: x[1].get("started", 0))
 
 
 def get_source_sessions(source_id: str) -> list[tuple[str, dict[str, Any]]]:
     """Get all active sessions for a source, sorted by start time (oldest first)."""
-    with _transcode_lock:
-        sessions = [
-            (sid, s) for sid, s in _transcode_sessions.items() if s.get("source_id") == source_id
-        ]
+    sessions = _transcode_sessions.by_source(source_id)
     return sorted(sessions, key=lambda x: x[1].get("started", 0))
 
 
@@ -244,12 +630,15 @@ def enforce_stream_limits(
     Returns error message if source is at capacity and user can't reclaim,
     or None if limits are satisfied.
     """
+    # Limits are checked against index counts; sessions are only listed and
+    # sorted once one has to be stopped.
     # Check source limit first (hard limit - can only reclaim own slots)
     if source_id and source_max > 0:
-        source_sessions = get_source_sessions(source_id)
-        if len(source_sessions) >= source_max:
+        if _transcode_sessions.count_source(source_id) >= source_max:
             user_source_sessions = [
-                (sid, s) for sid, s in source_sessions if s.get("username") == username
+                (sid, s)
+                for sid, s in get_source_sessions(source_id)
+                if s.get("username") == username
             ]
             if user_source_sessions:
                 oldest_sid, _ = user_source_sessions[0]
@@ -266,8 +655,10 @@ def enforce_stream_limits(
 
     # Check user limit (soft limit - auto-rotate oldest)
     if user_max > 0:
-        user_sessions = get_user_sessions(username)
-        if len(user_sessions) >= user_max:
+        # Re-listing can come up empty if a session stopped since the count
+        if _transcode_sessions.count_user(username) >= user_max and (
+            user_sessions := get_user_sessions(username)
+        ):
             oldest_sid, _ = user_sessions[0]
             log.info(
                 "User %s at limit (%d), stopping oldest session %s",
@@ -285,6 +676,90 @@ def enforce_stream_limits(
 # ===========================================================================
 
 
+def _has_segments(path: str) -> bool:
+    """Check if dir contains any segment file (stops at first hit)."""
+    with os.scandir(path) as it:
+        return any(e.name.startswith(SEG_PREFIX) and e.name.endswith(".ts") for e in it)
+
+
+def _read_seek_offset(output_dir: pathlib.Path, info: dict[str, Any]) -> float:
+    """Latest seek offset for a recovered session (sidecar, else session.json)."""
+    try:
+        return float((output_dir / _SEEK_FILE).read_text())
+    except (OSError, ValueError):
+        return info.get("seek_offset", 0)
+
+
+def _write_atomic(path: pathlib.Path, text: str) -> None:
+    """Write via a temp file and rename, so recovery never reads a torn file."""
+    tmp = path.with_name(f"{path.name}.tmp")
+    try:
+        tmp.write_text(text)
+        os.replace(tmp, path)
+    except FileNotFoundError:
+        pass  # Session dir already removed
+    except OSError as e:
+        log.warning("Failed to write %s: %s", path, e)
+
+
+def _write_session_info(path: pathlib.Path, info: dict[str, Any]) -> None:
+    _write_atomic(path, json.dumps(info, separators=(",", ":")))
+
+
+def _persist(fn: Callable[..., None], *args: Any) -> None:
+    """Run a session metadata write in the background, in submit order.
+
+    Metadata is only read by startup recovery, so requests don't wait for it.
+    """
+    global _persist_executor
+    with _persist_executor_lock:
+        if _persist_executor is None:
+            _persist_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="netv-persist",
+            )
+        _persist_executor.submit(fn, *args)
+
+
+def _flush_persist() -> None:
+    """Wait for queued metadata writes to finish."""
+    global _persist_executor
+    with _persist_executor_lock:
+        executor, _persist_executor = _persist_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _inspect_session_dir(
+    entry: os.DirEntry[str], now: float, cache_timeout: int
+) -> tuple[float, dict[str, Any], float] | None:
+    """Read a transcode dir's (mtime, session info, seek offset), or None to remove it.
+
+    Only does I/O, so startup recovery runs it for many dirs in parallel.
+    """
+    try:
+        mtime = entry.stat(follow_symlinks=False).st_mtime
+    except OSError:
+        return None
+
+    # No session.json = orphaned (live session or failed VOD)
+    info_file = os.path.join(entry.path, "session.json")
+    if not os.path.isfile(info_file):
+        return None
+
+    # Expired VOD session
+    if now - mtime > cache_timeout:
+        return None
+
+    # No segments = nothing to recover
+    if not _has_segments(entry.path):
+        return None
+
+    with open(info_file, "rb") as f:
+        info = json.load(f)
+    return mtime, info, _read_seek_offset(pathlib.Path(entry.path), info)
+
+
 def cleanup_and_recover_sessions() -> None:
     """Clean up orphaned transcode dirs and recover valid VOD sessions.
 
@@ -297,76 +772,72 @@ def cleanup_and_recover_sessions() -> None:
     now = time.time()
     removed = recovered = 0
 
-    for d in get_transcode_dir().glob("netv_transcode_*"):
-        if not d.is_dir():
-            continue
-
-        info_file = d / "session.json"
-        try:
-            mtime = d.stat().st_mtime
-        except OSError:
-            shutil.rmtree(d, ignore_errors=True)
-            removed += 1
-            continue
-
-        # No session.json = orphaned (live session or failed VOD)
-        if not info_file.exists():
-            shutil.rmtree(d, ignore_errors=True)
-            removed += 1
-            continue
-
-        # Expired VOD session
-        if now - mtime > cache_timeout:
-            shutil.rmtree(d, ignore_errors=True)
-            removed += 1
-            continue
-
-        # No segments = nothing to recover
-        if not list(d.glob(f"{SEG_PREFIX}*.ts")):
-            shutil.rmtree(d, ignore_errors=True)
-            removed += 1
-            continue
+    # One scandir pass: DirEntry caches d_type and stat, avoiding per-dir syscalls
+    entries = []
+    with os.scandir(get_transcode_dir()) as it:
+        for e in it:
+            if e.name.startswith("netv_transcode_"):
+                entries.append(e)
+            elif e.name.startswith(_TOMBSTONE_PREFIX) and e.is_dir(follow_symlinks=False):
+                # Left over from a previous run that exited mid-delete
+                _get_delete_executor().submit(shutil.rmtree, e.path, True)
+
+    dirs = [e for e in entries if e.is_dir(follow_symlinks=False)]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=_RECOVERY_WORKERS,
+        thread_name_prefix="netv-recover",
+    ) as pool:
+        inspections = [pool.submit(_inspect_session_dir, e, now, cache_timeout) for e in dirs]
+
+    for entry, inspection in zip(dirs, inspections, strict=True):
+        d = pathlib.Path(entry.path)
 
         # Try to recover VOD session
         try:
-            info = json.loads(info_file.read_text())
+            found = inspection.result()
+            if found is None:
+                _remove_dir(d)
+                removed += 1
+                continue
+            mtime, info, new_seek = found
             if not (info.get("is_vod") and info.get("url")):
-                shutil.rmtree(d, ignore_errors=True)
+                _remove_dir(d)
                 removed += 1
                 continue
 
             session_id = info["session_id"]
             url = info["url"]
-            new_seek = info.get("seek_offset", 0)
-
-            with _transcode_lock:
-                _transcode_sessions[session_id] = {
-                    "dir": str(d),
-                    "process": _DeadProcess(),
-                    "started": info.get("started", mtime),
-                    "url": url,
-                    "is_vod": True,
-                    "last_access": now,  # Use current time, not mtime, to avoid immediate expiration
-                    "subtitles": info.get("subtitles") or info.get("subtitle_indices"),
-                    "duration": info.get("duration", 0),
-                    "seek_offset": new_seek,
-                    "series_id": info.get("series_id"),
-                    "episode_id": info.get("episode_id"),
-                    "username": info.get("username", ""),
-                    "source_id": info.get("source_id", ""),
-                }
-                # Prefer session with seek_offset or more recent mtime
-                existing_id = _url_to_session.get(url)
-                if existing_id:
-                    existing = _transcode_sessions.get(existing_id, {})
-                    existing_seek = existing.get("seek_offset", 0)
-                    existing_mtime = existing.get("last_access", 0)
+            sub_info = info.get("subtitles") or info.get("subtitle_indices")
+
+            _transcode_sessions[session_id] = {
+                "lock": threading.Lock(),
+                "dir": str(d),
+                "dir_path": d,
+                "process": _DeadProcess(),
+                "started": info.get("started", mtime),
+                "url": url,
+                "is_vod": True,
+                # Use current time, not mtime, to avoid immediate expiration
+                "last_access_ns": time.monotonic_ns(),
+                "subtitles": sub_info,
+                "subtitle_tracks": _build_subtitle_tracks(session_id, sub_info),
+                "duration": info.get("duration", 0),
+                "seek_offset": new_seek,
+                "series_id": info.get("series_id"),
+                "episode_id": info.get("episode_id"),
+                "username": info.get("username", ""),
+                "source_id": info.get("source_id", ""),
+            }
+            # Prefer session with seek_offset or more recent mtime
+            with _url_lock:
+                if existing := _url_to_session.get(url):
+                    _, existing_seek, existing_mtime = existing
                     if (new_seek > 0 and existing_seek == 0) or (
                         existing_seek == 0 and new_seek == 0 and mtime > existing_mtime
                     ):
-                        _url_to_session[url] = session_id
+                        _url_to_session[url] = (session_id, new_seek, mtime)
                 else:
-                    _url_to_session[url] = session_id
+                    _url_to_session[url] = (session_id, new_seek, mtime)
 
             # Restore probe cache
             if p := info.get("probe"):
@@ -395,10 +866,12 @@ def cleanup_and_recover_sessions() -> None:
                     info.get("episode_id"),
                 )
             recovered += 1
+            _session_stats["recovery_ok"] += 1
             log.debug("Recovered VOD session %s for %s", session_id, url[:50])
         except Exception as e:
+            _session_stats["recovery_fail"] += 1
             log.warning("Failed to recover session from %s: %s", d, e)
-            shutil.rmtree(d, ignore_errors=True)
+            _remove_dir(d)
             removed += 1
 
     if removed or recovered:
@@ -414,22 +887,41 @@ def cleanup_and_recover_sessions() -> None:
 # ===========================================================================
 
 
+def _decode_stderr_line(line: bytes) -> str:
+    return line.decode(errors="replace").rstrip()
+
+
+def _log_ffmpeg_line(
+    line: bytes,
+    session_id: str,
+    stderr_lines: deque[bytes] | None,
+) -> None:
+    if stderr_lines is not None:
+        stderr_lines.append(line)
+    is_fatal = any(marker in line for marker in _FATAL_MARKERS)
+    level = logging.WARNING if is_fatal else logging.DEBUG
+    if log.isEnabledFor(level):
+        log.log(level, "ffmpeg:%s %s", session_id, _decode_stderr_line(line))
+
+
 async def _monitor_ffmpeg_stderr(
     process: asyncio.subprocess.Process,
     session_id: str,
-    stderr_lines: list[str] | None = None,
+    stderr_lines: deque[bytes] | None = None,
 ) -> None:
+    """Log ffmpeg stderr, reading in chunks rather than awaiting per line."""
     assert process.stderr is not None
+    buf = b""
     while True:
-        line = await process.stderr.readline()
-        if not line:
+        chunk = await process.stderr.read(_STDERR_READ_BYTES)
+        if not chunk:
             break
-        text = line.decode().rstrip()
-        if stderr_lines is not None:
-            stderr_lines.append(text)
-        is_fatal = "fatal" in text.lower() or "aborting" in text.lower()
-        level = logging.WARNING if is_fatal else logging.DEBUG
-        log.log(level, "ffmpeg:%s %s", session_id, text)
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            _log_ffmpeg_line(line, session_id, stderr_lines)
+    if buf:
+        _log_ffmpeg_line(buf, session_id, stderr_lines)
 
 
 async def _monitor_resume_ffmpeg(
@@ -437,7 +929,7 @@ async def _monitor_resume_ffmpeg(
     session_id: str,
     url: str,
 ) -> None:
-    start_time = time.time()
+    start_time = time.monotonic()
     await _monitor_ffmpeg_stderr(process, session_id)
     await process.wait()
     if process.returncode != 0:
@@ -446,14 +938,14 @@ async def _monitor_resume_ffmpeg(
             process.returncode,
             session_id,
         )
-        if time.time() - start_time < _QUICK_FAILURE_THRESHOLD_SEC:
+        if time.monotonic() - start_time < _QUICK_FAILURE_THRESHOLD_SEC:
             log.info("Resume failed quickly, invalidating session %s", session_id)
-            with _transcode_lock:
-                _url_to_session.pop(url, None)
-                session = _transcode_sessions.pop(session_id, None)
+            _unmap_url(url, session_id)
+            session = _transcode_sessions.pop(session_id, None)
             # Clean up output directory
             if session:
-                shutil.rmtree(session["dir"], ignore_errors=True)
+                _forget_hls_progress(session["dir"])
+                _remove_dir(session["dir"])
 
 
 async def _monitor_seek_ffmpeg(
@@ -470,8 +962,70 @@ async def _monitor_seek_ffmpeg(
         )
 
 
-def _spawn_background_task(coro: Any) -> None:
-    task = asyncio.create_task(coro)
+async def _spawn_ffmpeg(cmd: list[str]) -> asyncio.subprocess.Process:
+    """Start ffmpeg with only stderr piped.
+
+    ffmpeg writes its output to files, so stdout goes to /dev/null instead of
+    an unread pipe. No preexec_fn is passed, which keeps CPython on its
+    vfork/posix_spawn path rather than a full fork of this process.
+    """
+    return await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+
+async def _singleflight(
+    inflight: dict[Any, asyncio.Future[Any]],
+    key: Any,
+    run: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Await run() once per key; concurrent callers with that key share its outcome.
+
+    Only used from the event loop, with no await between the lookup and the
+    insert, so the inflight map needs no lock.
+    """
+    if pending := inflight.get(key):
+        return await asyncio.shield(pending)
+    fut = asyncio.get_running_loop().create_future()
+    inflight[key] = fut
+    try:
+        result = await run()
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()  # Mark retrieved; no joiner may be waiting
+        raise
+    except asyncio.CancelledError:
+        fut.set_exception(HTTPException(503, "Request was cancelled"))
+        fut.exception()
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        inflight.pop(key, None)
+
+
+async def _probe_media_shared(
+    url: str,
+    series_id: int | None = None,
+    episode_id: int | None = None,
+    series_name: str = "",
+) -> tuple[MediaInfo | None, list[SubtitleStream]]:
+    """probe_media off the event loop; concurrent misses share one ffprobe."""
+    return await _singleflight(
+        _inflight_probes,
+        (url, series_id, episode_id),
+        lambda: asyncio.to_thread(probe_media, url, series_id, episode_id, series_name),
+    )
+
+
+def _spawn_background_task(coro: Any, name: str) -> None:
+    # The event loop only keeps weak references to tasks, so the set must hold
+    # strong ones until each task finishes
+    task = asyncio.create_task(coro, name=name)
     _background_tasks.add(task)
     task.add_done_callback(_background_tasks.discard)
 
@@ -481,6 +1035,12 @@ def _spawn_background_task(coro: Any) -> None:
 # ===========================================================================
 
 
+async def _sleep_or_exit(process: asyncio.subprocess.Process, delay: float) -> None:
+    """Sleep up to delay seconds, waking as soon as the process exits."""
+    with contextlib.suppress(TimeoutError):
+        await asyncio.wait_for(process.wait(), timeout=delay)
+
+
 async def _wait_for_playlist(
     playlist_path: pathlib.Path,
     process: asyncio.subprocess.Process,
@@ -490,31 +1050,151 @@ async def _wait_for_playlist(
     """Wait for playlist with min_segments, checking process health."""
     output_dir = playlist_path.parent
     deadline = time.monotonic() + timeout_sec
+    delay = _POLL_INTERVAL_MIN_SEC
     while time.monotonic() < deadline:
         if process.returncode is not None:
             return False
-        if playlist_path.exists():
-            content = playlist_path.read_text()
-            seg_count = content.count("#EXTINF")
+        progress = _read_hls_progress(playlist_path)
+        if progress:
+            seg_count = progress[0]
             if seg_count >= min_segments:
-                seg_files = list(output_dir.glob(f"{SEG_PREFIX}*.ts"))
-                if len(seg_files) >= min_segments:
-                    first_seg = min(seg_files, key=lambda f: f.name)
+                segments = _scan_segments(output_dir)
+                if len(segments) >= min_segments:
+                    first_seg = output_dir / segments[0][1]
                     if (
                         first_seg.stat().st_size > _MIN_SEGMENT_SIZE_BYTES
                         and process.returncode is None
                     ):
                         return True
-        await asyncio.sleep(_POLL_INTERVAL_SEC)
+        await _sleep_or_exit(process, delay)
+        delay = min(delay * _POLL_BACKOFF, _POLL_INTERVAL_MAX_SEC)
     return False
 
 
-def _calc_hls_duration(playlist_path: pathlib.Path, segment_count: int) -> float:
-    """Calculate HLS duration from playlist or estimate from segment count."""
-    if playlist_path.exists():
-        durations = re.findall(r"#EXTINF:([\d.]+)", playlist_path.read_text())
-        if durations:
-            return sum(float(d) for d in durations)
+_HLS_TAIL_BYTES = 64  # Bytes kept to detect a rewritten (non-appended) playlist
+_HLS_MMAP_MIN_BYTES = 256 * 1024  # Unparsed bytes above which the file is mmapped
+
+
+def _scan_extinf(
+    data: bytes | mmap.mmap, begin: int = 0, stop: int | None = None
+) -> tuple[int, float]:
+    """Count and sum #EXTINF durations in complete playlist lines.
+
+    Jumps between tags with find (linear, no regex backtracking) and only
+    slices the duration field of each match, so an mmap is scanned in place.
+    """
+    if stop is None:
+        stop = len(data)
+    count = 0
+    total = 0.0
+    pos = data.find(b"#EXTINF:", begin, stop)
+    while pos != -1:
+        start = pos + 8
+        end = data.find(b"\n", start, stop)
+        if end == -1:
+            end = stop
+        with contextlib.suppress(ValueError):
+            total += float(data[start:end].split(b",", 1)[0])
+            count += 1
+        pos = data.find(b"#EXTINF:", end, stop)
+    return count, total
+
+
+def _read_hls_progress(playlist_path: pathlib.Path) -> tuple[int, float] | None:
+    """Get (segment_count, duration) from playlist, or None if missing.
+
+    An unchanged stat (inode, mtime, size) returns the cached result without
+    opening the file. ffmpeg only appends to VOD playlists, so otherwise only
+    bytes written since the last call are parsed. If the previously parsed
+    tail no longer matches (playlist regenerated or header rewritten), the
+    whole file is parsed again.
+    """
+    key = str(playlist_path)
+    cached = _hls_progress.get(key)
+    try:
+        st = os.stat(playlist_path)
+    except OSError:
+        _hls_progress.pop(key, None)
+        return None
+    sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if cached and cached[0] == sig:
+        return cached[3], cached[4]
+    _, offset, tail, count, total = cached or ((0, 0, 0), 0, b"", 0, 0.0)
+    try:
+        with open(playlist_path, "rb") as f:
+            if offset:
+                f.seek(offset - len(tail))
+                if f.read(len(tail)) != tail:
+                    offset, tail, count, total = 0, b"", 0, 0.0
+                    f.seek(0)
+            if st.st_size - offset >= _HLS_MMAP_MIN_BYTES:
+                # Large first parse: scan the page cache in place, no copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    end = mm.rfind(b"\n", offset) + 1  # Only consume complete lines
+                    if end > offset:
+                        new_count, new_total = _scan_extinf(mm, offset, end)
+                        count += new_count
+                        total += new_total
+                        tail = (tail + mm[max(offset, end - _HLS_TAIL_BYTES) : end])[
+                            -_HLS_TAIL_BYTES:
+                        ]
+                        offset = end
+            else:
+                data = f.read()
+                end = data.rfind(b"\n") + 1  # Only consume complete lines
+                if end:
+                    new_count, new_total = _scan_extinf(data, 0, end)
+                    count += new_count
+                    total += new_total
+                    offset += end
+                    tail = (tail + data[:end])[-_HLS_TAIL_BYTES:]
+    except (OSError, ValueError):
+        _hls_progress.pop(key, None)
+        return None
+    _hls_progress[key] = (sig, offset, tail, count, total)
+    return count, total
+
+
+def _forget_hls_progress(output_dir: str | pathlib.Path) -> None:
+    """Drop incremental playlist state for an output dir."""
+    _hls_progress.pop(str(pathlib.Path(output_dir) / "stream.m3u8"), None)
+
+
+def _count_segments(output_dir: str | pathlib.Path) -> int:
+    with os.scandir(output_dir) as it:
+        return sum(1 for e in it if e.name.startswith(SEG_PREFIX) and e.name.endswith(".ts"))
+
+
+def _scan_segments(output_dir: str | pathlib.Path) -> list[tuple[int, str]]:
+    """List (segment number, filename) sorted by number, from one directory scan."""
+    segments = []
+    try:
+        with os.scandir(output_dir) as it:
+            for e in it:
+                name = e.name
+                if name.startswith(SEG_PREFIX) and name.endswith(".ts"):
+                    with contextlib.suppress(ValueError):
+                        segments.append((int(name[len(SEG_PREFIX) : -3]), name))
+    except FileNotFoundError:
+        return []
+    segments.sort()
+    return segments
+
+
+def _calc_hls_duration(playlist_path: pathlib.Path, segment_count: int | None = None) -> float:
+    """Calculate HLS duration from playlist or estimate from segment count.
+
+    If segment_count is None, segments are only counted when the playlist is
+    missing or empty.
+    """
+    progress = _read_hls_progress(playlist_path)
+    if progress and progress[0]:
+        return progress[1]
+    if segment_count is None:
+        try:
+            segment_count = _count_segments(playlist_path.parent)
+        except OSError:
+            segment_count = 0
     return segment_count * get_hls_segment_duration()
 
 
@@ -535,20 +1215,53 @@ def _build_subtitle_tracks(
     ]
 
 
+def _segment_complete(output_dir: pathlib.Path, seg_num: int, seg_name: str) -> bool:
+    """Check a segment is complete, remembering the answer once it is."""
+    known = _complete_segments.setdefault(str(output_dir), set())
+    if seg_num in known:
+        return True
+    try:
+        if os.stat(output_dir / seg_name).st_size <= _MIN_SEGMENT_SIZE_BYTES:
+            return False
+    except OSError:
+        return False
+    known.add(seg_num)
+    return True
+
+
+def _clear_seek_outputs(output_dir: pathlib.Path, start_segment: int) -> None:
+    """Delete segments from start_segment on and all subtitle files, in one scan."""
+    try:
+        with os.scandir(output_dir) as it:
+            doomed = [
+                e.path
+                for e in it
+                if (e.name.startswith("sub") and e.name.endswith(".vtt"))
+                or (
+                    e.name.startswith(SEG_PREFIX)
+                    and e.name.endswith(".ts")
+                    and e.name[len(SEG_PREFIX) : -3].isdigit()
+                    and int(e.name[len(SEG_PREFIX) : -3]) >= start_segment
+                )
+            ]
+    except FileNotFoundError:
+        return
+    for path in doomed:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+
 def _regenerate_playlist(output_dir: pathlib.Path, start_segment: int) -> None:
     """Regenerate HLS playlist starting from a specific segment (for smart seek)."""
     playlist_path = output_dir / "stream.m3u8"
     seg_duration = get_hls_segment_duration()
 
     # Find all existing segments from start_segment onwards
-    segments = []
-    for seg_file in sorted(output_dir.glob(f"{SEG_PREFIX}*.ts")):
-        try:
-            seg_num = int(seg_file.stem[len(SEG_PREFIX) :])
-            if seg_num >= start_segment and seg_file.stat().st_size > _MIN_SEGMENT_SIZE_BYTES:
-                segments.append((seg_num, seg_file.name))
-        except ValueError:
-            pass
+    segments = [
+        (seg_num, seg_name)
+        for seg_num, seg_name in _scan_segments(output_dir)
+        if seg_num >= start_segment and _segment_complete(output_dir, seg_num, seg_name)
+    ]
 
     if not segments:
         return
@@ -566,7 +1279,12 @@ def _regenerate_playlist(output_dir: pathlib.Path, start_segment: int) -> None:
         lines.append(f"#EXTINF:{seg_duration:.6f},")
         lines.append(seg_name)
 
-    playlist_path.write_text("\n".join(lines) + "\n")
+    # Publish with a rename so players polling the playlist never read a
+    # partial file. Not stream.m3u8.tmp: ffmpeg uses that name for its own writes.
+    tmp_path = output_dir / "stream.m3u8.regen"
+    tmp_path.write_text("\n".join(lines) + "\n")
+    os.replace(tmp_path, playlist_path)
+    _forget_hls_progress(output_dir)
     log.debug("Regenerated playlist with %d segments starting at %d", len(segments), start_segment)
 
 
@@ -575,41 +1293,56 @@ def _regenerate_playlist(output_dir: pathlib.Path, start_segment: int) -> None:
 # ===========================================================================
 
 
-@dataclass(slots=True)
+@dataclass(frozen=True, slots=True)
 class _SessionSnapshot:
     """Immutable snapshot of session state for lock-free access."""
 
     output_dir: str
+    output_path: pathlib.Path
     process: Any
     seek_offset: float
-    subtitles: list[dict[str, Any]]
+    subtitle_tracks: list[dict[str, Any]]
     duration: float
 
 
-def _get_session_snapshot(session_id: str) -> _SessionSnapshot | None:
-    """Get atomic snapshot of session state under lock."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        if not session:
-            return None
-        session["last_access"] = time.time()
-        return _SessionSnapshot(
+def _session_snapshot(session: dict[str, Any]) -> _SessionSnapshot:
+    """Get the session's cached snapshot, building it if missing. Call under lock.
+
+    Code that changes a snapshotted field must pop "_snapshot" so the next
+    reader rebuilds it.
+    """
+    snap = session.get("_snapshot")
+    if snap is None:
+        snap = session["_snapshot"] = _SessionSnapshot(
             output_dir=session["dir"],
+            output_path=_dir_path(session),
             process=session["process"],
             seek_offset=session.get("seek_offset", 0),
-            subtitles=session.get("subtitles") or [],
+            subtitle_tracks=session.get("subtitle_tracks") or [],
             duration=session.get("duration", 0),
         )
+    return snap
+
+
+def _get_session_snapshot(session_id: str) -> _SessionSnapshot | None:
+    """Get atomic snapshot of session state under the session lock."""
+    session = _lookup_session(session_id)
+    if not session:
+        return None
+    with _session_lock(session):
+        session["last_access_ns"] = time.monotonic_ns()
+        return _session_snapshot(session)
 
 
 def _update_session_process(session_id: str, process: Any) -> bool:
     """Atomically update session process. Returns False if session gone."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        if not session:
-            return False
+    session = _lookup_session(session_id)
+    if not session:
+        return False
+    with _session_lock(session):
         session["process"] = process
-        return True
+        session.pop("_snapshot", None)
+    return True
 
 
 def _build_session_response(
@@ -618,14 +1351,13 @@ def _build_session_response(
     playlist_path: pathlib.Path,
 ) -> dict[str, Any]:
     """Build response dict for existing session, recalculating duration."""
-    segments = list(playlist_path.parent.glob(f"{SEG_PREFIX}*.ts"))
     return {
         "session_id": session_id,
         "playlist": f"/transcode/{session_id}/stream.m3u8",
-        "subtitles": _build_subtitle_tracks(session_id, snap.subtitles),
+        "subtitles": snap.subtitle_tracks,
         "duration": snap.duration,
         "seek_offset": snap.seek_offset,
-        "transcoded_duration": _calc_hls_duration(playlist_path, len(segments)),
+        "transcoded_duration": _calc_hls_duration(playlist_path),
     }
 
 
@@ -634,15 +1366,40 @@ def _build_session_response(
 # ===========================================================================
 
 
+_PROBE_SETTING = {"movie": "probe_movies", "series": "probe_series", "live": "probe_live"}
+
+
+@dataclass(frozen=True, slots=True)
+class _TranscodeContext:
+    """Transcode settings resolved once per start/seek request."""
+
+    hw: HwAccel
+    max_resolution: str
+    quality: str
+    is_vod: bool
+    do_probe: bool
+
+    @classmethod
+    def from_settings(cls, content_type: str) -> _TranscodeContext:
+        settings = get_settings()
+        return cls(
+            hw=settings.get("transcode_hw", "software"),
+            max_resolution=settings.get("max_resolution", "1080p"),
+            quality=settings.get("quality", "high"),
+            is_vod=content_type in ("movie", "series"),
+            do_probe=settings.get(_PROBE_SETTING.get(content_type, ""), False),
+        )
+
+
 def _get_existing_session(url: str) -> tuple[str | None, bool, float]:
     """Get existing session info atomically. Returns (session_id, is_valid, seek_offset)."""
-    with _transcode_lock:
-        existing_id = _url_to_session.get(url)
-        if not existing_id:
-            return None, False, 0.0
-        session = _transcode_sessions.get(existing_id)
-        if not session:
-            return None, False, 0.0
+    with _url_lock:
+        entry = _url_to_session.get(url)
+    existing_id = entry[0] if entry else None
+    session = _transcode_sessions.get(existing_id) if existing_id else None
+    if not existing_id or not session:
+        return None, False, 0.0
+    with _session_lock(session):
         return (
             existing_id,
             is_session_valid(session),
@@ -653,10 +1410,7 @@ def _get_existing_session(url: str) -> tuple[str | None, bool, float]:
 async def _handle_existing_vod_session(
     existing_id: str,
     url: str,
-    hw: HwAccel,
-    do_probe: bool,
-    max_resolution: str = "1080p",
-    quality: str = "high",
+    ctx: _TranscodeContext,
 ) -> dict[str, Any] | None:
     """Handle existing VOD session: reuse active, return cached, or append.
 
@@ -666,8 +1420,7 @@ async def _handle_existing_vod_session(
     if not snap:
         return None
 
-    playlist_path = pathlib.Path(snap.output_dir) / "stream.m3u8"
-    segments = sorted(pathlib.Path(snap.output_dir).glob(f"{SEG_PREFIX}*.ts"))
+    playlist_path = snap.output_path / "stream.m3u8"
 
     # Case 1: Active session - reuse it
     if snap.process.returncode is None:
@@ -681,10 +1434,10 @@ async def _handle_existing_vod_session(
         return _build_session_response(existing_id, snap, playlist_path)
 
     # Case 2: Dead session with no segments - invalid
+    segments = _scan_segments(snap.output_path)
     if not segments:
         stop_session(existing_id, force=True)
-        with _transcode_lock:
-            _url_to_session.pop(url, None)
+        _unmap_url(url, existing_id)
         return None
 
     # Case 3: Dead session with seek_offset - return cached content
@@ -701,17 +1454,17 @@ async def _handle_existing_vod_session(
     log.info("Resuming session %s from %.1fs", existing_id, hls_duration)
 
     media_info = (
-        (await asyncio.to_thread(probe_media, url, None, None, ""))[0] if do_probe else None
+        (await _probe_media_shared(url))[0] if ctx.do_probe else None
     )
     cmd = build_hls_ffmpeg_cmd(
         url,
-        hw,
+        ctx.hw,
         snap.output_dir,
         True,
         None,
         media_info,
-        max_resolution,
-        quality,
+        ctx.max_resolution,
+        ctx.quality,
         get_user_agent(),
         None,
     )
@@ -726,28 +1479,27 @@ async def _handle_existing_vod_session(
         cmd.extend(["-hls_flags", "append_list"])
     cmd.extend(["-start_number", str(len(segments))])
 
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdin=asyncio.subprocess.DEVNULL,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
+    process = await _spawn_ffmpeg(cmd)
     if not _update_session_process(existing_id, process):
         _kill_process(process)
         return None
 
-    _spawn_background_task(_monitor_resume_ffmpeg(process, existing_id, url))
+    _spawn_background_task(
+        _monitor_resume_ffmpeg(process, existing_id, url), f"ffmpeg-resume:{existing_id}"
+    )
     log.info("Started resume ffmpeg pid=%s for %s", process.pid, existing_id)
 
     deadline = time.monotonic() + _RESUME_SEGMENT_WAIT_TIMEOUT_SEC
     next_seg = f"{SEG_PREFIX}{len(segments):03d}.ts"
+    delay = _POLL_INTERVAL_MIN_SEC
     while time.monotonic() < deadline:
         if process.returncode is not None:
             log.warning("Resume ffmpeg died immediately for %s", existing_id)
             return None
-        if (pathlib.Path(snap.output_dir) / next_seg).exists():
+        if (snap.output_path / next_seg).exists():
             break
-        await asyncio.sleep(_POLL_INTERVAL_SEC)
+        await _sleep_or_exit(process, delay)
+        delay = min(delay * _POLL_BACKOFF, _POLL_INTERVAL_MAX_SEC)
 
     await _wait_for_playlist(
         playlist_path,
@@ -761,35 +1513,23 @@ async def _handle_existing_vod_session(
 async def _try_reuse_session(
     existing_id: str,
     url: str,
-    is_vod: bool,
-    content_type: str,
+    ctx: _TranscodeContext,
 ) -> dict[str, Any] | None:
     """Try to reuse an existing valid session. Returns response or None if can't reuse."""
-    if is_vod:
-        settings = get_settings()
-        return await _handle_existing_vod_session(
-            existing_id,
-            url,
-            settings.get("transcode_hw", "software"),
-            settings.get(
-                {"movie": "probe_movies", "series": "probe_series"}.get(content_type, ""), False
-            ),
-            settings.get("max_resolution", "1080p"),
-            settings.get("quality", "high"),
-        )
+    if ctx.is_vod:
+        return await _handle_existing_vod_session(existing_id, url, ctx)
 
     # Live: return existing session if snapshot available
     snap = _get_session_snapshot(existing_id)
     if not snap:
         return None
-    playlist_path = pathlib.Path(snap.output_dir) / "stream.m3u8"
+    playlist_path = snap.output_path / "stream.m3u8"
     return _build_session_response(existing_id, snap, playlist_path)
 
 
 def _cleanup_invalid_session(url: str, session_id: str) -> None:
     """Clean up an invalid/expired session."""
-    with _transcode_lock:
-        _url_to_session.pop(url, None)
+    _unmap_url(url, session_id)
     stop_session(session_id, force=True)
 
 
@@ -800,7 +1540,7 @@ def _cleanup_invalid_session(url: str, session_id: str) -> None:
 
 async def _do_start_transcode(
     url: str,
-    content_type: str,
+    ctx: _TranscodeContext,
     series_id: int | None,
     episode_id: int | None,
     old_seek_offset: float,
@@ -810,27 +1550,16 @@ async def _do_start_transcode(
     source_id: str = "",
 ) -> dict[str, Any]:
     """Core transcode logic. Raises HTTPException on failure."""
-    settings = get_settings()
-    hw = settings.get("transcode_hw", "software")
-    max_resolution = settings.get("max_resolution", "1080p")
-    quality = settings.get("quality", "high")
-    is_vod = content_type in ("movie", "series")
-    probe_key = {"movie": "probe_movies", "series": "probe_series", "live": "probe_live"}
-    do_probe = settings.get(probe_key.get(content_type, ""), False)
-
+    is_vod = ctx.is_vod
     session_id = str(uuid.uuid4())
-    output_dir = tempfile.mkdtemp(
-        prefix=f"netv_transcode_{session_id}_",
-        dir=get_transcode_dir(),
-    )
-    playlist_path = pathlib.Path(output_dir) / "stream.m3u8"
+    output_dir = _acquire_output_dir(session_id)
+    output_path = pathlib.Path(output_dir)
+    playlist_path = output_path / "stream.m3u8"
 
     media_info: MediaInfo | None = None
     subtitles: list[SubtitleStream] = []
-    if do_probe:
-        media_info, subtitles = await asyncio.to_thread(
-            probe_media, url, series_id, episode_id, series_name
-        )
+    if ctx.do_probe:
+        media_info, subtitles = await _probe_media_shared(url, series_id, episode_id, series_name)
         if media_info:
             subs_str = (
                 ",".join(media_info.subtitle_codecs) if media_info.subtitle_codecs else "none"
@@ -858,13 +1587,13 @@ async def _do_start_transcode(
 
     cmd = build_hls_ffmpeg_cmd(
         url,
-        hw,
+        ctx.hw,
         output_dir,
         is_vod,
         subtitles,
         media_info,
-        max_resolution,
-        quality,
+        ctx.max_resolution,
+        ctx.quality,
         get_user_agent(),
         deinterlace_fallback,
     )
@@ -881,36 +1610,37 @@ async def _do_start_transcode(
         " ".join(cmd),
     )
 
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdin=asyncio.subprocess.DEVNULL,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
+    process = await _spawn_ffmpeg(cmd)
 
-    stderr_lines: list[str] = []
-    _spawn_background_task(_monitor_ffmpeg_stderr(process, session_id, stderr_lines))
+    stderr_lines: deque[bytes] = deque(maxlen=_STDERR_TAIL_LINES)
+    _spawn_background_task(
+        _monitor_ffmpeg_stderr(process, session_id, stderr_lines), f"ffmpeg-stderr:{session_id}"
+    )
 
     sub_info = [{"index": s.index, "lang": s.lang, "name": s.name} for s in subtitles]
+    sub_tracks = _build_subtitle_tracks(session_id, sub_info)
     total_duration = media_info.duration if media_info else 0.0
 
-    with _transcode_lock:
-        _transcode_sessions[session_id] = {
-            "dir": output_dir,
-            "process": process,
-            "started": time.time(),
-            "url": url,
-            "is_vod": is_vod,
-            "last_access": time.time(),
-            "subtitles": sub_info,
-            "duration": total_duration,
-            "seek_offset": old_seek_offset,
-            "series_id": series_id,
-            "episode_id": episode_id,
-            "username": username,
-            "source_id": source_id,
-        }
-        _url_to_session[url] = session_id
+    _transcode_sessions[session_id] = {
+        "lock": threading.Lock(),
+        "dir": output_dir,
+        "dir_path": output_path,
+        "process": process,
+        "started": time.time(),
+        "url": url,
+        "is_vod": is_vod,
+        "last_access_ns": time.monotonic_ns(),
+        "subtitles": sub_info,
+        "subtitle_tracks": sub_tracks,
+        "duration": total_duration,
+        "seek_offset": old_seek_offset,
+        "series_id": series_id,
+        "episode_id": episode_id,
+        "username": username,
+        "source_id": source_id,
+    }
+    with _url_lock:
+        _url_to_session[url] = (session_id, old_seek_offset, time.time())
 
     if is_vod:
         session_info: dict[str, Any] = {
@@ -938,13 +1668,13 @@ async def _do_start_transcode(
                 "video_bitrate": media_info.video_bitrate,
                 "interlaced": media_info.interlaced,
             }
-        (pathlib.Path(output_dir) / "session.json").write_text(json.dumps(session_info))
+        _persist(_write_session_info, output_path / "session.json", session_info)
 
     timeout = _PLAYLIST_WAIT_SEEK_TIMEOUT_SEC if old_seek_offset > 0 else _PLAYLIST_WAIT_TIMEOUT_SEC
     if not await _wait_for_playlist(
         playlist_path,
         process,
-        min_segments=2,
+        min_segments=_START_MIN_SEGMENTS_VOD if is_vod else _START_MIN_SEGMENTS_LIVE,
         timeout_sec=timeout,
     ):
         # Wait for process to fully exit and stderr to be captured
@@ -952,7 +1682,11 @@ async def _do_start_transcode(
             await asyncio.wait_for(process.wait(), timeout=1.0)
         # Give stderr monitor time to process final output
         await asyncio.sleep(0.1)
-        error_msg = "\n".join(stderr_lines[-10:]) if stderr_lines else "unknown"
+        error_msg = (
+            "\n".join(_decode_stderr_line(line) for line in list(stderr_lines)[-10:])
+            if stderr_lines
+            else "unknown"
+        )
         log.error(
             "ffmpeg:%s failed (exit %d): %s",
             session_id,
@@ -965,7 +1699,7 @@ async def _do_start_transcode(
     return {
         "session_id": session_id,
         "playlist": f"/transcode/{session_id}/stream.m3u8",
-        "subtitles": _build_subtitle_tracks(session_id, sub_info),
+        "subtitles": sub_tracks,
         "duration": total_duration,
         "seek_offset": old_seek_offset,
     }
@@ -990,15 +1724,45 @@ async def start_transcode(
         if error:
             raise HTTPException(status_code=429, detail=error)
 
-    is_vod = content_type in ("movie", "series")
+    # Concurrent starts for the same URL share one session
+    result = await _singleflight(
+        _inflight_starts,
+        url,
+        lambda: _start_or_reuse_transcode(
+            url,
+            content_type,
+            series_id,
+            episode_id,
+            series_name,
+            deinterlace_fallback,
+            username,
+            source_id,
+        ),
+    )
+    return dict(result)
+
+
+async def _start_or_reuse_transcode(
+    url: str,
+    content_type: str,
+    series_id: int | None,
+    episode_id: int | None,
+    series_name: str,
+    deinterlace_fallback: bool,
+    username: str,
+    source_id: str,
+) -> dict[str, Any]:
+    ctx = _TranscodeContext.from_settings(content_type)
     existing_id, is_valid, old_seek_offset = _get_existing_session(url)
 
     # Try to reuse existing valid session
     if existing_id and is_valid:
-        log.info("Found valid existing session %s (vod=%s)", existing_id, is_vod)
-        result = await _try_reuse_session(existing_id, url, is_vod, content_type)
+        log.info("Found valid existing session %s (vod=%s)", existing_id, ctx.is_vod)
+        result = await _try_reuse_session(existing_id, url, ctx)
         if result:
+            _session_stats["session_reuse_hit"] += 1
             return result
+    _session_stats["session_reuse_miss"] += 1
 
     # Clean up any existing invalid session
     if existing_id:
@@ -1009,7 +1773,7 @@ async def start_transcode(
     try:
         return await _do_start_transcode(
             url,
-            content_type,
+            ctx,
             series_id,
             episode_id,
             old_seek_offset,
@@ -1025,7 +1789,7 @@ async def start_transcode(
         invalidate_series_probe_cache(series_id, episode_id)
         return await _do_start_transcode(
             url,
-            content_type,
+            ctx,
             series_id,
             episode_id,
             old_seek_offset,
@@ -1043,42 +1807,79 @@ async def start_transcode(
 
 def get_session(session_id: str) -> dict[str, Any] | None:
     """Get a copy of session dict (safe to use outside lock)."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        return dict(session) if session else None
+    session = _transcode_sessions.get(session_id)
+    if not session:
+        return None
+    with _session_lock(session):
+        return dict(session)
+
+
+def get_session_dir(session_id: str) -> pathlib.Path | None:
+    """Get a session's output dir without copying the session.
+
+    For per-request file serving; the dir never changes for a session's life.
+    """
+    session = _lookup_session(session_id)
+    return _dir_path(session) if session else None
 
 
 def touch_session(session_id: str) -> bool:
-    """Update session last_access timestamp (heartbeat). Returns True if session exists."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        if session:
-            session["last_access"] = time.time()
-            return True
+    """Update session heartbeat timestamp. Returns True if session exists."""
+    session = _lookup_session(session_id)
+    if not session:
         return False
+    # A single int store needs no session lock; readers tolerate either value
+    session["last_access_ns"] = time.monotonic_ns()
+    return True
 
 
 def get_session_progress(session_id: str) -> dict[str, Any] | None:
     """Get transcode progress for a session."""
-    touch_session(session_id)
-
-    session = get_session(session_id)
+    session = _lookup_session(session_id)
     if not session:
         return None
-    playlist_path = pathlib.Path(session["dir"]) / "stream.m3u8"
-    if not playlist_path.exists():
+    session["last_access_ns"] = time.monotonic_ns()  # Same lock-free store as touch_session
+    progress = _read_hls_progress(_dir_path(session) / "stream.m3u8")
+    if not progress:
         return {"segment_count": 0, "duration": 0.0}
-    durations = re.findall(r"#EXTINF:([\d.]+)", playlist_path.read_text())
-    return {
-        "segment_count": len(durations),
-        "duration": sum(float(d) for d in durations),
+    return {"segment_count": progress[0], "duration": progress[1]}
+
+
+def get_cache_stats() -> dict[str, Any]:
+    """Get probe cache and session reuse counters with derived hit ratios."""
+    counters: dict[str, int] = {
+        key: 0
+        for key in (
+            "probe_hit",
+            "probe_miss",
+            "series_probe_hit",
+            "series_probe_miss",
+            "session_reuse_hit",
+            "session_reuse_miss",
+            "recovery_ok",
+            "recovery_fail",
+            "session_expired",
+        )
     }
+    counters.update(get_probe_cache_counters())
+    counters.update(_session_stats)
+    ratios: dict[str, float | None] = {}
+    for name, hit_key, miss_key in (
+        ("probe", "probe_hit", "probe_miss"),
+        ("series_probe", "series_probe_hit", "series_probe_miss"),
+        ("session_reuse", "session_reuse_hit", "session_reuse_miss"),
+    ):
+        total = counters[hit_key] + counters[miss_key]
+        ratios[name] = counters[hit_key] / total if total else None
+    active = len(_transcode_sessions)
+    return {"counters": counters, "hit_ratios": ratios, "active_sessions": active}
 
 
 def clear_url_session(url: str) -> str | None:
     """Clear URL-to-session mapping."""
-    with _transcode_lock:
-        return _url_to_session.pop(url, None)
+    with _url_lock:
+        entry = _url_to_session.pop(url, None)
+    return entry[0] if entry else None
 
 
 # ===========================================================================
@@ -1100,10 +1901,10 @@ class _SeekSessionInfo:
 
 def _get_seek_session_info(session_id: str) -> _SeekSessionInfo | None:
     """Get session info for seek atomically. Returns None if not VOD."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        if not session or not session.get("is_vod"):
-            return None
+    session = _lookup_session(session_id)
+    if not session or not session.get("is_vod"):
+        return None
+    with _session_lock(session):
         return _SeekSessionInfo(
             url=session["url"],
             output_dir=session["dir"],
@@ -1121,15 +1922,17 @@ def _update_seek_session(
     seek_time: float,
 ) -> bool:
     """Update session after seek. Returns False if session gone."""
-    with _transcode_lock:
-        session = _transcode_sessions.get(session_id)
-        if not session:
-            return False
+    session = _lookup_session(session_id)
+    if not session:
+        return False
+    with _session_lock(session):
         session["process"] = process
         session["seek_offset"] = seek_time
-        if url:
-            _url_to_session[url] = session_id
-        return True
+        session.pop("_snapshot", None)
+    if url:
+        with _url_lock:
+            _url_to_session[url] = (session_id, seek_time, time.time())
+    return True
 
 
 async def seek_transcode(session_id: str, seek_time: float) -> dict[str, Any]:
@@ -1138,27 +1941,25 @@ async def seek_transcode(session_id: str, seek_time: float) -> dict[str, Any]:
     if not info:
         raise HTTPException(404, "Session not found or not VOD")
 
-    settings = get_settings()
-    hw = settings.get("transcode_hw", "software")
-    max_resolution = settings.get("max_resolution", "1080p")
-    quality = settings.get("quality", "high")
+    # Use probe_series if series_id, else probe_movies
+    ctx = _TranscodeContext.from_settings("series" if info.series_id else "movie")
     seg_duration = get_hls_segment_duration()
     segment_num = int(seek_time / seg_duration)
 
     output_path = pathlib.Path(info.output_dir)
-    target_segment = output_path / f"{SEG_PREFIX}{segment_num:03d}.ts"
 
     # Smart seek: if target segment exists, no need to restart ffmpeg
-    if target_segment.exists() and target_segment.stat().st_size > _MIN_SEGMENT_SIZE_BYTES:
+    if _segment_complete(output_path, segment_num, f"{SEG_PREFIX}{segment_num:03d}.ts"):
         log.info(
             "Smart seek: segment %d exists for time %.1fs, skipping ffmpeg restart",
             segment_num,
             seek_time,
         )
-        with _transcode_lock:
-            session = _transcode_sessions.get(session_id)
-            if session:
+        session = _lookup_session(session_id)
+        if session:
+            with _session_lock(session):
                 session["seek_offset"] = seek_time
+                session.pop("_snapshot", None)
         _regenerate_playlist(output_path, segment_num)
         return {"session_id": session_id, "playlist": f"/transcode/{session_id}/stream.m3u8"}
 
@@ -1169,29 +1970,14 @@ async def seek_transcode(session_id: str, seek_time: float) -> dict[str, Any]:
     # Clear playlist but keep segments (for backward seeks later)
     playlist_file = output_path / "stream.m3u8"
     playlist_file.unlink(missing_ok=True)
+    _forget_hls_progress(output_path)
     # Only clear segments AFTER target (we might seek back to earlier ones)
-    for seg_file in output_path.glob(f"{SEG_PREFIX}*.ts"):
-        try:
-            seg_num = int(seg_file.stem[len(SEG_PREFIX) :])
-            if seg_num >= segment_num:
-                seg_file.unlink(missing_ok=True)
-        except ValueError:
-            pass
-    for vtt_file in output_path.glob("sub*.vtt"):
-        vtt_file.unlink(missing_ok=True)
+    if known := _complete_segments.get(str(output_path)):
+        known.difference_update([n for n in known if n >= segment_num])
+    _clear_seek_outputs(output_path, segment_num)
 
-    # Use probe_series if series_id, else probe_movies
-    probe_setting = "probe_series" if info.series_id else "probe_movies"
-    do_probe = settings.get(probe_setting, False)
-    if do_probe:
-        media_info = (
-            await asyncio.to_thread(
-                probe_media,
-                info.url,
-                info.series_id,
-                info.episode_id,
-            )
-        )[0]
+    if ctx.do_probe:
+        media_info = (await _probe_media_shared(info.url, info.series_id, info.episode_id))[0]
     else:
         media_info = None
 
@@ -1208,13 +1994,13 @@ async def seek_transcode(session_id: str, seek_time: float) -> dict[str, Any]:
 
     cmd = build_hls_ffmpeg_cmd(
         info.url,
-        hw,
+        ctx.hw,
         info.output_dir,
         True,
         subtitles or None,
         media_info,
-        max_resolution,
-        quality,
+        ctx.max_resolution,
+        ctx.quality,
         get_user_agent(),
     )
     i_idx = cmd.index("-i")
@@ -1234,33 +2020,20 @@ async def seek_transcode(session_id: str, seek_time: float) -> dict[str, Any]:
         " ".join(cmd),
     )
 
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdin=asyncio.subprocess.DEVNULL,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
+    process = await _spawn_ffmpeg(cmd)
 
     if not _update_seek_session(session_id, info.url, process, seek_time):
         _kill_process(process)
         raise HTTPException(404, "Session disappeared during seek")
 
-    # Persist seek_offset
-    session_json = output_path / "session.json"
-    if session_json.exists():
-        try:
-            data = json.loads(session_json.read_text())
-            data["seek_offset"] = seek_time
-            session_json.write_text(json.dumps(data))
-        except Exception as e:
-            log.warning("Failed to update session.json for %s: %s", session_id, e)
+    _persist(_write_atomic, output_path / _SEEK_FILE, repr(seek_time))
 
-    _spawn_background_task(_monitor_seek_ffmpeg(process, session_id))
+    _spawn_background_task(_monitor_seek_ffmpeg(process, session_id), f"ffmpeg-seek:{session_id}")
 
     if not await _wait_for_playlist(
         playlist_file,
         process,
-        min_segments=2,
+        min_segments=_START_MIN_SEGMENTS_VOD,
         timeout_sec=_PLAYLIST_WAIT_TIMEOUT_SEC,
     ):
         raise HTTPException(500, "Seek transcode timed out waiting for playlist")
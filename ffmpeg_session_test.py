@@ -1,35 +1,71 @@
 """Tests for ffmpeg session management."""
 
-from unittest.mock import patch
+from collections import deque
+from typing import Any
+from unittest.mock import MagicMock, patch
 
+import asyncio
 import json
+import logging
+import os
 import pathlib
+import subprocess
 import tempfile
 import time
 
+from fastapi import HTTPException
+
+import pytest
+
 from ffmpeg_session import (
     _HEARTBEAT_TIMEOUT_SEC,
+    _acquire_output_dir,
+    _background_tasks,
     _build_subtitle_tracks,
     _calc_hls_duration,
+    _clear_seek_outputs,
+    _complete_segments,
     _DeadProcess,
+    _dir_pool,
+    _flush_persist,
+    _get_session_snapshot,
+    _inflight_probes,
+    _inflight_starts,
     _is_process_alive,
     _kill_process,
+    _monitor_ffmpeg_stderr,
+    _persist,
+    _probe_media_shared,
     _regenerate_playlist,
-    _transcode_lock,
+    _remove_dir,
+    _scan_segments,
+    _SessionMap,
+    _sleep_or_exit,
+    _spawn_background_task,
+    _spawn_ffmpeg,
     _transcode_sessions,
+    _TranscodeContext,
+    _unmap_url,
+    _update_session_process,
+    _url_lock,
     _url_to_session,
+    _wait_for_playlist,
+    _write_atomic,
     cleanup_and_recover_sessions,
     cleanup_expired_sessions,
     clear_url_session,
     enforce_stream_limits,
+    get_cache_stats,
     get_live_cache_timeout,
     get_session,
+    get_session_dir,
     get_session_progress,
     get_source_sessions,
     get_user_sessions,
     get_vod_cache_timeout,
     is_session_valid,
     shutdown,
+    start_transcode,
     stop_session,
     touch_session,
 )
@@ -53,11 +89,37 @@ class FakeProcess:
         self.returncode = -9  # SIGKILL
 
 
-def _clear_session_state():
-    """Clear all session state for test isolation."""
-    with _transcode_lock:
-        _transcode_sessions.clear()
-        _url_to_session.clear()
+def _ago(seconds: float) -> int:
+    """Monotonic heartbeat timestamp from `seconds` ago."""
+    return time.monotonic_ns() - int(seconds * 1e9)
+
+
+def _wait_until_gone(*paths: pathlib.Path, timeout: float = 2.0) -> bool:
+    """Wait for background deletion of paths."""
+    deadline = time.monotonic() + timeout
+    while any(p.exists() for p in paths):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture(autouse=True)
+def _clean_session_state():
+    """Run every test against empty module-level session state."""
+    state = (
+        _transcode_sessions,
+        _url_to_session,
+        _inflight_starts,
+        _inflight_probes,
+        _complete_segments,
+        _dir_pool,
+    )
+    for s in state:
+        s.clear()
+    yield
+    for s in state:
+        s.clear()
 
 
 # =============================================================================
@@ -97,6 +159,62 @@ class TestKillProcess:
         assert _kill_process(proc) is False
 
 
+class TestMonitorFfmpegStderr:
+    """Tests for _monitor_ffmpeg_stderr."""
+
+    @staticmethod
+    def _run(data: bytes, maxlen: int = 200) -> deque[bytes]:
+        async def run() -> deque[bytes]:
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+
+            class Proc:
+                stderr = reader
+
+            lines: deque[bytes] = deque(maxlen=maxlen)
+            await _monitor_ffmpeg_stderr(Proc(), "s1", lines)  # type: ignore[arg-type]
+            return lines
+
+        return asyncio.run(run())
+
+    def test_splits_lines_across_chunks(self):
+        """Lines spanning read chunks are reassembled; trailing partial kept."""
+        data = b"a" * 10_000 + b"\nsecond line\r\nno newline at end"
+        with patch("ffmpeg_session._STDERR_READ_BYTES", 4096):
+            lines = self._run(data)
+        assert list(lines) == [b"a" * 10_000, b"second line\r", b"no newline at end"]
+
+    def test_keeps_bounded_tail(self):
+        """Only the most recent lines are retained."""
+        data = b"".join(f"line {i}\n".encode() for i in range(50))
+        lines = self._run(data, maxlen=10)
+        assert list(lines) == [f"line {i}".encode() for i in range(40, 50)]
+
+    def test_invalid_utf8_does_not_stop_monitor(self):
+        """Undecodable bytes are replaced rather than raising when logged."""
+        with patch("ffmpeg_session.log.isEnabledFor", return_value=True):
+            lines = self._run(b"bad \xff byte\nnext\n")
+        assert list(lines) == [b"bad \xff byte", b"next"]
+
+    def test_fatal_lines_logged_as_warning(self):
+        """Fatal/aborting lines are logged at WARNING, others at DEBUG."""
+        with patch("ffmpeg_session.log") as mock_log:
+            mock_log.isEnabledFor.return_value = True
+            self._run(b"Conversion failed: Fatal error\nframe=1\nExiting normally, ABORTING\n")
+        levels = [c.args[0] for c in mock_log.log.call_args_list]
+        assert levels == [logging.WARNING, logging.DEBUG, logging.WARNING]
+
+    def test_debug_lines_not_decoded_when_disabled(self):
+        """Non-fatal lines skip decoding when DEBUG logging is off."""
+        with (
+            patch("ffmpeg_session.log.isEnabledFor", return_value=False),
+            patch("ffmpeg_session._decode_stderr_line") as mock_decode,
+        ):
+            self._run(b"frame=1\nframe=2\n")
+        mock_decode.assert_not_called()
+
+
 # =============================================================================
 # Session Validity Tests
 # =============================================================================
@@ -110,7 +228,7 @@ class TestIsSessionValid:
         session = {
             "process": FakeProcess(alive=True),
             "started": time.time(),
-            "last_access": time.time(),
+            "last_access_ns": time.monotonic_ns(),
             "is_vod": False,
         }
         assert is_session_valid(session) is True
@@ -120,7 +238,7 @@ class TestIsSessionValid:
         session = {
             "process": FakeProcess(alive=True),
             "started": time.time() - 400,
-            "last_access": time.time() - 400,  # 6+ min ago
+            "last_access_ns": _ago(400),  # 6+ min ago
             "is_vod": False,
         }
         assert is_session_valid(session) is False
@@ -131,7 +249,7 @@ class TestIsSessionValid:
             session = {
                 "process": FakeProcess(alive=False),
                 "started": time.time(),
-                "last_access": time.time(),
+                "last_access_ns": time.monotonic_ns(),
                 "is_vod": False,
             }
             assert is_session_valid(session) is False
@@ -142,7 +260,7 @@ class TestIsSessionValid:
             session = {
                 "process": FakeProcess(alive=False),
                 "started": time.time() - 10,
-                "last_access": time.time() - 10,  # 10 sec ago (within 30 sec heartbeat)
+                "last_access_ns": _ago(10),  # 10 sec ago (within 30 sec heartbeat)
                 "is_vod": True,
             }
             assert is_session_valid(session) is True
@@ -153,7 +271,7 @@ class TestIsSessionValid:
             session = {
                 "process": FakeProcess(alive=False),
                 "started": time.time() - 120,
-                "last_access": time.time() - 120,  # 2 min ago, cache is 1 min
+                "last_access_ns": _ago(120),  # 2 min ago, cache is 1 min
                 "is_vod": True,
             }
             assert is_session_valid(session) is False
@@ -164,23 +282,34 @@ class TestIsSessionValid:
         session = {
             "process": FakeProcess(alive=True),
             "started": time.time() - (_HEARTBEAT_TIMEOUT_SEC - 1),
-            "last_access": time.time() - (_HEARTBEAT_TIMEOUT_SEC - 1),
+            "last_access_ns": _ago(_HEARTBEAT_TIMEOUT_SEC - 1),
             "is_vod": False,
         }
         assert is_session_valid(session) is True
 
         # Just over timeout = invalid
-        session["last_access"] = time.time() - (_HEARTBEAT_TIMEOUT_SEC + 1)
+        session["last_access_ns"] = _ago(_HEARTBEAT_TIMEOUT_SEC + 1)
         assert is_session_valid(session) is False
 
-    def test_missing_last_access_uses_started(self):
-        """If last_access missing, falls back to started time."""
+    def test_missing_heartbeat_is_invalid(self):
+        """A session that was never touched has no valid heartbeat."""
         session = {
             "process": FakeProcess(alive=True),
             "started": time.time(),
             "is_vod": False,
         }
-        assert is_session_valid(session) is True
+        assert is_session_valid(session) is False
+
+    def test_ignores_wall_clock_jumps(self):
+        """Heartbeat age uses the monotonic clock, not wall-clock time."""
+        session = {
+            "process": FakeProcess(alive=True),
+            "started": time.time(),
+            "last_access_ns": time.monotonic_ns(),
+            "is_vod": False,
+        }
+        with patch("ffmpeg_session.time.time", return_value=time.time() + 3600):
+            assert is_session_valid(session) is True
 
 
 # =============================================================================
@@ -212,6 +341,25 @@ class TestCacheTimeouts:
             assert get_live_cache_timeout() == 30
 
 
+class TestTranscodeContext:
+    """Tests for per-request transcode settings."""
+
+    def test_defaults(self):
+        """Missing settings fall back to software/1080p/high without probing."""
+        with patch("ffmpeg_session.get_settings", return_value={}):
+            ctx = _TranscodeContext.from_settings("live")
+        assert ctx == _TranscodeContext("software", "1080p", "high", False, False)
+
+    def test_probe_setting_follows_content_type(self):
+        """VOD types are flagged and each type reads its own probe setting."""
+        settings = {"probe_movies": True, "probe_series": False, "transcode_hw": "nvidia"}
+        with patch("ffmpeg_session.get_settings", return_value=settings):
+            movie = _TranscodeContext.from_settings("movie")
+            series = _TranscodeContext.from_settings("series")
+        assert movie.is_vod and movie.do_probe and movie.hw == "nvidia"
+        assert series.is_vod and not series.do_probe
+
+
 # =============================================================================
 # Session Start/Stop Tests
 # =============================================================================
@@ -220,12 +368,6 @@ class TestCacheTimeouts:
 class TestStopSession:
     """Tests for stop_session."""
 
-    def setup_method(self):
-        _clear_session_state()
-
-    def teardown_method(self):
-        _clear_session_state()
-
     def test_stop_nonexistent_session(self):
         """Stopping nonexistent session is a no-op."""
         stop_session("nonexistent")  # Should not raise
@@ -234,31 +376,53 @@ class TestStopSession:
         """Force stop removes session."""
         with tempfile.TemporaryDirectory() as tmp:
             session_id = "test-123"
-            with _transcode_lock:
+            with _url_lock:
                 _transcode_sessions[session_id] = {
                     "process": FakeProcess(alive=True),
                     "dir": tmp,
                     "url": "http://test",
-                    "last_access": time.time(),
+                    "last_access_ns": time.monotonic_ns(),
                 }
-                _url_to_session["http://test"] = session_id
+                _url_to_session["http://test"] = (session_id, 0.0, 0.0)
 
             stop_session(session_id, force=True)
 
             assert session_id not in _transcode_sessions
             assert "http://test" not in _url_to_session
 
+    def test_stop_session_kills_without_map_lock(self):
+        """Killing ffmpeg holds only the session lock, not the URL map lock."""
+
+        class LockCheckingProcess(FakeProcess):
+            lock_held = None
+
+            def terminate(self) -> None:
+                LockCheckingProcess.lock_held = _url_lock.locked()
+                super().terminate()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _transcode_sessions["test"] = {
+                "process": LockCheckingProcess(alive=True),
+                "dir": tmp,
+                "url": "http://test",
+                "last_access_ns": 0,
+            }
+
+            stop_session("test", force=True)
+
+            assert LockCheckingProcess.lock_held is False
+            assert "test" not in _transcode_sessions
+
     def test_stop_session_skip_recent_vod(self):
         """Skip stop for recently-accessed VOD session (race protection for seeking)."""
         session_id = "test-456"
-        with _transcode_lock:
-            _transcode_sessions[session_id] = {
-                "process": FakeProcess(alive=True),
-                "dir": "/tmp/test",
-                "url": "http://test",
-                "is_vod": True,  # Grace period only applies to VOD
-                "last_access": time.time(),  # Just now
-            }
+        _transcode_sessions[session_id] = {
+            "process": FakeProcess(alive=True),
+            "dir": "/tmp/test",
+            "url": "http://test",
+            "is_vod": True,  # Grace period only applies to VOD
+            "last_access_ns": time.monotonic_ns(),  # Just now
+        }
 
         stop_session(session_id, force=False)
 
@@ -269,15 +433,15 @@ class TestStopSession:
         """Live sessions also get grace period for multi-user support."""
         with tempfile.TemporaryDirectory() as tmp:
             session_id = "test-live"
-            with _transcode_lock:
+            with _url_lock:
                 _transcode_sessions[session_id] = {
                     "process": FakeProcess(alive=True),
                     "dir": tmp,
                     "url": "http://live",
                     "is_vod": False,
-                    "last_access": time.time(),  # Just now
+                    "last_access_ns": time.monotonic_ns(),  # Just now
                 }
-                _url_to_session["http://live"] = session_id
+                _url_to_session["http://live"] = (session_id, 0.0, 0.0)
 
             with patch("ffmpeg_session.get_live_cache_timeout", return_value=0):
                 stop_session(session_id, force=False)
@@ -289,15 +453,15 @@ class TestStopSession:
         """Stopping session while another user watching should preserve session."""
         with tempfile.TemporaryDirectory() as tmp:
             session_id = "test-shared"
-            with _transcode_lock:
+            with _url_lock:
                 _transcode_sessions[session_id] = {
                     "process": FakeProcess(alive=True),
                     "dir": tmp,
                     "url": "http://shared-stream",
                     "is_vod": False,
-                    "last_access": time.time() - 10,  # User A started 10 sec ago
+                    "last_access_ns": _ago(10),  # User A started 10 sec ago
                 }
-                _url_to_session["http://shared-stream"] = session_id
+                _url_to_session["http://shared-stream"] = (session_id, 0.0, 0.0)
 
             # User B accesses stream (simulates progress poll or segment request)
             touch_session(session_id)
@@ -310,19 +474,42 @@ class TestStopSession:
             assert session_id in _transcode_sessions
             assert _transcode_sessions[session_id]["process"].returncode is None
 
+    def test_stop_session_keeps_session_touched_during_kill(self):
+        """A heartbeat that lands while ffmpeg is being killed keeps the session."""
+        session_id = "test-touched"
+
+        class TouchingProcess(FakeProcess):
+            def terminate(self) -> None:
+                super().terminate()
+                touch_session(session_id)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _transcode_sessions[session_id] = {
+                "process": TouchingProcess(alive=True),
+                "dir": tmp,
+                "is_vod": False,
+                "last_access_ns": _ago(10),
+            }
+
+            with patch("ffmpeg_session.get_live_cache_timeout", return_value=0):
+                stop_session(session_id, force=False)
+
+            assert session_id in _transcode_sessions
+            assert os.path.isdir(tmp)
+
     def test_stop_session_caches_vod(self):
         """Stop caches VOD session instead of removing it."""
         with tempfile.TemporaryDirectory() as tmp:
             session_id = "test-vod"
-            with _transcode_lock:
+            with _url_lock:
                 _transcode_sessions[session_id] = {
                     "process": FakeProcess(alive=True),
                     "dir": tmp,
                     "url": "http://vod",
                     "is_vod": True,
-                    "last_access": time.time() - 10,  # Old enough to stop
+                    "last_access_ns": _ago(10),  # Old enough to stop
                 }
-                _url_to_session["http://vod"] = session_id
+                _url_to_session["http://vod"] = (session_id, 0.0, 0.0)
 
             with patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600):
                 stop_session(session_id, force=False)
@@ -334,66 +521,86 @@ class TestStopSession:
 class TestCleanupExpiredSessions:
     """Tests for cleanup_expired_sessions."""
 
-    def setup_method(self):
-        _clear_session_state()
-
-    def teardown_method(self):
-        _clear_session_state()
-
     def test_cleanup_removes_expired(self):
         """Cleanup removes expired sessions."""
         with tempfile.TemporaryDirectory() as tmp:
             session_id = "expired-session"
-            with _transcode_lock:
-                _transcode_sessions[session_id] = {
-                    "process": FakeProcess(alive=False),
-                    "dir": tmp,
-                    "url": "http://expired",
-                    "is_vod": False,
-                    "started": time.time() - 400,
-                    "last_access": time.time() - 400,  # Expired
-                }
+            _transcode_sessions[session_id] = {
+                "process": FakeProcess(alive=False),
+                "dir": tmp,
+                "url": "http://expired",
+                "is_vod": False,
+                "started": time.time() - 400,
+                "last_access_ns": _ago(400),  # Expired
+            }
 
+            before = get_cache_stats()["counters"]["session_expired"]
             with patch("ffmpeg_session.get_live_cache_timeout", return_value=0):
                 cleanup_expired_sessions()
 
             assert session_id not in _transcode_sessions
+            assert get_cache_stats()["counters"]["session_expired"] == before + 1
 
     def test_cleanup_keeps_valid(self):
         """Cleanup keeps valid sessions."""
         session_id = "valid-session"
-        with _transcode_lock:
-            _transcode_sessions[session_id] = {
-                "process": FakeProcess(alive=True),
-                "dir": "/tmp/test",
-                "url": "http://valid",
-                "is_vod": False,
-                "started": time.time(),
-                "last_access": time.time(),
-            }
+        _transcode_sessions[session_id] = {
+            "process": FakeProcess(alive=True),
+            "dir": "/tmp/test",
+            "url": "http://valid",
+            "is_vod": False,
+            "started": time.time(),
+            "last_access_ns": time.monotonic_ns(),
+        }
 
         cleanup_expired_sessions()
 
         assert session_id in _transcode_sessions
 
+    def test_cleanup_returns_time_to_next_expiry(self):
+        """The next sweep is due when the soonest remaining session can expire."""
+        _transcode_sessions["s1"] = {
+            "process": FakeProcess(alive=True),
+            "last_access_ns": _ago(20),  # Heartbeat timeout in ~10s
+        }
+        _transcode_sessions["s2"] = {
+            "process": FakeProcess(alive=True),
+            "last_access_ns": time.monotonic_ns(),
+        }
 
-class TestShutdown:
-    """Tests for shutdown."""
+        delay = cleanup_expired_sessions()
 
-    def setup_method(self):
-        _clear_session_state()
+        assert 9.0 < delay <= 10.0
+        _transcode_sessions.clear()
+        assert cleanup_expired_sessions() == 60.0
+
+    def test_cleanup_reads_settings_once(self):
+        """Cache timeouts are read once per sweep, not once per session."""
+        for i in range(5):
+            _transcode_sessions[f"s{i}"] = {
+                "process": FakeProcess(alive=False),
+                "dir": f"/tmp/netv_test_{i}",
+                "is_vod": True,
+                "last_access_ns": time.monotonic_ns(),
+            }
+
+        with patch("ffmpeg_session.get_settings", return_value={}) as mock_settings:
+            cleanup_expired_sessions()
 
-    def teardown_method(self):
-        _clear_session_state()
+        assert mock_settings.call_count == 2  # VOD and live timeouts
+        assert len(_transcode_sessions) == 5  # Dead but within the VOD cache window
+
+
+class TestShutdown:
+    """Tests for shutdown."""
 
     def test_shutdown_kills_all_processes(self):
         """Shutdown kills all processes and clears sessions."""
         proc1 = FakeProcess(alive=True)
         proc2 = FakeProcess(alive=True)
 
-        with _transcode_lock:
-            _transcode_sessions["s1"] = {"process": proc1, "dir": "/tmp/1"}
-            _transcode_sessions["s2"] = {"process": proc2, "dir": "/tmp/2"}
+        _transcode_sessions["s1"] = {"process": proc1, "dir": "/tmp/1"}
+        _transcode_sessions["s2"] = {"process": proc2, "dir": "/tmp/2"}
 
         shutdown()
 
@@ -402,6 +609,43 @@ class TestShutdown:
         assert proc2.returncode == -15
         assert len(_transcode_sessions) == 0
 
+    def test_shutdown_kills_only_survivors(self):
+        """Processes share one SIGTERM grace period; only ones still running get SIGKILL."""
+        polite = subprocess.Popen(["sleep", "30"])
+        stubborn = subprocess.Popen(
+            ["sh", "-c", "trap '' TERM; echo ready; exec sleep 30"], stdout=subprocess.PIPE
+        )
+        assert stubborn.stdout is not None
+        stubborn.stdout.readline()  # SIGTERM trap installed
+        _transcode_sessions["s1"] = {"process": polite, "dir": "/tmp/1"}
+        _transcode_sessions["s2"] = {"process": stubborn, "dir": "/tmp/2"}
+
+        try:
+            with patch("ffmpeg_session._SHUTDOWN_GRACE_SEC", 0.3):
+                shutdown()
+            assert polite.wait(timeout=5) == -15
+            assert stubborn.wait(timeout=5) == -9
+        finally:
+            for proc in (polite, stubborn):
+                proc.kill()
+                proc.wait()
+            stubborn.stdout.close()
+
+    def test_shutdown_cancels_monitor_tasks(self):
+        """Pending background monitor tasks are cancelled and then dropped."""
+
+        async def run() -> asyncio.Task[None]:
+            _spawn_background_task(asyncio.sleep(60), "ffmpeg-stderr:s1")
+            (task,) = _background_tasks
+            shutdown()
+            await asyncio.gather(task, return_exceptions=True)
+            return task
+
+        task = asyncio.run(run())
+        assert task.cancelled()
+        assert task.get_name() == "ffmpeg-stderr:s1"
+        assert not _background_tasks
+
 
 # =============================================================================
 # Stream Limits Tests
@@ -411,18 +655,11 @@ class TestShutdown:
 class TestGetUserSessions:
     """Tests for get_user_sessions."""
 
-    def setup_method(self):
-        _clear_session_state()
-
-    def teardown_method(self):
-        _clear_session_state()
-
     def test_get_user_sessions_filters_by_username(self):
         """Returns only sessions for specified user."""
-        with _transcode_lock:
-            _transcode_sessions["s1"] = {"username": "alice", "started": 1}
-            _transcode_sessions["s2"] = {"username": "bob", "started": 2}
-            _transcode_sessions["s3"] = {"username": "alice", "started": 3}
+        _transcode_sessions["s1"] = {"username": "alice", "started": 1}
+        _transcode_sessions["s2"] = {"username": "bob", "started": 2}
+        _transcode_sessions["s3"] = {"username": "alice", "started": 3}
 
         sessions = get_user_sessions("alice")
         assert len(sessions) == 2
@@ -438,18 +675,11 @@ class TestGetUserSessions:
 class TestGetSourceSessions:
     """Tests for get_source_sessions."""
 
-    def setup_method(self):
-        _clear_session_state()
-
-    def teardown_method(self):
-        _clear_session_state()
-
     def test_get_source_sessions_filters_by_source(self):
         """Returns only sessions for specified source."""
-        with _transcode_lock:
-            _transcode_sessions["s1"] = {"source_id": "src1", "started": 1}
-            _transcode_sessions["s2"] = {"source_id": "src2", "started": 2}
-            _transcode_sessions["s3"] = {"source_id": "src1", "started": 3}
+        _transcode_sessions["s1"] = {"source_id": "src1", "started": 1}
+        _transcode_sessions["s2"] = {"source_id": "src2", "started": 2}
+        _transcode_sessions["s3"] = {"source_id": "src1", "started": 3}
 
         sessions = get_source_sessions("src1")
         assert len(sessions) == 2
@@ -460,12 +690,6 @@ class TestGetSourceSessions:
 class TestEnforceStreamLimits:
     """Tests for enforce_stream_limits."""
 
-    def setup_method(self):
-        _clear_session_state()
-
-    def teardown_method(self):
-        _clear_session_state()
-
     def test_no_limits_returns_none(self):
         """No limits set = no error."""
         result = enforce_stream_limits("alice", None, 0, 0)
@@ -474,23 +698,22 @@ class TestEnforceStreamLimits:
     def test_user_limit_stops_oldest(self):
         """User at limit stops their oldest session."""
         with tempfile.TemporaryDirectory() as tmp:
-            with _transcode_lock:
-                _transcode_sessions["s1"] = {
-                    "username": "alice",
-                    "started": 1,
-                    "process": FakeProcess(alive=True),
-                    "dir": tmp,
-                    "url": "http://1",
-                    "last_access": 0,  # Old enough to stop
-                }
-                _transcode_sessions["s2"] = {
-                    "username": "alice",
-                    "started": 2,
-                    "process": FakeProcess(alive=True),
-                    "dir": "/tmp/2",
-                    "url": "http://2",
-                    "last_access": time.time(),
-                }
+            _transcode_sessions["s1"] = {
+                "username": "alice",
+                "started": 1,
+                "process": FakeProcess(alive=True),
+                "dir": tmp,
+                "url": "http://1",
+                "last_access_ns": 0,  # Old enough to stop
+            }
+            _transcode_sessions["s2"] = {
+                "username": "alice",
+                "started": 2,
+                "process": FakeProcess(alive=True),
+                "dir": "/tmp/2",
+                "url": "http://2",
+                "last_access_ns": time.monotonic_ns(),
+            }
 
             result = enforce_stream_limits("alice", None, 2, 0)
 
@@ -501,16 +724,15 @@ class TestEnforceStreamLimits:
     def test_source_limit_stops_user_session(self):
         """Source at limit stops user's oldest session on that source."""
         with tempfile.TemporaryDirectory() as tmp:
-            with _transcode_lock:
-                _transcode_sessions["s1"] = {
-                    "username": "alice",
-                    "source_id": "src1",
-                    "started": 1,
-                    "process": FakeProcess(alive=True),
-                    "dir": tmp,
-                    "url": "http://1",
-                    "last_access": 0,
-                }
+            _transcode_sessions["s1"] = {
+                "username": "alice",
+                "source_id": "src1",
+                "started": 1,
+                "process": FakeProcess(alive=True),
+                "dir": tmp,
+                "url": "http://1",
+                "last_access_ns": 0,
+            }
 
             result = enforce_stream_limits("alice", "src1", 0, 1)
 
@@ -519,40 +741,118 @@ class TestEnforceStreamLimits:
 
     def test_source_limit_returns_error_for_other_user(self):
         """Source at limit with other user's session returns error."""
-        with _transcode_lock:
-            _transcode_sessions["s1"] = {
-                "username": "bob",
-                "source_id": "src1",
-                "started": 1,
-                "process": FakeProcess(alive=True),
-                "dir": "/tmp/1",
-                "url": "http://1",
-            }
+        _transcode_sessions["s1"] = {
+            "username": "bob",
+            "source_id": "src1",
+            "started": 1,
+            "process": FakeProcess(alive=True),
+            "dir": "/tmp/1",
+            "url": "http://1",
+        }
 
         result = enforce_stream_limits("alice", "src1", 0, 1)
 
         assert result == "Source at capacity (1 streams)"
         assert "s1" in _transcode_sessions  # Not stopped
 
+    def test_under_limit_skips_session_listing(self):
+        """Below both limits, sessions are only counted, never listed."""
+        _transcode_sessions["s1"] = {"username": "alice", "source_id": "src1"}
+
+        with (
+            patch("ffmpeg_session.get_user_sessions") as user_list,
+            patch("ffmpeg_session.get_source_sessions") as source_list,
+        ):
+            assert enforce_stream_limits("alice", "src1", 2, 2) is None
+
+        user_list.assert_not_called()
+        source_list.assert_not_called()
+
 
 # =============================================================================
 # Session Query/Update Tests
 # =============================================================================
 
 
-class TestGetSession:
-    """Tests for get_session."""
+class TestStartTranscodeSingleflight:
+    """Tests for coalescing concurrent start_transcode calls."""
+
+    @staticmethod
+    def _run_concurrent(do_start) -> list[Any]:
+        async def run() -> list[Any]:
+            with (
+                patch("ffmpeg_session._get_existing_session", return_value=(None, False, 0.0)),
+                patch("ffmpeg_session._do_start_transcode", side_effect=do_start),
+            ):
+                return await asyncio.gather(
+                    start_transcode("http://same"),
+                    start_transcode("http://same"),
+                    return_exceptions=True,
+                )
+
+        return asyncio.run(run())
 
-    def setup_method(self):
-        _clear_session_state()
+    def test_concurrent_starts_share_one_ffmpeg(self):
+        """Second caller for the same URL waits for the first caller's session."""
+        calls = []
 
-    def teardown_method(self):
-        _clear_session_state()
+        async def do_start(*args: Any) -> dict[str, Any]:
+            calls.append(args)
+            await asyncio.sleep(0.01)
+            return {"session_id": "abc"}
+
+        results = self._run_concurrent(do_start)
+
+        assert len(calls) == 1
+        assert results == [{"session_id": "abc"}, {"session_id": "abc"}]
+        assert not _inflight_starts
+
+    def test_failure_propagates_to_joiners(self):
+        """A failed start raises for every caller and clears the in-flight entry."""
+
+        async def do_start(*_args: Any) -> dict[str, Any]:
+            await asyncio.sleep(0.01)
+            raise HTTPException(500, "boom")
+
+        results = self._run_concurrent(do_start)
+
+        assert all(isinstance(r, HTTPException) for r in results)
+        assert not _inflight_starts
+
+
+class TestProbeMediaShared:
+    """Tests for _probe_media_shared."""
+
+    def test_concurrent_probes_share_one_ffprobe(self):
+        """Concurrent probes of one URL/episode run probe_media once."""
+        calls = []
+
+        def fake_probe(*args: Any) -> tuple[None, list[Any]]:
+            calls.append(args)
+            time.sleep(0.05)
+            return None, []
+
+        async def run() -> list[Any]:
+            with patch("ffmpeg_session.probe_media", side_effect=fake_probe):
+                return await asyncio.gather(
+                    _probe_media_shared("http://movie", 1, 2),
+                    _probe_media_shared("http://movie", 1, 2),
+                    _probe_media_shared("http://movie", 1, 3),
+                )
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 2  # Episode 3 is a separate key
+        assert results == [(None, [])] * 3
+        assert not _inflight_probes
+
+
+class TestGetSession:
+    """Tests for get_session."""
 
     def test_get_existing_session(self):
         """Returns copy of session dict."""
-        with _transcode_lock:
-            _transcode_sessions["test"] = {"dir": "/tmp", "url": "http://test"}
+        _transcode_sessions["test"] = {"dir": "/tmp", "url": "http://test"}
 
         session = get_session("test")
         assert session is not None
@@ -562,26 +862,36 @@ class TestGetSession:
         """Returns None for nonexistent session."""
         assert get_session("nonexistent") is None
 
+    def test_get_session_dir(self):
+        """Returns the session's dir as a Path, parsed once."""
+        _transcode_sessions["test"] = {"dir": "/tmp/x"}
 
-class TestTouchSession:
-    """Tests for touch_session (heartbeat)."""
+        assert get_session_dir("test") == pathlib.Path("/tmp/x")
+        assert get_session_dir("test") is _transcode_sessions["test"]["dir_path"]
+        assert get_session_dir("nonexistent") is None
 
-    def setup_method(self):
-        _clear_session_state()
 
-    def teardown_method(self):
-        _clear_session_state()
+class TestTouchSession:
+    """Tests for touch_session (heartbeat)."""
 
     def test_touch_updates_last_access(self):
-        """Touch updates last_access timestamp."""
-        old_time = time.time() - 100
-        with _transcode_lock:
-            _transcode_sessions["test"] = {"last_access": old_time}
+        """Touch updates heartbeat timestamp."""
+        old_time = _ago(100)
+        _transcode_sessions["test"] = {"last_access_ns": old_time}
 
         result = touch_session("test")
 
         assert result is True
-        assert _transcode_sessions["test"]["last_access"] > old_time
+        assert _transcode_sessions["test"]["last_access_ns"] > old_time
+
+    def test_touch_does_not_take_session_lock(self):
+        """Heartbeats don't wait behind a session lock held elsewhere (e.g. a kill)."""
+        lock = MagicMock()
+        _transcode_sessions["test"] = {"lock": lock, "last_access_ns": 0}
+
+        assert touch_session("test") is True
+        lock.__enter__.assert_not_called()
+        assert _transcode_sessions["test"]["last_access_ns"] > 0
 
     def test_touch_nonexistent_returns_false(self):
         """Touch returns False for nonexistent session."""
@@ -591,20 +901,13 @@ class TestTouchSession:
 class TestGetSessionProgress:
     """Tests for get_session_progress."""
 
-    def setup_method(self):
-        _clear_session_state()
-
-    def teardown_method(self):
-        _clear_session_state()
-
     def test_progress_with_playlist(self):
         """Returns progress from playlist."""
         with tempfile.TemporaryDirectory() as tmp:
             playlist = pathlib.Path(tmp) / "stream.m3u8"
             playlist.write_text("#EXTM3U\n#EXTINF:3.0,\nseg0.ts\n#EXTINF:3.0,\nseg1.ts\n")
 
-            with _transcode_lock:
-                _transcode_sessions["test"] = {"dir": tmp, "last_access": 0}
+            _transcode_sessions["test"] = {"dir": tmp, "last_access_ns": 0}
 
             progress = get_session_progress("test")
 
@@ -615,8 +918,7 @@ class TestGetSessionProgress:
     def test_progress_no_playlist(self):
         """Returns zero progress without playlist."""
         with tempfile.TemporaryDirectory() as tmp:
-            with _transcode_lock:
-                _transcode_sessions["test"] = {"dir": tmp, "last_access": 0}
+            _transcode_sessions["test"] = {"dir": tmp, "last_access_ns": 0}
 
             progress = get_session_progress("test")
 
@@ -627,19 +929,101 @@ class TestGetSessionProgress:
         assert get_session_progress("nonexistent") is None
 
 
-class TestClearUrlSession:
-    """Tests for clear_url_session."""
+class TestSessionMap:
+    """Tests for the sharded _SessionMap."""
+
+    def test_dict_operations_across_shards(self):
+        """Behaves like a dict regardless of which shard a key lands in."""
+        sessions = _SessionMap(shards=4)
+        for i in range(20):
+            sessions[f"s{i}"] = {"n": i}
+
+        assert len(sessions) == 20
+        assert sessions["s7"] == {"n": 7}
+        assert sessions.get("missing") is None
+        assert sorted(sessions) == sorted(f"s{i}" for i in range(20))
+        assert sessions.pop("s3") == {"n": 3}
+        assert "s3" not in sessions
+        assert len(sessions.drain()) == 19
+        assert not sessions
+
+    def test_pop_if_checks_identity(self):
+        """pop_if leaves a replaced session in place."""
+        sessions = _SessionMap()
+        old, new = {"n": 1}, {"n": 2}
+        sessions["s"] = new
+
+        assert sessions.pop_if("s", old) is False
+        assert sessions["s"] is new
+        assert sessions.pop_if("s", new) is True
+        assert "s" not in sessions
+
+    def test_user_and_source_index(self):
+        """Index lookups follow inserts, replacements and removals."""
+        sessions = _SessionMap(shards=4)
+        sessions["a"] = {"username": "alice", "source_id": "src1"}
+        sessions["b"] = {"username": "alice", "source_id": "src2"}
+        sessions["c"] = {"username": "bob", "source_id": "src1"}
+
+        assert sorted(sid for sid, _ in sessions.by_user("alice")) == ["a", "b"]
+        assert sorted(sid for sid, _ in sessions.by_source("src1")) == ["a", "c"]
+
+        sessions["a"] = {"username": "bob", "source_id": "src1"}
+        sessions.pop("b")
+        sessions.pop_if("c", sessions["c"])
+
+        assert sessions.by_user("alice") == []
+        assert sessions.count_user("bob") == 1
+        assert sessions.count_source("src1") == 1
+        assert [sid for sid, _ in sessions.by_user("bob")] == ["a"]
+        assert sessions.by_source("src2") == []
+        sessions.drain()
+        assert sessions.by_source("src1") == []
+
+
+class TestSessionSnapshot:
+    """Tests for cached session snapshots."""
+
+    def test_snapshot_is_reused(self):
+        """Repeated snapshots return the same cached object."""
+        _transcode_sessions["test"] = {
+            "dir": "/tmp/x",
+            "process": FakeProcess(),
+            "last_access_ns": 0,
+        }
 
-    def setup_method(self):
-        _clear_session_state()
+        first = _get_session_snapshot("test")
+        second = _get_session_snapshot("test")
 
-    def teardown_method(self):
-        _clear_session_state()
+        assert first is not None
+        assert first is second
+        assert _transcode_sessions["test"]["last_access_ns"] > 0
+
+    def test_snapshot_rebuilt_after_process_update(self):
+        """Updating the process invalidates the cached snapshot."""
+        _transcode_sessions["test"] = {"dir": "/tmp/x", "process": FakeProcess()}
+        old = _get_session_snapshot("test")
+        new_proc = FakeProcess()
+
+        assert _update_session_process("test", new_proc) is True
+        snap = _get_session_snapshot("test")
+
+        assert snap is not old
+        assert snap is not None
+        assert snap.process is new_proc
+
+    def test_snapshot_missing_session(self):
+        """Returns None for nonexistent session."""
+        assert _get_session_snapshot("nonexistent") is None
+
+
+class TestClearUrlSession:
+    """Tests for clear_url_session."""
 
     def test_clear_existing_url(self):
         """Clears existing URL mapping."""
-        with _transcode_lock:
-            _url_to_session["http://test"] = "session-123"
+        with _url_lock:
+            _url_to_session["http://test"] = ("session-123", 0.0, 0.0)
 
         result = clear_url_session("http://test")
 
@@ -651,6 +1035,16 @@ class TestClearUrlSession:
         result = clear_url_session("http://nonexistent")
         assert result is None
 
+    def test_unmap_url_keeps_newer_session(self):
+        """Removing an old session's mapping leaves a newer session's in place."""
+        _url_to_session["http://test"] = ("new", 0.0, 0.0)
+
+        _unmap_url("http://test", "old")
+        assert _url_to_session["http://test"][0] == "new"
+
+        _unmap_url("http://test", "new")
+        assert "http://test" not in _url_to_session
+
 
 # =============================================================================
 # Playlist Helper Tests
@@ -670,6 +1064,63 @@ class TestCalcHlsDuration:
 
             assert duration == 6.5
 
+    def test_duration_tracks_appended_segments(self):
+        """Picks up segments appended after the previous read."""
+        with tempfile.TemporaryDirectory() as tmp:
+            playlist = pathlib.Path(tmp) / "stream.m3u8"
+            playlist.write_text("#EXTM3U\n#EXTINF:3.0,\nseg0.ts\n")
+            assert _calc_hls_duration(playlist, 1) == 3.0
+
+            with playlist.open("a") as f:
+                f.write("#EXTINF:2.5,\nseg1.ts\n#EXTINF:1.0,")
+            assert _calc_hls_duration(playlist, 2) == 5.5
+
+            with playlist.open("a") as f:
+                f.write("\nseg2.ts\n")
+            assert _calc_hls_duration(playlist, 3) == 6.5
+
+    def test_duration_after_playlist_rewrite(self):
+        """Reparses from scratch when the playlist is rewritten."""
+        with tempfile.TemporaryDirectory() as tmp:
+            playlist = pathlib.Path(tmp) / "stream.m3u8"
+            playlist.write_text("#EXTM3U\n#EXTINF:3.0,\nseg0.ts\n#EXTINF:3.0,\nseg1.ts\n")
+            assert _calc_hls_duration(playlist, 2) == 6.0
+
+            playlist.write_text("#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:5\n#EXTINF:4.0,\nseg005.ts\n")
+            assert _calc_hls_duration(playlist, 1) == 4.0
+
+    def test_large_playlist_scanned_via_mmap(self):
+        """Large unparsed regions are scanned through mmap with the same result."""
+        lines = "".join(f"#EXTINF:2.5,\nseg{i:03d}.ts\n" for i in range(400))
+        with tempfile.TemporaryDirectory() as tmp:
+            playlist = pathlib.Path(tmp) / "stream.m3u8"
+            playlist.write_text("#EXTM3U\n" + lines + "#EXTINF:2.5,")
+            with patch("ffmpeg_session._HLS_MMAP_MIN_BYTES", 1024):
+                assert _calc_hls_duration(playlist, 400) == 1000.0
+
+                with playlist.open("a") as f:
+                    f.write("\nseg400.ts\n")
+                assert _calc_hls_duration(playlist, 401) == 1002.5
+
+    def test_unchanged_playlist_not_reopened(self):
+        """A playlist with unchanged stat is served from cache without reading it."""
+        with tempfile.TemporaryDirectory() as tmp:
+            playlist = pathlib.Path(tmp) / "stream.m3u8"
+            playlist.write_text("#EXTM3U\n#EXTINF:3.0,\nseg0.ts\n")
+            assert _calc_hls_duration(playlist, 1) == 3.0
+
+            with patch("builtins.open") as mock_open:
+                assert _calc_hls_duration(playlist, 1) == 3.0
+            mock_open.assert_not_called()
+
+    def test_duration_skips_malformed_extinf(self):
+        """Ignores EXTINF entries without a numeric duration."""
+        with tempfile.TemporaryDirectory() as tmp:
+            playlist = pathlib.Path(tmp) / "stream.m3u8"
+            playlist.write_text("#EXTM3U\n#EXTINF:abc,\nseg0.ts\n#EXTINF:2.0\nseg1.ts\n")
+
+            assert _calc_hls_duration(playlist, 2) == 2.0
+
     def test_duration_estimate_from_segments(self):
         """Estimates duration when playlist missing."""
         with patch("ffmpeg_session.get_hls_segment_duration", return_value=3.0):
@@ -679,6 +1130,46 @@ class TestCalcHlsDuration:
             assert duration == 15.0
 
 
+class TestScanSegments:
+    """Tests for _scan_segments."""
+
+    def test_sorted_numerically(self):
+        """Segments sort by number, not name, and non-segments are skipped."""
+        with tempfile.TemporaryDirectory() as tmp:
+            out = pathlib.Path(tmp)
+            for name in ("seg1000.ts", "seg999.ts", "seg000.ts", "segx.ts", "stream.m3u8"):
+                (out / name).write_bytes(b"")
+            assert _scan_segments(out) == [
+                (0, "seg000.ts"),
+                (999, "seg999.ts"),
+                (1000, "seg1000.ts"),
+            ]
+
+    def test_missing_dir(self):
+        """Missing output dir has no segments."""
+        assert _scan_segments("/nonexistent/netv_transcode_missing") == []
+
+
+class TestClearSeekOutputs:
+    """Tests for _clear_seek_outputs."""
+
+    def test_clears_later_segments_and_subtitles(self):
+        """Keeps segments before the seek target and unrelated files."""
+        with tempfile.TemporaryDirectory() as tmp:
+            out = pathlib.Path(tmp)
+            names = ["seg000.ts", "seg004.ts", "seg005.ts", "seg010.ts", "sub0.vtt", "session.json"]
+            for name in names:
+                (out / name).write_bytes(b"")
+
+            _clear_seek_outputs(out, 5)
+
+            assert sorted(p.name for p in out.iterdir()) == [
+                "seg000.ts",
+                "seg004.ts",
+                "session.json",
+            ]
+
+
 class TestBuildSubtitleTracks:
     """Tests for _build_subtitle_tracks."""
 
@@ -731,6 +1222,22 @@ class TestRegeneratePlaylist:
             assert "seg002.ts" in content
             assert "seg000.ts" not in content  # Before start_segment
 
+    def test_regenerate_replaces_playlist_atomically(self):
+        """The new playlist is renamed over the old one; no temp file is left."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = pathlib.Path(tmp)
+            (output_dir / "seg000.ts").write_bytes(b"x" * 2000)
+            playlist = output_dir / "stream.m3u8"
+            playlist.write_text("#EXTM3U\n")
+            old_inode = playlist.stat().st_ino
+
+            with patch("ffmpeg_session.get_hls_segment_duration", return_value=3.0):
+                _regenerate_playlist(output_dir, start_segment=0)
+
+            assert playlist.stat().st_ino != old_inode
+            assert "seg000.ts" in playlist.read_text()
+            assert sorted(p.name for p in output_dir.iterdir()) == ["seg000.ts", "stream.m3u8"]
+
     def test_regenerate_skips_small_segments(self):
         """Skips segments smaller than threshold."""
         with tempfile.TemporaryDirectory() as tmp:
@@ -745,20 +1252,187 @@ class TestRegeneratePlaylist:
             assert "seg001.ts" in content
             assert "seg000.ts" not in content
 
+    def test_complete_segments_not_restatted(self):
+        """Segments seen complete once are not stat'ed again; a small one is rechecked."""
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = pathlib.Path(tmp) / "netv_transcode_x"
+            output_dir.mkdir()
+            (output_dir / "seg000.ts").write_bytes(b"x" * 2000)
+            (output_dir / "seg001.ts").write_bytes(b"x" * 500)  # Still being written
+
+            with patch("ffmpeg_session.get_hls_segment_duration", return_value=3.0):
+                _regenerate_playlist(output_dir, start_segment=0)
+                with patch("ffmpeg_session.os.stat", wraps=os.stat) as mock_stat:
+                    _regenerate_playlist(output_dir, start_segment=0)
+
+            statted = [pathlib.Path(c.args[0]).name for c in mock_stat.call_args_list]
+            assert "seg000.ts" not in statted
+            assert "seg001.ts" in statted
+            with patch("ffmpeg_session._DIR_POOL_MAX", 0):
+                _remove_dir(output_dir)
+                assert str(output_dir) not in _complete_segments
+                assert _wait_until_gone(*pathlib.Path(tmp).iterdir())
+
 
 # =============================================================================
 # Session Recovery Tests
 # =============================================================================
 
 
-class TestCleanupAndRecoverSessions:
-    """Tests for cleanup_and_recover_sessions."""
+class TestWaitForPlaylist:
+    """Tests for _wait_for_playlist."""
+
+    def test_poll_interval_backs_off_to_cap(self):
+        """Polls start at 25ms and grow by 1.5x up to 200ms."""
+        process = FakeProcess()
+        delays: list[float] = []
+
+        async def fake_sleep(_process: FakeProcess, delay: float) -> None:
+            delays.append(delay)
+            if len(delays) == 8:
+                process.returncode = 1
+
+        with tempfile.TemporaryDirectory() as tmp:
+            playlist = pathlib.Path(tmp) / "stream.m3u8"
+            with patch("ffmpeg_session._sleep_or_exit", fake_sleep):
+                assert not asyncio.run(_wait_for_playlist(playlist, process, timeout_sec=5))
+
+        assert delays[0] == 0.025
+        assert all(b >= a for a, b in zip(delays, delays[1:], strict=False))
+        assert delays[-1] == 0.2
+
+    def test_ready_playlist_returns_without_sleeping(self):
+        """Segments already on disk are detected on the first poll."""
+        with tempfile.TemporaryDirectory() as tmp:
+            out = pathlib.Path(tmp)
+            (out / "stream.m3u8").write_text("#EXTM3U\n#EXTINF:2.0,\nseg000.ts\n")
+            (out / "seg000.ts").write_bytes(b"x" * 20_000)
+            with patch("ffmpeg_session._sleep_or_exit") as sleep:
+                assert asyncio.run(_wait_for_playlist(out / "stream.m3u8", FakeProcess()))
+            sleep.assert_not_called()
+
+
+class TestSpawnFfmpeg:
+    """Tests for _spawn_ffmpeg."""
+
+    def test_only_stderr_is_piped(self):
+        """stdout is discarded; stderr stays readable for the monitor."""
+
+        async def run() -> tuple[Any, bytes]:
+            proc = await _spawn_ffmpeg(["sh", "-c", "echo out; echo err >&2"])
+            err = await proc.stderr.read()
+            await proc.wait()
+            return proc.stdout, err
+
+        stdout, err = asyncio.run(run())
+        assert stdout is None
+        assert err == b"err\n"
+
+
+class TestSleepOrExit:
+    """Tests for _sleep_or_exit."""
+
+    def test_wakes_when_process_exits(self):
+        """Returns as soon as the process exits instead of sleeping the full delay."""
+
+        class Proc:
+            async def wait(self) -> int:
+                await asyncio.sleep(0.01)
+                return 1
+
+        start = time.monotonic()
+        asyncio.run(_sleep_or_exit(Proc(), 5.0))  # type: ignore[arg-type]
+        assert time.monotonic() - start < 1.0
+
+    def test_times_out_while_process_runs(self):
+        """Sleeps the full delay while the process keeps running."""
+
+        class Proc:
+            async def wait(self) -> int:
+                await asyncio.sleep(60)
+                return 0
+
+        start = time.monotonic()
+        asyncio.run(_sleep_or_exit(Proc(), 0.05))  # type: ignore[arg-type]
+        assert time.monotonic() - start >= 0.05
+
+
+class TestPersist:
+    """Tests for background session metadata writes."""
+
+    def test_writes_land_in_submit_order(self):
+        """Later writes to the same file win, and flushing waits for all of them."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / "session.seek"
+            for i in range(50):
+                _persist(_write_atomic, path, str(i))
+            _flush_persist()
+
+            assert path.read_text() == "49"
+            assert [p.name for p in pathlib.Path(tmp).iterdir()] == ["session.seek"]
+
+    def test_missing_dir_is_ignored(self):
+        """Writing into a removed session dir is silently skipped."""
+        _write_atomic(pathlib.Path("/nonexistent/netv_transcode_x/session.json"), "{}")
+
+
+class TestRemoveDir:
+    """Tests for _remove_dir."""
+
+    def test_renames_then_deletes_in_background(self):
+        """Dir disappears from its path at once and is deleted afterwards."""
+        with tempfile.TemporaryDirectory() as tmp, patch("ffmpeg_session._DIR_POOL_MAX", 0):
+            target = pathlib.Path(tmp) / "netv_transcode_x"
+            target.mkdir()
+            (target / "seg000.ts").write_bytes(b"x" * 10)
+
+            _remove_dir(target)
+
+            assert not target.exists()
+            assert _wait_until_gone(*pathlib.Path(tmp).iterdir())
+
+    def test_emptied_dir_is_reused(self):
+        """A removed dir is emptied, pooled, and renamed into place for the next session."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            target = transcode_dir / "netv_transcode_x"
+            (target / "sub").mkdir(parents=True)
+            (target / "seg000.ts").write_bytes(b"x" * 10)
+            inode = target.stat().st_ino
+
+            _remove_dir(target)
+            deadline = time.monotonic() + 2.0
+            while not _dir_pool and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            with patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir):
+                reused = pathlib.Path(_acquire_output_dir("abc"))
+
+            assert reused.name.startswith("netv_transcode_abc_")
+            assert reused.stat().st_ino == inode
+            assert not any(reused.iterdir())
+            assert [p.name for p in transcode_dir.iterdir()] == [reused.name]
+
+    def test_acquire_falls_back_to_mkdtemp(self):
+        """A pooled dir that vanished is skipped in favor of a fresh dir."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            _dir_pool.append(transcode_dir / "netv_deleted_gone")
+
+            with patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir):
+                output_dir = pathlib.Path(_acquire_output_dir("abc"))
+
+            assert output_dir.is_dir()
+            assert output_dir.name.startswith("netv_transcode_abc_")
+            assert not _dir_pool
 
-    def setup_method(self):
-        _clear_session_state()
+    def test_missing_dir_is_noop(self):
+        """Removing a missing dir does not raise."""
+        _remove_dir("/nonexistent/netv_transcode_missing")
 
-    def teardown_method(self):
-        _clear_session_state()
+
+class TestCleanupAndRecoverSessions:
+    """Tests for cleanup_and_recover_sessions."""
 
     def test_removes_orphaned_dirs(self):
         """Removes dirs without session.json."""
@@ -801,7 +1475,154 @@ class TestCleanupAndRecoverSessions:
                 cleanup_and_recover_sessions()
 
             assert "vod123" in _transcode_sessions
-            assert _url_to_session.get("http://movie.mp4") == "vod123"
+            assert _url_to_session["http://movie.mp4"][0] == "vod123"
+
+    def test_recovery_reads_seek_sidecar(self):
+        """The seek sidecar overrides seek_offset from session.json."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            vod_dir = transcode_dir / "netv_transcode_vod123"
+            vod_dir.mkdir()
+            session_info = {
+                "session_id": "vod123",
+                "url": "http://movie.mp4",
+                "is_vod": True,
+                "started": time.time(),
+                "seek_offset": 10.0,
+            }
+            (vod_dir / "session.json").write_text(json.dumps(session_info))
+            (vod_dir / "session.seek").write_text("754.5")
+            (vod_dir / "seg000.ts").write_bytes(b"x" * 2000)
+
+            with (
+                patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir),
+                patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600),
+            ):
+                cleanup_and_recover_sessions()
+
+            assert _transcode_sessions["vod123"]["seek_offset"] == 754.5
+
+    def test_recovery_precomputes_subtitle_tracks(self):
+        """Subtitle tracks are built once at recovery and served from the snapshot."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            vod_dir = transcode_dir / "netv_transcode_vod123"
+            vod_dir.mkdir()
+            session_info = {
+                "session_id": "vod123",
+                "url": "http://movie.mp4",
+                "is_vod": True,
+                "started": time.time(),
+                "subtitles": [{"index": 2, "lang": "eng", "name": "English"}],
+            }
+            (vod_dir / "session.json").write_text(json.dumps(session_info))
+            (vod_dir / "seg000.ts").write_bytes(b"x" * 2000)
+
+            with (
+                patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir),
+                patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600),
+            ):
+                cleanup_and_recover_sessions()
+
+            with patch("ffmpeg_session._build_subtitle_tracks") as mock_build:
+                snap = _get_session_snapshot("vod123")
+            mock_build.assert_not_called()
+            assert snap is not None
+            assert snap.subtitle_tracks == [
+                {"url": "/subs/vod123/sub0.vtt", "lang": "eng", "label": "English", "default": True}
+            ]
+
+    def test_recovery_prefers_seeked_session_for_url(self):
+        """Two sessions for one URL: the one with seek_offset wins the mapping."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            for sid, seek in (("plain", 0), ("seeked", 120.0)):
+                d = transcode_dir / f"netv_transcode_{sid}"
+                d.mkdir()
+                info = {
+                    "session_id": sid,
+                    "url": "http://movie.mp4",
+                    "is_vod": True,
+                    "started": time.time(),
+                    "seek_offset": seek,
+                }
+                (d / "session.json").write_text(json.dumps(info))
+                (d / "seg000.ts").write_bytes(b"x" * 2000)
+
+            with (
+                patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir),
+                patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600),
+            ):
+                cleanup_and_recover_sessions()
+
+            sid, seek, _ = _url_to_session["http://movie.mp4"]
+            assert (sid, seek) == ("seeked", 120.0)
+
+    def test_recovery_updates_stats(self):
+        """Recovered and failed sessions are counted."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            good = transcode_dir / "netv_transcode_good"
+            good.mkdir()
+            info = {"session_id": "good", "url": "http://good.mp4", "is_vod": True}
+            (good / "session.json").write_text(json.dumps(info))
+            (good / "seg000.ts").write_bytes(b"x" * 2000)
+            bad = transcode_dir / "netv_transcode_bad"
+            bad.mkdir()
+            (bad / "session.json").write_text("{not json")
+            (bad / "seg000.ts").write_bytes(b"x" * 2000)
+
+            before = get_cache_stats()["counters"]
+            with (
+                patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir),
+                patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600),
+            ):
+                cleanup_and_recover_sessions()
+            stats = get_cache_stats()
+
+            assert stats["counters"]["recovery_ok"] == before["recovery_ok"] + 1
+            assert stats["counters"]["recovery_fail"] == before["recovery_fail"] + 1
+            assert stats["active_sessions"] == 1
+            assert set(stats["hit_ratios"]) == {"probe", "series_probe", "session_reuse"}
+
+    def test_removes_vod_dir_without_segments(self):
+        """Removes VOD dir that has session.json but no segments."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            vod_dir = transcode_dir / "netv_transcode_empty"
+            vod_dir.mkdir()
+            session_info = {"session_id": "empty", "url": "http://empty.mp4", "is_vod": True}
+            (vod_dir / "session.json").write_text(json.dumps(session_info))
+            (vod_dir / "sub0.vtt").write_text("WEBVTT\n")
+            unrelated = transcode_dir / "other_dir"
+            unrelated.mkdir()
+
+            with (
+                patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir),
+                patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600),
+            ):
+                cleanup_and_recover_sessions()
+
+            assert not vod_dir.exists()
+            assert unrelated.exists()
+            assert "empty" not in _transcode_sessions
+
+    def test_purges_leftover_tombstones(self):
+        """Deletes tombstone dirs left behind by a previous run."""
+        with tempfile.TemporaryDirectory() as tmp:
+            transcode_dir = pathlib.Path(tmp)
+            tombstone = transcode_dir / "netv_deleted_abc"
+            tombstone.mkdir()
+            (tombstone / "session.json").write_text("{}")
+
+            with (
+                patch("ffmpeg_session.get_transcode_dir", return_value=transcode_dir),
+                patch("ffmpeg_session.get_vod_cache_timeout", return_value=3600),
+            ):
+                cleanup_and_recover_sessions()
+
+            assert _wait_until_gone(tombstone)
+            assert not _transcode_sessions
 
     def test_removes_expired_vod_session(self):
         """Removes expired VOD session (older than cache timeout)."""
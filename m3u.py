@@ -2,8 +2,12 @@
 
 from __future__ import annotations
 
-from typing import Any
+from collections.abc import Callable, Iterator
+from typing import Any, TypeVar
 
+import concurrent.futures
+import functools
+import io
 import logging
 import re
 import threading
@@ -11,11 +15,15 @@ import time
 
 from cache import (
     LIVE_CACHE_TTL,
+    LIVE_SWR_TTL,
     SERIES_CACHE_TTL,
+    SERIES_SWR_TTL,
     VOD_CACHE_TTL,
+    VOD_SWR_TTL,
     get_cache,
     get_cache_lock,
     get_sources,
+    get_xtream_sources,
     load_file_cache,
     save_file_cache,
     update_source_epg_url,
@@ -26,7 +34,19 @@ from xtream import XtreamClient
 
 log = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+_MAX_SOURCE_FETCHES = 8  # Cap on concurrent upstream fetches across sources
+_REFRESH_WAIT_SEC = 30  # Cap on waiting for a background refresh (the upstream fetch timeout)
+
+_EPG_URL_RE = re.compile(r'(?:url-tvg|x-tvg-url)="([^"]*)"')
+_EXTINF_NAME_RE = re.compile(r"#EXTINF:[^,]*,(.*)")
+_ATTR_RE = re.compile(r'(\w+[-\w]*)="([^"]*)"')
+_SLUG_RE = re.compile(r"[^a-zA-Z0-9]+")
+
 _refresh_in_progress: set[str] = set()
+# In-flight background SWR refreshes by dataset name, guarded by the cache lock
+_refresh_events: dict[str, threading.Event] = {}
 _fetch_locks: dict[str, threading.Lock] = {
     "live": threading.Lock(),
     "vod": threading.Lock(),
@@ -35,38 +55,58 @@ _fetch_locks: dict[str, threading.Lock] = {
 }
 
 
+def _iter_lines(content: str) -> Iterator[str]:
+    """Yield the lines of content one at a time, without building a list of them."""
+    pos = 0
+    end = len(content)
+    while pos < end:
+        nl = content.find("\n", pos)
+        if nl == -1:
+            nl = end
+        yield content[pos:nl]
+        pos = nl + 1
+
+
+@functools.lru_cache(maxsize=4096)
+def _slugify(name: str) -> str:
+    """Turn a group title into a category ID suffix (the same names recur across sources)."""
+    return _SLUG_RE.sub("_", name).strip("_").lower()
+
+
 def parse_m3u(content: str, source_id: str) -> tuple[list[dict], list[dict], str]:
     """Parse M3U content, return (categories, streams, epg_url)."""
+    return _parse_m3u_lines(_iter_lines(content), source_id)
+
+
+def _parse_m3u_lines(lines: Iterator[str], source_id: str) -> tuple[list[dict], list[dict], str]:
+    """Parse M3U lines as they arrive; lines must be an iterator (URL lines are consumed)."""
     categories: dict[str, dict] = {}
     streams: list[dict] = []
     stream_id_counter = 0
+    streams_with_epg = 0
     epg_url = ""
 
-    lines = content.strip().split("\n")
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
+    for raw_line in lines:
+        line = raw_line.strip()
         if line.startswith("#EXTM3U"):
-            match = re.search(r'(?:url-tvg|x-tvg-url)="([^"]*)"', line)
+            match = _EPG_URL_RE.search(line)
             if match:
                 epg_url = match.group(1)
         elif line.startswith("#EXTINF:"):
-            attrs: dict[str, str] = {}
-            match = re.search(r"#EXTINF:[^,]*,(.*)", line)
+            match = _EXTINF_NAME_RE.match(line)
             name = match.group(1).strip() if match else "Unknown"
+            attrs = dict(_ATTR_RE.findall(line))
 
-            for attr_match in re.finditer(r'(\w+[-\w]*)="([^"]*)"', line):
-                attrs[attr_match.group(1)] = attr_match.group(2)
-
-            i += 1
-            while i < len(lines) and (not lines[i].strip() or lines[i].startswith("#")):
-                i += 1
-            url = lines[i].strip() if i < len(lines) else ""
+            # URL is the next line that isn't blank or a directive (consumed here)
+            url = ""
+            for next_line in lines:
+                if next_line.strip() and not next_line.startswith("#"):
+                    url = next_line.strip()
+                    break
 
             group = attrs.get("group-title", "Uncategorized")
             if group not in categories:
-                cat_slug = re.sub(r"[^a-zA-Z0-9]+", "_", group).strip("_").lower()
-                cat_id = f"{source_id}_{cat_slug}"
+                cat_id = f"{source_id}_{_slugify(group)}"
                 categories[group] = {
                     "category_id": cat_id,
                     "category_name": group,
@@ -75,20 +115,21 @@ def parse_m3u(content: str, source_id: str) -> tuple[list[dict], list[dict], str
                 }
 
             stream_id_counter += 1
+            epg_channel_id = attrs.get("tvg-id", "")
+            if epg_channel_id:
+                streams_with_epg += 1
             streams.append(
                 {
                     "stream_id": f"{source_id}_{stream_id_counter}",
                     "name": name,
                     "stream_icon": attrs.get("tvg-logo", ""),
-                    "epg_channel_id": attrs.get("tvg-id", ""),
+                    "epg_channel_id": epg_channel_id,
                     "category_ids": [categories[group]["category_id"]],
                     "direct_url": url,
                     "source_id": source_id,
                 }
             )
-        i += 1
 
-    streams_with_epg = sum(1 for s in streams if s.get("epg_channel_id"))
     log.debug(
         "M3U parsed: %d streams (%d with tvg-id, %d without), %d categories",
         len(streams),
@@ -102,8 +143,42 @@ def parse_m3u(content: str, source_id: str) -> tuple[list[dict], list[dict], str
 def fetch_m3u(url: str, source_id: str, timeout: int = 30) -> tuple[list[dict], list[dict], str]:
     """Fetch and parse M3U from URL, return (categories, streams, epg_url)."""
     with safe_urlopen(url, timeout=timeout) as resp:
-        content = resp.read().decode("utf-8")
-    return parse_m3u(content, source_id)
+        # Parse while streaming so the whole playlist is never held as one string
+        return _parse_m3u_lines(io.TextIOWrapper(resp, encoding="utf-8"), source_id)
+
+
+def _map_sources(fetch: Callable[[Any], _T], sources: list[Any]) -> list[_T]:
+    """Run fetch for each source in parallel, returning results in source order.
+
+    fetch must handle its own errors so one bad source can't sink the rest.
+    """
+    if len(sources) <= 1:
+        return [fetch(source) for source in sources]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(len(sources), _MAX_SOURCE_FETCHES),
+        thread_name_prefix="src-fetch",
+    ) as ex:
+        return list(ex.map(fetch, sources))
+
+
+def _tag_xtream_live(source: Any, cats: list[dict], streams: list[dict]) -> None:
+    """Namespace Xtream live category IDs by source and tag streams for playback, in place."""
+    prefix = f"{source.id}_"
+    for c in cats:
+        c["source_id"] = source.id
+        c["category_id"] = prefix + str(c["category_id"])
+    # One update() of a shared dict per stream instead of five separate stores
+    common = {
+        "source_id": source.id,
+        "source_type": "xtream",
+        "source_url": source.url,
+        "source_username": source.username,
+        "source_password": source.password,
+    }
+    for s in streams:
+        s.update(common)
+        orig_cats = s.get("category_ids") or (s.get("category_id"),)
+        s["category_ids"] = [prefix + str(c) for c in orig_cats if c]
 
 
 def _fetch_all_live_data() -> tuple[list[dict], list[dict], list[tuple[str, int, str]]]:
@@ -112,38 +187,32 @@ def _fetch_all_live_data() -> tuple[list[dict], list[dict], list[tuple[str, int,
     all_streams: list[dict] = []
     epg_urls: list[tuple[str, int, str]] = []
 
-    for source in get_sources():
+    def fetch_one(source: Any) -> tuple[list[dict], list[dict], tuple[str, int, str] | None]:
         try:
             if source.type == "xtream":
                 client = XtreamClient(source.url, source.username, source.password)
                 cats = client.get_live_categories()
                 streams = client.get_live_streams()
-                for c in cats:
-                    c["source_id"] = source.id
-                    c["category_id"] = f"{source.id}_{c['category_id']}"
-                for s in streams:
-                    s["source_id"] = source.id
-                    s["source_type"] = "xtream"
-                    s["source_url"] = source.url
-                    s["source_username"] = source.username
-                    s["source_password"] = source.password
-                    orig_cats = s.get("category_ids") or [s.get("category_id")]
-                    s["category_ids"] = [f"{source.id}_{c}" for c in orig_cats if c]
-                all_categories.extend(cats)
-                all_streams.extend(streams)
+                _tag_xtream_live(source, cats, streams)
                 if source.epg_enabled:
-                    epg_urls.append((client.epg_url, source.epg_timeout, source.id))
-            elif source.type == "m3u":
+                    return cats, streams, (client.epg_url, source.epg_timeout, source.id)
+                return cats, streams, None
+            if source.type == "m3u":
                 cats, streams, epg_url = fetch_m3u(source.url, source.id)
-                all_categories.extend(cats)
-                all_streams.extend(streams)
                 if epg_url and source.epg_enabled:
-                    epg_urls.append((epg_url, source.epg_timeout, source.id))
-            elif source.type == "epg":
-                if source.epg_enabled:
-                    epg_urls.append((source.url, source.epg_timeout, source.id))
+                    return cats, streams, (epg_url, source.epg_timeout, source.id)
+                return cats, streams, None
+            if source.type == "epg" and source.epg_enabled:
+                return [], [], (source.url, source.epg_timeout, source.id)
         except Exception as e:
             log.error("Error loading source %s: %s", source.name, e)
+        return [], [], None
+
+    for cats, streams, epg in _map_sources(fetch_one, get_sources()):
+        all_categories.extend(cats)
+        all_streams.extend(streams)
+        if epg:
+            epg_urls.append(epg)
 
     return all_categories, all_streams, epg_urls
 
@@ -158,17 +227,7 @@ def fetch_source_live_data(source: Any) -> tuple[list[dict], list[dict], str | N
         client = XtreamClient(source.url, source.username, source.password)
         cats = client.get_live_categories()
         streams = client.get_live_streams()
-        for c in cats:
-            c["source_id"] = source.id
-            c["category_id"] = f"{source.id}_{c['category_id']}"
-        for s in streams:
-            s["source_id"] = source.id
-            s["source_type"] = "xtream"
-            s["source_url"] = source.url
-            s["source_username"] = source.username
-            s["source_password"] = source.password
-            orig_cats = s.get("category_ids") or [s.get("category_id")]
-            s["category_ids"] = [f"{source.id}_{c}" for c in orig_cats if c]
+        _tag_xtream_live(source, cats, streams)
         detected_epg = client.epg_url
         update_source_epg_url(source.id, detected_epg)
         epg_url = detected_epg if source.epg_enabled else None
@@ -202,60 +261,121 @@ def parse_epg_urls(raw: list) -> list[tuple[str, int, str]]:
     return [(u[0], u[1], u[2]) for u in raw if isinstance(u, (list, tuple)) and len(u) >= 3]
 
 
-def load_all_live_data() -> tuple[list[dict], list[dict], list[tuple[str, int, str]]]:
-    """Load live data with file cache and stale-while-revalidate."""
+def _publish_swr(
+    name: str,
+    data: dict[str, Any],
+    invalidate: tuple[str, ...],
+    on_refresh: Callable[[dict[str, Any]], None] | None,
+) -> None:
+    """Save freshly fetched data to the file cache and drop in-memory views derived from it."""
     _cache = get_cache()
-    _cache_lock = get_cache_lock()
-    cached = load_file_cache("live_data")
-    now = time.time()
-
+    save_file_cache(f"{name}_data", data)
+    with get_cache_lock():
+        for key in invalidate:
+            _cache.pop(key, None)
+        if on_refresh:
+            on_refresh(data)
+
+
+def _load_swr(
+    name: str,
+    fetch: Callable[[], dict[str, Any] | None],
+    ttl: float,
+    swr_ttl: float,
+    invalidate: tuple[str, ...],
+    on_refresh: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, Any]:
+    """Load {name}_data from the file cache with fresh/stale/rotten stale-while-revalidate.
+
+    Data up to ttl old is served as-is. Up to ttl + swr_ttl it is served while a background
+    refresh runs. Older (or missing) data is refetched synchronously under the fetch lock.
+    fetch returns None when upstream gave nothing worth caching; rotten data is then served
+    rather than nothing.
+    """
+    cached = load_file_cache(f"{name}_data")
     if cached:
         data, ts = cached
-        cats, streams = data["cats"], data["streams"]
-        epg_urls = parse_epg_urls(data.get("epg_urls", []))
-        age = now - ts
-
-        if age > LIVE_CACHE_TTL and "live" not in _refresh_in_progress:
-            _refresh_in_progress.add("live")
-
-            def refresh() -> None:
-                try:
-                    log.info("Refreshing live data in background")
-                    new_cats, new_streams, new_epg_urls = _fetch_all_live_data()
-                    save_file_cache(
-                        "live_data",
-                        {"cats": new_cats, "streams": new_streams, "epg_urls": new_epg_urls},
-                    )
-                    with _cache_lock:
-                        _cache.pop("live_categories", None)
-                        _cache.pop("live_streams", None)
-                        _cache["epg_urls"] = new_epg_urls
-                    log.info("Live data refreshed")
-                finally:
-                    _refresh_in_progress.discard("live")
-
-            threading.Thread(target=refresh, daemon=True).start()
-
-        return cats, streams, epg_urls
-
-    with _fetch_locks["live"]:
-        cached = load_file_cache("live_data")
-        if cached:
-            data, _ = cached
-            return data["cats"], data["streams"], parse_epg_urls(data.get("epg_urls", []))
-        log.info("No live cache, fetching")
+        age = time.time() - ts
+        if age <= ttl:
+            return data
+        if age <= ttl + swr_ttl:
+            # Add-if-absent under the lock so concurrent requests spawn one refresh
+            with get_cache_lock():
+                spawn = name not in _refresh_events
+                if spawn:
+                    event = _refresh_events[name] = threading.Event()
+            if spawn:
+
+                def refresh() -> None:
+                    try:
+                        log.info("Refreshing %s data in background", name)
+                        new_data = fetch()
+                        if new_data is not None:
+                            _publish_swr(name, new_data, invalidate, on_refresh)
+                            log.info("Refreshed %s data", name)
+                    finally:
+                        with get_cache_lock():
+                            _refresh_events.pop(name, None)
+                        event.set()
+
+                threading.Thread(target=refresh, daemon=True).start()
+            return data
+
+    # Rather than racing an in-flight background refresh, wait for it and use its result.
+    # A hung refresh only delays us; on timeout we fetch under the lock ourselves.
+    with get_cache_lock():
+        pending = _refresh_events.get(name)
+    if pending:
+        pending.wait(_REFRESH_WAIT_SEC)
+
+    with _fetch_locks[name]:
+        # Another caller may have refreshed while we waited for the lock
+        cached = load_file_cache(f"{name}_data")
+        if cached and time.time() - cached[1] <= ttl + swr_ttl:
+            return cached[0]
+        log.info("No fresh %s cache, fetching", name)
+        new_data = fetch()
+        if new_data is None:
+            return cached[0] if cached else {}
+        _publish_swr(name, new_data, invalidate, on_refresh)
+        return new_data
+
+
+def load_all_live_data() -> tuple[list[dict], list[dict], list[tuple[str, int, str]]]:
+    """Load live data with file cache and stale-while-revalidate."""
+
+    def fetch() -> dict[str, Any] | None:
         cats, streams, epg_urls = _fetch_all_live_data()
-        save_file_cache("live_data", {"cats": cats, "streams": streams, "epg_urls": epg_urls})
-        return cats, streams, epg_urls
+        # An empty upstream only defers to existing (possibly rotten) data; with nothing
+        # cached it is saved, so we don't refetch on every request
+        if not cats and not streams and not epg_urls and load_file_cache("live_data"):
+            return None
+        return {"cats": cats, "streams": streams, "epg_urls": epg_urls}
+
+    def on_refresh(data: dict[str, Any]) -> None:
+        get_cache()["epg_urls"] = data["epg_urls"]
+
+    data = _load_swr(
+        "live",
+        fetch,
+        LIVE_CACHE_TTL,
+        LIVE_SWR_TTL,
+        ("live_categories", "live_streams"),
+        on_refresh,
+    )
+    return (
+        data.get("cats", []),
+        data.get("streams", []),
+        parse_epg_urls(data.get("epg_urls", [])),
+    )
 
 
 def _fetch_vod_data() -> tuple[list[dict], list[dict]]:
     """Fetch VOD categories and streams from all Xtream sources."""
     all_cats: list[dict] = []
     all_streams: list[dict] = []
-    for source in get_sources():
-        if source.type != "xtream":
-            continue
+
+    def fetch_one(source: Any) -> tuple[list[dict], list[dict]]:
         try:
             client = XtreamClient(source.url, source.username, source.password)
             cats = client.get_vod_categories()
@@ -265,63 +385,34 @@ def _fetch_vod_data() -> tuple[list[dict], list[dict]]:
                 c["source_id"] = source.id
             for s in streams:
                 s["source_id"] = source.id
-            all_cats.extend(cats)
-            all_streams.extend(streams)
+            return cats, streams
         except Exception as e:
             log.warning("Failed to fetch VOD from source %s: %s", source.id, e)
+            return [], []
+
+    for cats, streams in _map_sources(fetch_one, get_xtream_sources()):
+        all_cats.extend(cats)
+        all_streams.extend(streams)
     return all_cats, all_streams
 
 
 def load_vod_data() -> tuple[list[dict], list[dict]]:
     """Load VOD data with file cache and stale-while-revalidate."""
-    _cache = get_cache()
-    _cache_lock = get_cache_lock()
-    cached = load_file_cache("vod_data")
-    now = time.time()
 
-    if cached:
-        data, ts = cached
-        cats, streams = data["cats"], data["streams"]
-        age = now - ts
-
-        if age > VOD_CACHE_TTL and "vod" not in _refresh_in_progress:
-            _refresh_in_progress.add("vod")
-
-            def refresh() -> None:
-                try:
-                    log.info("Refreshing VOD data in background")
-                    new_cats, new_streams = _fetch_vod_data()
-                    save_file_cache("vod_data", {"cats": new_cats, "streams": new_streams})
-                    with _cache_lock:
-                        _cache.pop("vod_categories", None)
-                        _cache.pop("vod_streams", None)
-                    log.info("VOD data refreshed")
-                finally:
-                    _refresh_in_progress.discard("vod")
-
-            threading.Thread(target=refresh, daemon=True).start()
-
-        return cats, streams
-
-    with _fetch_locks["vod"]:
-        cached = load_file_cache("vod_data")
-        if cached:
-            data, _ = cached
-            return data["cats"], data["streams"]
-        log.info("No VOD cache, fetching")
+    def fetch() -> dict[str, Any] | None:
         cats, streams = _fetch_vod_data()
-        if cats or streams:
-            save_file_cache("vod_data", {"cats": cats, "streams": streams})
-        return cats, streams
+        return {"cats": cats, "streams": streams} if cats or streams else None
+
+    data = _load_swr("vod", fetch, VOD_CACHE_TTL, VOD_SWR_TTL, ("vod_categories", "vod_streams"))
+    return data.get("cats", []), data.get("streams", [])
 
 
 def _fetch_series_data() -> tuple[list[dict], list[dict]]:
     """Fetch series categories and list from all Xtream sources."""
     all_cats: list[dict] = []
     all_series: list[dict] = []
-    for source in get_sources():
-        if source.type != "xtream":
-            continue
+
+    def fetch_one(source: Any) -> tuple[list[dict], list[dict]]:
         try:
             client = XtreamClient(source.url, source.username, source.password)
             cats = client.get_series_categories()
@@ -331,77 +422,51 @@ def _fetch_series_data() -> tuple[list[dict], list[dict]]:
                 c["source_id"] = source.id
             for s in series:
                 s["source_id"] = source.id
-            all_cats.extend(cats)
-            all_series.extend(series)
+            return cats, series
         except Exception as e:
             log.warning("Failed to fetch series from source %s: %s", source.id, e)
+            return [], []
+
+    for cats, series in _map_sources(fetch_one, get_xtream_sources()):
+        all_cats.extend(cats)
+        all_series.extend(series)
     return all_cats, all_series
 
 
 def load_series_data() -> tuple[list[dict], list[dict]]:
     """Load series data with file cache and stale-while-revalidate."""
-    _cache = get_cache()
-    _cache_lock = get_cache_lock()
-    cached = load_file_cache("series_data")
-    now = time.time()
 
-    if cached:
-        data, ts = cached
-        cats, series = data["cats"], data["series"]
-        age = now - ts
-
-        if age > SERIES_CACHE_TTL and "series" not in _refresh_in_progress:
-            _refresh_in_progress.add("series")
-
-            def refresh() -> None:
-                try:
-                    log.info("Refreshing series data in background")
-                    new_cats, new_series = _fetch_series_data()
-                    save_file_cache("series_data", {"cats": new_cats, "series": new_series})
-                    with _cache_lock:
-                        _cache.pop("series_categories", None)
-                        _cache.pop("series", None)
-                    log.info("Series data refreshed")
-                finally:
-                    _refresh_in_progress.discard("series")
-
-            threading.Thread(target=refresh, daemon=True).start()
-
-        return cats, series
-
-    with _fetch_locks["series"]:
-        cached = load_file_cache("series_data")
-        if cached:
-            data, _ = cached
-            return data["cats"], data["series"]
-        log.info("No series cache, fetching")
+    def fetch() -> dict[str, Any] | None:
         cats, series = _fetch_series_data()
-        if cats or series:
-            save_file_cache("series_data", {"cats": cats, "series": series})
-        return cats, series
+        return {"cats": cats, "series": series} if cats or series else None
+
+    data = _load_swr(
+        "series", fetch, SERIES_CACHE_TTL, SERIES_SWR_TTL, ("series_categories", "series")
+    )
+    return data.get("cats", []), data.get("series", [])
 
 
 def get_first_xtream_client() -> XtreamClient | None:
     """Get the first available Xtream client (for VOD/series)."""
-    for source in get_sources():
-        if source.type == "xtream":
-            return XtreamClient(source.url, source.username, source.password)
+    if sources := get_xtream_sources():
+        source = sources[0]
+        return XtreamClient(source.url, source.username, source.password)
     return None
 
 
 def get_xtream_client_by_source(source_id: str) -> XtreamClient | None:
     """Get Xtream client for a specific source ID."""
-    for source in get_sources():
-        if source.id == source_id and source.type == "xtream":
+    for source in get_xtream_sources():
+        if source.id == source_id:
             return XtreamClient(source.url, source.username, source.password)
     return None
 
 
 def get_first_xtream_source_and_client() -> tuple[str, XtreamClient] | tuple[None, None]:
     """Get the first available Xtream source ID and client."""
-    for source in get_sources():
-        if source.type == "xtream":
-            return source.id, XtreamClient(source.url, source.username, source.password)
+    if sources := get_xtream_sources():
+        source = sources[0]
+        return source.id, XtreamClient(source.url, source.username, source.password)
     return None, None
 
 
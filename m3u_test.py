@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
@@ -82,6 +83,27 @@ http://test
         assert cats[0]["category_id"].startswith("mysource_")
         assert streams[0]["category_ids"][0].startswith("mysource_")
 
+    def test_parse_m3u_attr_with_comma(self, m3u_module):
+        content = """#EXTM3U
+#EXTINF:-1 tvg-id="ch1" group-title="News, Local",Channel One
+http://test
+"""
+        cats, streams, _ = m3u_module.parse_m3u(content, "src1")
+        assert cats[0]["category_name"] == "News, Local"
+        assert cats[0]["category_id"] == "src1_news_local"
+        assert streams[0]["epg_channel_id"] == "ch1"
+
+    def test_parse_m3u_skips_directives_before_url(self, m3u_module):
+        content = (
+            "\r\n#EXTM3U\r\n#EXTINF:-1,One\r\n#EXTVLCOPT:http-user-agent=x\r\n\r\n"
+            "http://one\r\n#EXTINF:-1,Two\r\nhttp://two"
+        )
+        _, streams, _ = m3u_module.parse_m3u(content, "src1")
+        assert [(s["name"], s["direct_url"]) for s in streams] == [
+            ("One", "http://one"),
+            ("Two", "http://two"),
+        ]
+
     def test_parse_m3u_empty(self, m3u_module):
         cats, streams, epg_url = m3u_module.parse_m3u("", "src1")
         assert cats == []
@@ -89,6 +111,23 @@ http://test
         assert epg_url == ""
 
 
+class TestFetchM3u:
+    def test_parses_streamed_response(self, m3u_module):
+        import io
+
+        body = (
+            '#EXTM3U url-tvg="http://epg"\r\n'
+            '#EXTINF:-1 tvg-id="a" group-title="News",Ch\u00e9 1\r\n'
+            "http://stream/1\r\n"
+        ).encode()
+        with patch.object(m3u_module, "safe_urlopen", return_value=io.BytesIO(body)):
+            cats, streams, epg_url = m3u_module.fetch_m3u("http://list", "src1")
+        assert epg_url == "http://epg"
+        assert [c["category_name"] for c in cats] == ["News"]
+        assert streams[0]["name"] == "Ch\u00e9 1"
+        assert streams[0]["direct_url"] == "http://stream/1"
+
+
 class TestParseEpgUrls:
     def test_parse_tuple_list(self, m3u_module):
         raw = [["http://epg1.com", 120, "src1"], ["http://epg2.com", 60, "src2"]]
@@ -122,6 +161,165 @@ class TestFetchLocks:
         assert isinstance(rip, set)
 
 
+class TestMapSources:
+    def test_preserves_source_order(self, m3u_module):
+        import time
+
+        def fetch(delay):
+            time.sleep(delay)
+            return delay
+
+        assert m3u_module._map_sources(fetch, [0.05, 0.0, 0.02]) == [0.05, 0.0, 0.02]
+
+    def test_empty_and_single(self, m3u_module):
+        assert m3u_module._map_sources(lambda s: s, []) == []
+        assert m3u_module._map_sources(lambda s: s * 2, [3]) == [6]
+
+
+class TestTagXtreamLive:
+    def test_prefixes_ids_and_tags_streams(self, m3u_module):
+        from types import SimpleNamespace
+
+        source = SimpleNamespace(id="src", url="http://x", username="u", password="p")
+        cats = [{"category_id": 5}]
+        streams = [{"category_id": 5}, {"category_ids": [1, 2]}, {"category_id": None}]
+        m3u_module._tag_xtream_live(source, cats, streams)
+        assert cats == [{"category_id": "src_5", "source_id": "src"}]
+        assert [s["category_ids"] for s in streams] == [["src_5"], ["src_1", "src_2"], []]
+        assert streams[0]["source_type"] == "xtream"
+        assert streams[1]["source_password"] == "p"
+
+
+class TestLoadSwr:
+    @staticmethod
+    def _seed(age: float) -> None:
+        import json
+        import time
+
+        import cache
+
+        payload = {"data": {"cats": [{"id": "old"}], "streams": []}, "timestamp": time.time() - age}
+        (cache.CACHE_DIR / "vod_data.json").write_text(json.dumps(payload))
+
+    def test_fresh_served_without_refresh(self, m3u_module):
+        self._seed(0)
+        with patch.object(m3u_module, "_fetch_vod_data") as fetch:
+            cats, _ = m3u_module.load_vod_data()
+        assert cats == [{"id": "old"}]
+        fetch.assert_not_called()
+
+    def test_stale_served_while_refreshing(self, m3u_module):
+        self._seed(m3u_module.VOD_CACHE_TTL + 60)
+        with (
+            patch.object(m3u_module, "_fetch_vod_data", return_value=([], [])),
+            patch.object(m3u_module.threading, "Thread") as thread,
+        ):
+            cats, _ = m3u_module.load_vod_data()
+        assert cats == [{"id": "old"}]
+        thread.return_value.start.assert_called_once()
+        m3u_module._refresh_events.clear()
+
+    def test_concurrent_stale_reads_spawn_one_refresh(self, m3u_module):
+        import threading
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._seed(m3u_module.VOD_CACHE_TTL + 60)
+        gate = threading.Event()
+
+        def slow_fetch():
+            gate.wait(5)
+            return [], []
+
+        with patch.object(m3u_module, "_fetch_vod_data", side_effect=slow_fetch) as fetch:
+            with ThreadPoolExecutor(max_workers=8) as ex:
+                results = list(ex.map(lambda _: m3u_module.load_vod_data(), range(32)))
+            event = m3u_module._refresh_events.get("vod")
+            gate.set()
+            if event:
+                event.wait(5)
+        assert all(cats == [{"id": "old"}] for cats, _ in results)
+        assert fetch.call_count == 1
+
+    def test_rotten_read_waits_for_inflight_refresh(self, m3u_module):
+        import threading
+
+        self._seed(m3u_module.VOD_CACHE_TTL + m3u_module.VOD_SWR_TTL + 60)
+        event = m3u_module._refresh_events["vod"] = threading.Event()
+
+        def finish_refresh():
+            self._seed(0)
+            m3u_module._refresh_events.pop("vod")
+            event.set()
+
+        timer = threading.Timer(0.05, finish_refresh)
+        timer.start()
+        with patch.object(m3u_module, "_fetch_vod_data") as fetch:
+            cats, _ = m3u_module.load_vod_data()
+        timer.join()
+        assert cats == [{"id": "old"}]
+        fetch.assert_not_called()
+
+    def test_rotten_read_stops_waiting_for_hung_refresh(self, m3u_module):
+        import threading
+
+        self._seed(m3u_module.VOD_CACHE_TTL + m3u_module.VOD_SWR_TTL + 60)
+        m3u_module._refresh_events["vod"] = threading.Event()
+        new = ([{"id": "new"}], [])
+        try:
+            with (
+                patch.object(m3u_module, "_REFRESH_WAIT_SEC", 0.05),
+                patch.object(m3u_module, "_fetch_vod_data", return_value=new),
+            ):
+                assert m3u_module.load_vod_data() == new
+        finally:
+            m3u_module._refresh_events.pop("vod", None)
+
+    def test_rotten_refetched_synchronously(self, m3u_module):
+        self._seed(m3u_module.VOD_CACHE_TTL + m3u_module.VOD_SWR_TTL + 60)
+        new = ([{"id": "new"}], [{"stream_id": 1}])
+        with patch.object(m3u_module, "_fetch_vod_data", return_value=new):
+            assert m3u_module.load_vod_data() == new
+
+    def test_rotten_kept_when_upstream_empty(self, m3u_module):
+        self._seed(m3u_module.VOD_CACHE_TTL + m3u_module.VOD_SWR_TTL + 60)
+        with patch.object(m3u_module, "_fetch_vod_data", return_value=([], [])):
+            cats, _ = m3u_module.load_vod_data()
+        assert cats == [{"id": "old"}]
+
+    def test_rotten_live_kept_when_upstream_empty(self, m3u_module):
+        import json
+        import time
+
+        import cache
+
+        ts = time.time() - m3u_module.LIVE_CACHE_TTL - m3u_module.LIVE_SWR_TTL - 60
+        payload = {"data": {"cats": [{"id": "old"}], "streams": [], "epg_urls": []}, "timestamp": ts}
+        (cache.CACHE_DIR / "live_data.json").write_text(json.dumps(payload))
+        with patch.object(m3u_module, "_fetch_all_live_data", return_value=([], [], [])):
+            cats, _, _ = m3u_module.load_all_live_data()
+        assert cats == [{"id": "old"}]
+        assert json.loads((cache.CACHE_DIR / "live_data.json").read_text())["timestamp"] == ts
+
+    def test_live_epg_only_sources_saved(self, m3u_module):
+        import json
+
+        import cache
+
+        epg_urls = [("http://epg.example/guide.xml", 60, "src1")]
+        with patch.object(m3u_module, "_fetch_all_live_data", return_value=([], [], epg_urls)):
+            _, _, urls = m3u_module.load_all_live_data()
+        assert urls == epg_urls
+        saved = json.loads((cache.CACHE_DIR / "live_data.json").read_text())["data"]
+        assert saved["epg_urls"] == [list(u) for u in epg_urls]
+
+    def test_live_empty_upstream_saved_without_cache(self, m3u_module):
+        with patch.object(m3u_module, "_fetch_all_live_data", return_value=([], [], [])) as fetch:
+            m3u_module.load_all_live_data()
+            m3u_module.load_all_live_data()
+        assert fetch.call_count == 1
+
+
 if __name__ == "__main__":
     from testing import run_tests
 
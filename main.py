@@ -242,8 +242,9 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     cleanup_stop = threading.Event()
 
     def cleanup_loop():
-        while not cleanup_stop.wait(60):  # Check every minute
-            ffmpeg_session.cleanup_expired_sessions()
+        delay = 60.0
+        while not cleanup_stop.wait(delay):  # Sweep again when the next session can expire
+            delay = ffmpeg_session.cleanup_expired_sessions()
 
     cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
     cleanup_thread.start()
@@ -300,6 +301,7 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     cleanup_stop.set()
     scheduler_stop.set()
     ffmpeg_session.shutdown()
+    ffmpeg_command.flush_series_probe_cache()
 
 
 app = FastAPI(title="neTV", lifespan=lifespan)
@@ -1825,20 +1827,21 @@ async def transcode_file(
     if safe_filename != filename or ".." in filename:
         raise HTTPException(400, "Invalid filename")
 
-    session = ffmpeg_session.get_session(session_id)
-    if not session:
-        log.debug(f"[CAST] 404 session not found: {session_id}")
+    session_dir = ffmpeg_session.get_session_dir(session_id)
+    if session_dir is None:
+        log.debug("[CAST] 404 session not found: %s", session_id)
         raise HTTPException(404, "Transcode session not found")
 
-    file_path = pathlib.Path(session["dir"]) / safe_filename
+    file_path = session_dir / safe_filename
     if not file_path.exists():
-        log.debug(f"[CAST] 404 file not found: {file_path}")
+        log.debug("[CAST] 404 file not found: %s", file_path)
         raise HTTPException(404, "File not found")
 
-    # Log Chromecast requests
-    ua = request.headers.get("user-agent", "")
-    if "CrKey" in ua or "Chromecast" in ua.lower() or "cast" in ua.lower():
-        log.debug(f"[CAST] Chromecast request: {filename} UA={ua[:80]}")
+    # Log Chromecast requests (skip the UA sniffing when debug is off)
+    if log.isEnabledFor(logging.DEBUG):
+        ua = request.headers.get("user-agent", "")
+        if "CrKey" in ua or "cast" in ua.lower():
+            log.debug("[CAST] Chromecast request: %s UA=%s", filename, ua[:80])
 
     cors = {"Access-Control-Allow-Origin": "*"}
     if filename.endswith(".m3u8"):
@@ -1863,10 +1866,10 @@ async def subtitle_file(session_id: str, filename: str):
         raise HTTPException(400, "Invalid filename")
     if not safe_filename.endswith(".vtt"):
         raise HTTPException(400, "Only VTT files allowed")
-    session = ffmpeg_session.get_session(session_id)
-    if not session:
+    session_dir = ffmpeg_session.get_session_dir(session_id)
+    if session_dir is None:
         raise HTTPException(404, "Session not found")
-    file_path = pathlib.Path(session["dir"]) / safe_filename
+    file_path = session_dir / safe_filename
     # Wait briefly for file, return empty VTT if not ready (client will poll again)
     for _ in range(15):  # 3 seconds
         if file_path.exists() and file_path.stat().st_size > 20:
@@ -2074,6 +2077,8 @@ async def settings_page(request: Request, user: Annotated[dict, Depends(require_
             "vod_transcode_cache_mins": server_settings.get("vod_transcode_cache_mins", 60),
             "live_transcode_cache_secs": server_settings.get("live_transcode_cache_secs", 60),
             "live_dvr_mins": server_settings.get("live_dvr_mins", 0),
+            "ffmpeg_threads": server_settings.get("ffmpeg_threads", 0),
+            "max_ffmpeg_threads": ffmpeg_command.MAX_FFMPEG_THREADS,
             "transcode_dir": server_settings.get("transcode_dir", ""),
             "probe_live": server_settings.get("probe_live", True),
             "probe_movies": server_settings.get("probe_movies", True),
@@ -2604,6 +2609,7 @@ async def settings_transcode(
     vod_transcode_cache_mins: Annotated[int, Form()] = 60,
     live_transcode_cache_secs: Annotated[int, Form()] = 0,
     live_dvr_mins: Annotated[int, Form()] = 0,
+    ffmpeg_threads: Annotated[int, Form()] = 0,
     transcode_dir: Annotated[str, Form()] = "",
     probe_live: Annotated[str | None, Form()] = None,
     probe_movies: Annotated[str | None, Form()] = None,
@@ -2617,6 +2623,7 @@ async def settings_transcode(
     settings["vod_transcode_cache_mins"] = max(0, vod_transcode_cache_mins)
     settings["live_transcode_cache_secs"] = max(0, live_transcode_cache_secs)
     settings["live_dvr_mins"] = max(0, live_dvr_mins)
+    settings["ffmpeg_threads"] = min(max(0, ffmpeg_threads), ffmpeg_command.MAX_FFMPEG_THREADS)
     if transcode_dir:
         settings["transcode_dir"] = transcode_dir
     elif "transcode_dir" in settings:
@@ -2729,6 +2736,12 @@ async def clear_series_mru(
     return {"ok": True}
 
 
+@app.get("/metrics/sessions")
+async def session_metrics(_user: Annotated[dict, Depends(require_admin)]):
+    """Probe cache and session reuse hit/miss counters."""
+    return ffmpeg_session.get_cache_stats()
+
+
 @app.post("/settings/data-cache/clear")
 async def clear_data_cache(_user: Annotated[dict, Depends(require_admin)]):
     """Clear all data file caches (live, VOD, series) and memory cache."""
@@ -2752,12 +2765,22 @@ async def update_settings_api(
         "transcode_mode",
         "transcode_hw",
         "vod_transcode_cache_mins",
+        "ffmpeg_threads",
         "probe_live",
         "probe_movies",
         "probe_series",
         "vod_order",
         "series_order",
     }
+    if "ffmpeg_threads" in data:
+        try:
+            data["ffmpeg_threads"] = int(data["ffmpeg_threads"])
+        except (TypeError, ValueError):
+            raise HTTPException(400, "ffmpeg_threads must be an integer") from None
+        if not 0 <= data["ffmpeg_threads"] <= ffmpeg_command.MAX_FFMPEG_THREADS:
+            raise HTTPException(
+                400, f"ffmpeg_threads must be between 0 and {ffmpeg_command.MAX_FFMPEG_THREADS}"
+            )
     settings = load_server_settings()
     for key in allowed_keys:
         if key in data:
@@ -3,9 +3,11 @@
 from __future__ import annotations
 
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 import json
+import types
+import urllib.error
 
 import pytest
 
@@ -13,74 +15,110 @@ import cache as cache_module
 import m3u as m3u_module
 
 
-@pytest.fixture
-def mock_deps():
-    """Mock all external dependencies before importing main."""
-    with (
-        patch.dict(
-            "sys.modules", {"defusedxml": MagicMock(), "defusedxml.ElementTree": MagicMock()}
-        ),
-        patch("cache.CACHE_DIR", Path("/tmp/test_cache")),
-        patch("cache.SERVER_SETTINGS_FILE", Path("/tmp/test_cache/server_settings.json")),
-        patch("cache.USERS_DIR", Path("/tmp/test_cache/users")),
-    ):
-        yield
+def _defusedxml_stub() -> dict[str, types.ModuleType]:
+    """Plain modules standing in for defusedxml, backed by the stdlib parser."""
+    import xml.etree.ElementTree as StdET
 
+    element_tree = types.ModuleType("defusedxml.ElementTree")
+    element_tree.fromstring = StdET.fromstring  # type: ignore[attr-defined]
+    element_tree.ParseError = StdET.ParseError  # type: ignore[attr-defined]
+    package = types.ModuleType("defusedxml")
+    package.ElementTree = element_tree  # type: ignore[attr-defined]
+    return {"defusedxml": package, "defusedxml.ElementTree": element_tree}
 
-@pytest.fixture
-def client(tmp_path: Path, mock_deps):
-    """Create test client with mocked dependencies."""
-    from fastapi.testclient import TestClient
 
-    # Patch paths before importing main
+def _no_network(url: str, timeout: int = 30):
+    raise urllib.error.URLError(f"network disabled in tests: {url}")
+
+
+@pytest.fixture(scope="module")
+def main_module():
+    """Import main once for this module, with external dependencies mocked.
+
+    The sys.modules patch drops everything imported under it on exit, so importing main per
+    test re-imported the whole app every time.
+    """
     with (
-        patch("cache.CACHE_DIR", tmp_path),
-        patch("cache.SERVER_SETTINGS_FILE", tmp_path / "server_settings.json"),
-        patch("cache.USERS_DIR", tmp_path / "users"),
-        patch("auth.CACHE_DIR", tmp_path),
-        patch("auth.SERVER_SETTINGS_FILE", tmp_path / "server_settings.json"),
-        patch("auth.USERS_DIR", tmp_path / "users"),
+        patch.dict("sys.modules", _defusedxml_stub()),
         patch("epg.init"),
         patch("ffmpeg_command.init"),
         patch("ffmpeg_session.cleanup_and_recover_sessions"),
+        # Key stretching is deliberately slow; these tests only need hashes to round-trip
+        patch("auth.PBKDF2_ITERATIONS", 1),
+        # Fail fast on any upstream fetch (incl. background refreshes) instead of hitting the net
+        patch("util.safe_urlopen", side_effect=_no_network),
+        patch("epg.safe_urlopen", side_effect=_no_network),
+        patch("m3u.safe_urlopen", side_effect=_no_network),
+        patch("xtream.safe_urlopen", side_effect=_no_network),
     ):
-        (tmp_path / "users").mkdir(exist_ok=True)
         import main
 
-        # Disable background loading
-        cache_module.get_cache().clear()
-        yield TestClient(main.app)
+        yield main
 
 
 @pytest.fixture
-def auth_client(tmp_path: Path, mock_deps):
-    """Create test client with a logged-in user."""
+def client(tmp_path: Path, main_module, monkeypatch: pytest.MonkeyPatch):
+    """Create test client with mocked dependencies."""
     from fastapi.testclient import TestClient
 
-    with (
-        patch("cache.CACHE_DIR", tmp_path),
-        patch("cache.SERVER_SETTINGS_FILE", tmp_path / "server_settings.json"),
-        patch("cache.USERS_DIR", tmp_path / "users"),
-        patch("auth.CACHE_DIR", tmp_path),
-        patch("auth.SERVER_SETTINGS_FILE", tmp_path / "server_settings.json"),
-        patch("auth.USERS_DIR", tmp_path / "users"),
-        patch("epg.init"),
-        patch("ffmpeg_command.init"),
-        patch("ffmpeg_session.cleanup_and_recover_sessions"),
-    ):
-        (tmp_path / "users").mkdir(exist_ok=True)
-        import auth
-        import main
+    # Point every module that from-imported or defines the data paths at this test's tmp_path
+    users_dir = tmp_path / "users"
+    users_dir.mkdir(exist_ok=True)
+    for module in (cache_module, main_module.auth):
+        monkeypatch.setattr(module, "CACHE_DIR", tmp_path)
+        monkeypatch.setattr(module, "SERVER_SETTINGS_FILE", tmp_path / "server_settings.json")
+        monkeypatch.setattr(module, "USERS_DIR", users_dir)
+    monkeypatch.setattr(main_module, "CACHE_DIR", tmp_path)
+    # Fresh module state per test (what re-importing main used to give), put back on teardown
+    monkeypatch.setattr(cache_module, "_cache", {})
+    monkeypatch.setattr(m3u_module, "_refresh_in_progress", set())
+    monkeypatch.setattr(main_module, "_login_attempts", {})
+    # Not entered as a context manager: that would run the app lifespan (startup loads,
+    # cleanup loop) for every test. Closing is enough to release the transport.
+    test_client = TestClient(main_module.app)
+    yield test_client
+    test_client.close()
+
+
+@pytest.fixture
+def seed_cache(client):
+    """Return a helper that fills the catalog caches, defaulting every key to empty."""
+
+    def seed(**entries):
+        cache_module.get_cache().update(
+            {
+                "live_categories": [],
+                "live_streams": [],
+                "epg_urls": [],
+                "vod_categories": [],
+                "vod_streams": [],
+                "series_categories": [],
+                "series": [],
+                **entries,
+            }
+        )
 
-        cache_module.get_cache().clear()
-        client = TestClient(main.app)
+    return seed
 
-        # Create user and get token
-        auth.create_user("testuser", "testpass123")
-        token = auth.create_token({"sub": "testuser"})
-        client.cookies.set("token", token)
 
-        yield client
+@pytest.fixture
+def admin_user(client):
+    """Create an admin account so setup is complete."""
+    import auth
+
+    auth.create_user("admin", "password123")
+
+
+@pytest.fixture
+def auth_client(client):
+    """Create test client with a logged-in user."""
+    import auth
+
+    # Create user and get token
+    auth.create_user("testuser", "testpass123")
+    token = auth.create_token({"sub": "testuser"})
+    client.cookies.set("token", token)
+    return client
 
 
 class TestSetup:
@@ -91,11 +129,7 @@ class TestSetup:
         assert resp.status_code == 200
         assert b"setup" in resp.content.lower() or b"Create" in resp.content
 
-    def test_setup_redirects_when_users_exist(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
+    def test_setup_redirects_when_users_exist(self, client, admin_user):
         resp = client.get("/setup", follow_redirects=False)
         assert resp.status_code == 303
         assert resp.headers["location"] == "/login"
@@ -146,19 +180,11 @@ class TestLogin:
         assert resp.status_code == 303
         assert resp.headers["location"] == "/setup"
 
-    def test_login_page_shown_when_users_exist(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
+    def test_login_page_shown_when_users_exist(self, client, admin_user):
         resp = client.get("/login")
         assert resp.status_code == 200
 
-    def test_login_success_sets_cookie(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
+    def test_login_success_sets_cookie(self, client, admin_user):
         resp = client.post(
             "/login",
             data={"username": "admin", "password": "password123"},
@@ -167,11 +193,7 @@ class TestLogin:
         assert resp.status_code == 303
         assert "token" in resp.cookies
 
-    def test_login_failure_returns_401(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
+    def test_login_failure_returns_401(self, client, admin_user):
         resp = client.post(
             "/login",
             data={"username": "admin", "password": "wrongpassword"},
@@ -193,39 +215,9 @@ class TestLogout:
 class TestAuthRequired:
     """Tests for auth-protected routes."""
 
-    def test_index_redirects_to_login(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
-        resp = client.get("/", follow_redirects=False)
-        assert resp.status_code == 303
-        assert resp.headers["location"] == "/login"
-
-    def test_guide_redirects_to_login(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
-        resp = client.get("/guide", follow_redirects=False)
-        assert resp.status_code == 303
-        assert resp.headers["location"] == "/login"
-
-    def test_vod_redirects_to_login(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
-        resp = client.get("/vod", follow_redirects=False)
-        assert resp.status_code == 303
-        assert resp.headers["location"] == "/login"
-
-    def test_series_redirects_to_login(self, client, tmp_path):
-        import auth
-
-        auth.create_user("admin", "password123")
-
-        resp = client.get("/series", follow_redirects=False)
+    @pytest.mark.parametrize("path", ["/", "/guide", "/vod", "/series"])
+    def test_redirects_to_login(self, client, admin_user, path):
+        resp = client.get(path, follow_redirects=False)
         assert resp.status_code == 303
         assert resp.headers["location"] == "/login"
 
@@ -257,25 +249,24 @@ class TestGuide:
             # Should show loading state
             assert b"loading" in resp.content.lower() or b"Loading" in resp.content
 
-    def test_guide_shows_channels_from_cache(self, auth_client):
-        cache_module.get_cache()["live_categories"] = [
-            {"category_id": "1", "category_name": "News"}
-        ]
-        cache_module.get_cache()["live_streams"] = [
-            {"stream_id": 1, "name": "CNN", "category_ids": ["1"], "epg_channel_id": ""}
-        ]
+    def test_guide_shows_channels_from_cache(self, auth_client, seed_cache):
+        seed_cache(
+            live_categories=[{"category_id": "1", "category_name": "News"}],
+            live_streams=[
+                {"stream_id": 1, "name": "CNN", "category_ids": ["1"], "epg_channel_id": ""}
+            ],
+        )
 
         with patch("main.epg.has_programs", return_value=True):
             resp = auth_client.get("/guide?cats=1")
             assert resp.status_code == 200
 
-    def test_guide_uses_saved_filter(self, auth_client, tmp_path):
+    def test_guide_uses_saved_filter(self, auth_client, tmp_path, seed_cache):
         user_dir = tmp_path / "users" / "testuser"
         user_dir.mkdir(parents=True, exist_ok=True)
         (user_dir / "settings.json").write_text(json.dumps({"guide_filter": ["1", "2"]}))
 
-        cache_module.get_cache()["live_categories"] = []
-        cache_module.get_cache()["live_streams"] = []
+        seed_cache()
 
         # Guide now renders directly using saved filter (no redirect)
         with patch("main.epg.has_programs", return_value=True):
@@ -291,36 +282,49 @@ class TestVod:
             resp = auth_client.get("/vod")
             assert resp.status_code == 200
 
-    def test_vod_shows_movies_from_cache(self, auth_client):
-        cache_module.get_cache()["vod_categories"] = [
-            {"category_id": "10", "category_name": "Movies", "source_id": "src1"}
-        ]
-        cache_module.get_cache()["vod_streams"] = [
-            {"stream_id": 100, "name": "Movie 1", "category_id": "10", "source_id": "src1"}
-        ]
+    def test_vod_shows_movies_from_cache(self, auth_client, seed_cache):
+        seed_cache(
+            vod_categories=[{"category_id": "10", "category_name": "Movies", "source_id": "src1"}],
+            vod_streams=[
+                {"stream_id": 100, "name": "Movie 1", "category_id": "10", "source_id": "src1"}
+            ],
+        )
 
         resp = auth_client.get("/vod")
         assert resp.status_code == 200
 
-    def test_vod_filters_by_category(self, auth_client):
-        cache_module.get_cache()["vod_categories"] = [
-            {"category_id": "10", "category_name": "Action", "source_id": "src1"},
-            {"category_id": "20", "category_name": "Comedy", "source_id": "src1"},
-        ]
-        cache_module.get_cache()["vod_streams"] = [
-            {"stream_id": 100, "name": "Action Movie", "category_id": "10", "source_id": "src1"},
-            {"stream_id": 101, "name": "Comedy Movie", "category_id": "20", "source_id": "src1"},
-        ]
+    def test_vod_filters_by_category(self, auth_client, seed_cache):
+        seed_cache(
+            vod_categories=[
+                {"category_id": "10", "category_name": "Action", "source_id": "src1"},
+                {"category_id": "20", "category_name": "Comedy", "source_id": "src1"},
+            ],
+            vod_streams=[
+                {
+                    "stream_id": 100,
+                    "name": "Action Movie",
+                    "category_id": "10",
+                    "source_id": "src1",
+                },
+                {
+                    "stream_id": 101,
+                    "name": "Comedy Movie",
+                    "category_id": "20",
+                    "source_id": "src1",
+                },
+            ],
+        )
 
         resp = auth_client.get("/vod?category=10")
         assert resp.status_code == 200
 
-    def test_vod_sorts_by_alpha(self, auth_client):
-        cache_module.get_cache()["vod_categories"] = []
-        cache_module.get_cache()["vod_streams"] = [
-            {"stream_id": 1, "name": "Zebra", "source_id": "src1"},
-            {"stream_id": 2, "name": "Apple", "source_id": "src1"},
-        ]
+    def test_vod_sorts_by_alpha(self, auth_client, seed_cache):
+        seed_cache(
+            vod_streams=[
+                {"stream_id": 1, "name": "Zebra", "source_id": "src1"},
+                {"stream_id": 2, "name": "Apple", "source_id": "src1"},
+            ],
+        )
 
         resp = auth_client.get("/vod?sort=alpha")
         assert resp.status_code == 200
@@ -334,13 +338,13 @@ class TestSeries:
             resp = auth_client.get("/series")
             assert resp.status_code == 200
 
-    def test_series_shows_list_from_cache(self, auth_client):
-        cache_module.get_cache()["series_categories"] = [
-            {"category_id": "30", "category_name": "Drama", "source_id": "src1"}
-        ]
-        cache_module.get_cache()["series"] = [
-            {"series_id": 200, "name": "Show 1", "category_id": "30", "source_id": "src1"}
-        ]
+    def test_series_shows_list_from_cache(self, auth_client, seed_cache):
+        seed_cache(
+            series_categories=[
+                {"category_id": "30", "category_name": "Drama", "source_id": "src1"}
+            ],
+            series=[{"series_id": 200, "name": "Show 1", "category_id": "30", "source_id": "src1"}],
+        )
 
         resp = auth_client.get("/series")
         assert resp.status_code == 200
@@ -349,42 +353,36 @@ class TestSeries:
 class TestSearch:
     """Tests for search page."""
 
-    def test_search_page_renders(self, auth_client):
-        cache_module.get_cache()["live_streams"] = []
-        cache_module.get_cache()["vod_streams"] = []
-        cache_module.get_cache()["series"] = []
+    def test_search_page_renders(self, auth_client, seed_cache):
+        seed_cache()
 
         resp = auth_client.get("/search")
         assert resp.status_code == 200
 
-    def test_search_finds_live_streams(self, auth_client):
-        cache_module.get_cache()["live_streams"] = [
-            {"stream_id": 1, "name": "CNN News"},
-            {"stream_id": 2, "name": "BBC World"},
-        ]
-        cache_module.get_cache()["live_categories"] = []
-        cache_module.get_cache()["epg_urls"] = []
-        cache_module.get_cache()["vod_streams"] = []
-        cache_module.get_cache()["series"] = []
+    def test_search_finds_live_streams(self, auth_client, seed_cache):
+        seed_cache(
+            live_streams=[
+                {"stream_id": 1, "name": "CNN News"},
+                {"stream_id": 2, "name": "BBC World"},
+            ],
+        )
 
         resp = auth_client.get("/search?q=CNN&live=true")
         assert resp.status_code == 200
 
-    def test_search_regex_mode(self, auth_client):
-        cache_module.get_cache()["live_streams"] = [
-            {"stream_id": 1, "name": "CNN News"},
-            {"stream_id": 2, "name": "CNBC Finance"},
-        ]
-        cache_module.get_cache()["live_categories"] = []
-        cache_module.get_cache()["epg_urls"] = []
-        cache_module.get_cache()["vod_streams"] = []
-        cache_module.get_cache()["series"] = []
+    def test_search_regex_mode(self, auth_client, seed_cache):
+        seed_cache(
+            live_streams=[
+                {"stream_id": 1, "name": "CNN News"},
+                {"stream_id": 2, "name": "CNBC Finance"},
+            ],
+        )
 
         resp = auth_client.get("/search?q=CN.*&regex=true&live=true")
         assert resp.status_code == 200
 
-    def test_search_rejects_long_regex(self, auth_client):
-        cache_module.get_cache()["live_streams"] = []
+    def test_search_rejects_long_regex(self, auth_client, seed_cache):
+        seed_cache()
 
         resp = auth_client.get(f"/search?q={'a' * 101}&regex=true&live=true")
         assert resp.status_code == 400
@@ -393,8 +391,8 @@ class TestSearch:
 class TestSettings:
     """Tests for settings page."""
 
-    def test_settings_page_renders(self, auth_client):
-        cache_module.get_cache()["live_categories"] = []
+    def test_settings_page_renders(self, auth_client, seed_cache):
+        seed_cache()
 
         with patch("main.load_file_cache", return_value=None):
             resp = auth_client.get("/settings")
@@ -428,6 +426,15 @@ class TestSettings:
         assert resp.status_code == 200
         assert resp.json()["ok"] is True
 
+    def test_settings_transcode_clamps_ffmpeg_threads(self, auth_client, main_module):
+        resp = auth_client.post(
+            "/settings/transcode",
+            data={"transcode_mode": "auto", "transcode_hw": "nvidia", "ffmpeg_threads": 100000},
+        )
+        assert resp.status_code == 200
+        threads = auth_client.get("/api/settings").json()["ffmpeg_threads"]
+        assert threads == main_module.ffmpeg_command.MAX_FFMPEG_THREADS
+
 
 class TestAddSource:
     """Tests for adding sources."""
@@ -627,12 +634,22 @@ class TestApiSettings:
         )
         assert resp.status_code == 200
 
+    def test_update_settings_ffmpeg_threads(self, auth_client):
+        resp = auth_client.post("/api/settings", json={"ffmpeg_threads": "4"})
+        assert resp.status_code == 200
+        assert auth_client.get("/api/settings").json()["ffmpeg_threads"] == 4
+
+    @pytest.mark.parametrize("value", ["lots", None, -1, 65])
+    def test_update_settings_rejects_bad_ffmpeg_threads(self, auth_client, value):
+        resp = auth_client.post("/api/settings", json={"ffmpeg_threads": value})
+        assert resp.status_code == 400
+
 
 class TestTranscodeRoutes:
     """Tests for transcode routes (with mocked transcoding module)."""
 
     def test_transcode_file_not_found(self, auth_client):
-        with patch("main.ffmpeg_session.get_session", return_value=None):
+        with patch("main.ffmpeg_session.get_session_dir", return_value=None):
             resp = auth_client.get("/transcode/invalid-session/stream.m3u8")
             assert resp.status_code == 404
 
@@ -661,7 +678,7 @@ class TestSubtitleRoutes:
         assert resp.status_code == 400
 
     def test_subtitle_session_not_found(self, auth_client):
-        with patch("main.ffmpeg_session.get_session", return_value=None):
+        with patch("main.ffmpeg_session.get_session_dir", return_value=None):
             resp = auth_client.get("/subs/invalid-session/sub0.vtt")
             assert resp.status_code == 404
 
@@ -686,13 +703,18 @@ class TestProbeCache:
             resp = auth_client.post("/settings/probe-cache/clear/123")
             assert resp.status_code == 200
 
+    def test_session_metrics(self, auth_client):
+        resp = auth_client.get("/metrics/sessions")
+        assert resp.status_code == 200
+        data = resp.json()
+        assert "probe_hit" in data["counters"]
+        assert "session_reuse" in data["hit_ratios"]
+
 
 class TestRefreshStatus:
     """Tests for refresh status endpoints."""
 
     def test_guide_refresh_status(self, auth_client):
-        m3u_module.get_refresh_in_progress().clear()
-
         resp = auth_client.get("/guide/refresh-status")
         assert resp.status_code == 200
         data = resp.json()
@@ -700,8 +722,6 @@ class TestRefreshStatus:
         assert data["epg"] is False
 
     def test_settings_refresh_status(self, auth_client):
-        m3u_module.get_refresh_in_progress().clear()
-
         resp = auth_client.get("/settings/refresh-status")
         assert resp.status_code == 200
 
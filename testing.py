@@ -1,5 +1,6 @@
 """Test utilities."""
 
+import os
 import sys
 import warnings
 
@@ -15,9 +16,18 @@ def run_tests(test_file: str) -> None:
         if __name__ == "__main__":
             from testing import run_tests
             run_tests(__file__)
+
+    Set PYTEST_FAST=1 to rerun only the tests that failed last time (all of them if none did),
+    or PYTEST_NO_CACHE=1 to run without reading or writing pytest's .pytest_cache (this wins).
     """
     import pytest
 
+    extra: list[str] = []
+    if os.environ.get("PYTEST_NO_CACHE"):
+        extra += ["-p", "no:cacheprovider"]
+    elif os.environ.get("PYTEST_FAST"):
+        extra.append("--lf")  # Needs the cache provider for the last-failed list
+
     sys.exit(
         pytest.main(
             [
@@ -26,6 +36,7 @@ def run_tests(test_file: str) -> None:
                 "-s",
                 "-W",
                 "ignore::pytest.PytestAssertRewriteWarning",
+                *extra,
                 *sys.argv[1:],
             ]
         )